@@ -15,9 +15,11 @@
 # limitations under the License.
 
 from os import path
+import sys
 import click
 from ast import literal_eval
 
+from .db import get_run_db
 from .run import run_start
 from .runtimes import RunError
 from .utils import run_keys, dict_to_yaml
@@ -93,6 +95,82 @@ def run(url, param, in_artifact, out_artifact, in_path, out_path, secrets, uid,
         print(dict_to_yaml(resp))
 
 
+@main.group()
+def db():
+    """Run DB commands."""
+    pass
+
+
+@db.command()
+@click.option('--project', '-p', default='', help='project name/id')
+@click.option('--rundb', default='', help='path or DB url')
+def stats(project, rundb):
+    """Print run statistics (counts by state/name/day, output aggregates)."""
+    resp = get_run_db(rundb).connect().get_run_stats(project)
+    print(dict_to_yaml(resp))
+
+
+@db.command()
+@click.option('--dirpath', '-d', default='', help='backend db path or url')
+@click.option('--host', default='127.0.0.1',
+              help='listen address, the service has no authentication '
+                   '(use 0.0.0.0 to expose it on all interfaces)')
+@click.option('--port', default=8080, type=int, help='listen port')
+@click.option('--cache-size', default=1024, type=int,
+              help='max number of cached run documents')
+def serve(dirpath, host, port, cache_size):
+    """Serve a run DB over HTTP (use with --rundb http://<host>:<port>)."""
+    from .db.httpd import make_server
+    server = make_server(get_run_db(dirpath).connect(), host, port,
+                         cache_size)
+    print(f'serving run db on {host}:{port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+@main.command()
+@click.argument('src', type=str)
+@click.argument('dst', type=str)
+@click.option('--recursive', '-r', is_flag=True, help='copy directory tree')
+@click.option('--filter', '-f', 'pattern', default='',
+              help='copy only files matching the glob, e.g. *.csv')
+@click.option('--mtime', '-t', default='',
+              help='copy files modified since (age e.g. 2h, 3d or iso time)')
+@click.option('--minsize', '-n', default=0, type=int, help='min file size')
+@click.option('--maxsize', '-m', default=0, type=int, help='max file size')
+@click.option('--check', default='mtime',
+              type=click.Choice(['mtime', 'size', 'hash', 'none']),
+              help='skip identical files by size and mtime, size or hash '
+                   '(none to copy all)')
+@click.option('--workers', '-w', default=8, type=int, help='parallel copy workers')
+@click.option('--secrets', '-s', multiple=True, help='secrets file=<filename> or env=ENV_KEY1,..')
+def cp(src, dst, recursive, pattern, mtime, minsize, maxsize, check, workers, secrets):
+    """Parallel copy of files/directories between data stores."""
+    from .datastore import StoreManager
+    from .secrets import SecretsStore
+    sm = StoreManager(SecretsStore.from_dict(
+        {run_keys.secrets: line2keylist(secrets, 'kind', 'source')}))
+
+    def progress(stats):
+        print(f'\r{stats}', end='', flush=True)
+
+    try:
+        stats = sm.copy(src, dst, recursive, pattern=pattern,
+                        min_size=minsize, max_size=maxsize, mtime=mtime,
+                        check='' if check == 'none' else check,
+                        parallel=workers, progress=progress)
+    except (OSError, ValueError) as err:
+        print(f'error: {err}')
+        sys.exit(1)
+    print(f'\r{stats}')
+    for error in stats.errors:
+        print(f'error: {error}')
+    if stats.errors:
+        sys.exit(1)
+
+
 def fill_params(param):
     params_dict = {}
     for param in param:
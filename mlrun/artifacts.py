@@ -12,35 +12,168 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import csv
 import json
+import numbers
 import os
+import pickle
+import sys
 import hashlib
 import base64
+import itertools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO, StringIO
+from tempfile import NamedTemporaryFile
 import pathlib
 
+import numpy as np
+
 #import pandas as pd
-from .datastore import StoreManager
+from .cas import cas_root, blob_path, blob_exists, make_ref, record_ref
+from .compression import ENCODINGS, check_encoding
+from .dataframes import check_df_format, df_schema, write_df, read_df, \
+    df_format
+from .datastore import StoreManager, FileStore, DEFAULT_PARALLEL
 from .db import RunDBInterface
-from .utils import uxjoin, run_keys, ModelObj
+from .hashcache import hash_cache, file_version
+from .profiling import profile_df
+from .utils import uxjoin, run_keys, ModelObj, logger, tmp_path
+
+
+# store artifacts content addressed (deduplicated), see mlrun.cas
+ARTIFACT_CAS = os.environ.get('MLRUN_ARTIFACT_CAS', '').lower() in [
+    '1', 'true', 'yes']
+# artifact hash algorithm: sha1, sha256, blake2b or xxhash (fastest,
+# requires the xxhash package)
+HASH_ALGO = os.environ.get('MLRUN_HASH_ALGO', 'sha1')
+
+
+# max memory of the rendered artifact bodies cache
+BODY_CACHE_SIZE = int(os.environ.get('MLRUN_BODY_CACHE_SIZE', 256 * 1024 ** 2))
+# stored artifacts with larger inline bodies are referenced by their
+# target_path in the run document
+INLINE_MAX_SIZE = int(os.environ.get('MLRUN_INLINE_MAX_SIZE', 64 * 1024))
+
+
+class BodyCache:
+    """LRU cache of rendered artifact bodies, bounded by their total size"""
+
+    def __init__(self, max_size=BODY_CACHE_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._bodies = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, render):
+        with self._lock:
+            if key in self._bodies:
+                self._bodies.move_to_end(key)
+                self.hits += 1
+                return self._bodies[key][0]
+            self.misses += 1
+        body = render()
+        size = _body_size(body)
+        if size <= self.max_size:
+            with self._lock:
+                if key not in self._bodies:
+                    self._bodies[key] = (body, size)
+                    self.size += size
+                while self.size > self.max_size:
+                    _, (_, evicted) = self._bodies.popitem(last=False)
+                    self.size -= evicted
+        return body
+
+    def discard(self, key):
+        with self._lock:
+            if key in self._bodies:
+                self.size -= self._bodies.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._bodies.clear()
+            self.size = 0
+
+
+def _body_size(body):
+    if body is None:
+        return 0
+    if isinstance(body, (str, bytes, bytearray)):
+        return len(body)
+    return len(str(body))
+
+
+body_cache = BodyCache()
+_body_ids = itertools.count()
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool(name, workers):
+    with _pools_lock:
+        if name not in _pools:
+            _pools[name] = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix='mlrun-' + name)
+        return _pools[name]
+
 
+def _render_pool():
+    # a single thread, figures are rendered in the order they were logged
+    return _pool('render', 1)
 
-def file_hash(filename):
-    h = hashlib.sha1()
+
+def _upload_pool():
+    return _pool('upload', 4)
+
+
+def new_hasher(algo=''):
+    algo = algo or HASH_ALGO
+    if algo == 'xxhash':
+        try:
+            import xxhash
+        except ImportError:
+            raise ImportError('xxhash hashing requires the xxhash package')
+        return xxhash.xxh3_128()
+    return hashlib.new(algo)
+
+
+def hash_str(hasher, algo=''):
+    """hash string, <algo>:<hex digest> (sha1 is kept as plain hex)"""
+    algo = algo or HASH_ALGO
+    if algo == 'sha1':
+        return hasher.hexdigest()
+    return '{}:{}'.format(algo, hasher.hexdigest())
+
+
+def file_hash(filename, algo=''):
+    """file hash, unchanged files are served from the hash cache"""
+    algo = algo or HASH_ALGO
+    cache = hash_cache()
+    if cache:
+        return cache.digest(filename, algo, lambda f: _file_hash(f, algo))
+    return _file_hash(filename, algo)
+
+
+def _file_hash(filename, algo):
+    h = new_hasher(algo)
     b = bytearray(128*1024)
     mv = memoryview(b)
     with open(filename, 'rb', buffering=0) as f:
         for n in iter(lambda: f.readinto(mv), 0):
             h.update(mv[:n])
-    return h.hexdigest()
+    return hash_str(h, algo)
 
 
-def blob_hash(data):
+def blob_hash(data, algo=''):
     if isinstance(data, str):
         data = data.encode()
-    h = hashlib.sha1()
+    h = new_hasher(algo)
     h.update(data)
-    return h.hexdigest()
+    return hash_str(h, algo)
 
 
 class ArtifactManager:
@@ -48,15 +181,20 @@ class ArtifactManager:
     def __init__(self, stores: StoreManager,
                  db: RunDBInterface = None,
                  out_path='',
-                 calc_hash=True):
+                 calc_hash=True,
+                 hash_algo='',
+                 cas=None):
         self.out_path = out_path
         self.calc_hash = calc_hash
+        self.hash_algo = hash_algo
+        self.cas = ARTIFACT_CAS if cas is None else cas
 
         self.data_stores = stores
         self.artifact_db = db
         self.input_artifacts = {}
         self.output_artifacts = {}
         self.outputs_spec = {}
+        self._pending = []
 
     def from_dict(self, struct: dict):
         self.out_path = struct.get(run_keys.output_path, self.out_path)
@@ -71,11 +209,14 @@ class ArtifactManager:
         struct['status'][run_keys.output_artifacts] = [item.base_dict() for item in self.output_artifacts.values()]
 
     def log_artifact(self, execution, item, body=None, target_path='', src_path='',
-                     tag='', viewer='', upload=True, labels=None):
+                     tag='', viewer='', upload=True, labels=None, encoding=None):
         if isinstance(item, str):
             key = item
-            item = Artifact(key, body, src_path=src_path,
-                            viewer=viewer)
+            if body is None and src_path and os.path.isdir(src_path):
+                item = DirArtifact(key, src_path=src_path, viewer=viewer)
+            else:
+                item = Artifact(key, body, src_path=src_path,
+                                viewer=viewer)
         else:
             key = item.key
             target_path = target_path or item.target_path
@@ -89,6 +230,7 @@ class ArtifactManager:
             target_path = uxjoin(self.out_path, key)
         item.target_path = target_path
         item.tree = execution.tag
+        item.encoding = encoding or item.encoding
         if labels:
             if not item.labels:
                 item.labels = {}
@@ -97,26 +239,220 @@ class ArtifactManager:
 
         self.output_artifacts[key] = item
 
+        if self.artifact_db:
+            if not item.sources:
+                item.sources = execution.to_dict()['spec'][run_keys.input_objects]
+            item.producer = execution.get_meta()
+
+        if item.background:
+            # the body is still rendering, upload when it is ready
+            self._pending.append(_upload_pool().submit(
+                self._upload, execution, item, src_path, tag, upload))
+        else:
+            self._upload(execution, item, src_path, tag, upload)
+
+    def _upload(self, execution, item, src_path, tag, upload):
+        key = item.key
         if upload:
+            target_path = item.target_path
             store, ipath = self.get_store(target_path)
             body = item.get_body()
-            if body:
+            if isinstance(item, DirArtifact):
+                self._upload_dir(store, ipath, item)
+            elif item.file_body:
+                item.hash, item.encoding = self._upload_rendered(
+                    store, ipath, item)
+            elif self.cas and (body or os.path.isfile(src_path or key)):
+                item.hash, item.encoding = self._upload_cas(
+                    store, ipath, target_path, body, src_path or key,
+                    item.encoding)
+                item._stored = bool(body)
+            elif body:
                 if self.calc_hash:
-                    item.hash = blob_hash(body)
-                store.put(ipath, body)
+                    item.hash = blob_hash(body, self.hash_algo)
+                item.encoding = store.put_encoded(ipath, body,
+                                                  encoding=item.encoding)
+                item._stored = True
             else:
                 src_path = src_path or key
                 if os.path.isfile(src_path):
-                    if self.calc_hash:
-                        item.hash = file_hash(src_path)
-                    store.upload(ipath, src_path)
+                    item.hash, item.encoding = self._upload_file(
+                        store, ipath, src_path, item.encoding)
+            for extra_path, data in item.extra_bodies().items():
+                extra_store, extra_key = self.get_store(extra_path)
+                extra_store.put(extra_key, data)
+            item._after_upload(self)
 
         if self.artifact_db:
-            if not item.sources:
-                item.sources = execution.to_dict()['spec'][run_keys.input_objects]
-            item.producer = execution.get_meta()
             self.artifact_db.store_artifact(key, item, item.tree, tag, execution.project)
 
+    def wait(self):
+        """wait for the background uploads, raise the first error"""
+        pending, self._pending = self._pending, []
+        errors = [f.exception() for f in pending]
+        errors = [err for err in errors if err]
+        if errors:
+            raise errors[0]
+
+    def _upload_rendered(self, store, ipath, item):
+        """write a file body (e.g. parquet tables), return (hash, encoding)
+
+        local targets are written in place, others to a temp file which is
+        streamed (multipart) to the store
+        """
+        algo = self.hash_algo or HASH_ALGO
+        encoding = check_encoding(item.encoding) or store.encoding(ipath)
+        if isinstance(store, FileStore) and not encoding and not self.cas:
+            target = store._join(ipath)
+            dirpath = os.path.dirname(target)
+            if dirpath:
+                os.makedirs(dirpath, exist_ok=True)
+            tmp = tmp_path(target)
+            try:
+                item.write_body(tmp)
+                digest = _file_hash(tmp, algo) if self.calc_hash else None
+                os.replace(tmp, target)
+            finally:
+                if os.path.isfile(tmp):
+                    os.remove(tmp)
+            return digest, None
+
+        with NamedTemporaryFile(suffix='.' + item.format,
+                                delete=False) as fp:
+            tmp = fp.name
+        try:
+            item.write_body(tmp)
+            if self.cas:
+                return self._upload_cas(store, ipath, item.target_path, None,
+                                        tmp, encoding, cached=False)
+            return self._upload_file(store, ipath, tmp, encoding,
+                                     cached=False)
+        finally:
+            os.remove(tmp)
+
+    def _upload_dir(self, store, ipath, item):
+        """upload the files of a directory which changed since the
+        previous manifest (in parallel), then write the new manifest and
+        delete the target files which are no longer in the directory"""
+        algo = self.hash_algo or HASH_ALGO
+        src_dir = item.src_path or item.key
+        if not os.path.isdir(src_dir):
+            raise ValueError('directory {} not found'.format(src_dir))
+        previous = read_manifest(store, ipath) or {}
+        if previous.get('algo') != algo:
+            previous = {}
+        old_files = previous.get('files', {})
+
+        paths = {}
+        for root, _, names in os.walk(src_dir):
+            for name in names:
+                filepath = os.path.join(root, name)
+                relpath = os.path.relpath(filepath, src_dir).replace(
+                    os.sep, '/')
+                if relpath != MANIFEST_FILE:
+                    paths[relpath] = filepath
+
+        cache = hash_cache()
+
+        def upload(relpath):
+            filepath = paths[relpath]
+            size = os.path.getsize(filepath)
+            old = old_files.get(relpath)
+            digest = cache.get(filepath, algo) if cache else None
+            if digest is None and old and old['size'] == size:
+                # same size, the hash decides if it changed
+                digest = file_hash(filepath, algo)
+            if digest and old == {'size': size, 'hash': digest}:
+                return relpath, old, False
+            key = uxjoin(ipath, relpath)
+            if digest:
+                store.upload(key, filepath)
+            else:
+                # new or resized files are hashed while uploaded
+                version = file_version(filepath)
+                hasher = new_hasher(algo)
+                store.upload(key, filepath, hasher=hasher)
+                digest = hash_str(hasher, algo)
+                if cache and file_version(filepath) == version:
+                    cache.set(filepath, algo, digest, version)
+            return relpath, {'size': size, 'hash': digest}, True
+
+        with ThreadPoolExecutor(max_workers=item.parallel) as pool:
+            results = list(pool.map(upload, sorted(paths)))
+
+        files = {relpath: entry for relpath, entry, _ in results}
+        manifest = {'algo': algo, 'files': files}
+        data = json.dumps(manifest, sort_keys=True).encode()
+        store.put(uxjoin(ipath, MANIFEST_FILE), data)
+        for relpath in sorted(set(old_files) - set(files)):
+            try:
+                store.delete(uxjoin(ipath, relpath))
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as exc:
+                logger.warning('failed to delete {} from {}: {}'.format(
+                    relpath, item.target_path, exc))
+        item.hash = blob_hash(data, algo)
+        item.size = sum(entry['size'] for entry in files.values())
+        item.num_files = len(files)
+        item.uploaded_files = [relpath for relpath, _, up in results if up]
+        logger.debug('uploaded {} of {} files to {}'.format(
+            len(item.uploaded_files), len(files), item.target_path))
+
+    def _upload_file(self, store, ipath, src_path, encoding, cached=True):
+        """upload a file, return (hash, encoding)
+
+        unchanged files get their hash from the hash cache, others are
+        hashed while they are read for the upload (single pass)
+        """
+        if not self.calc_hash:
+            return None, store.upload_encoded(ipath, src_path,
+                                              encoding=encoding)
+
+        algo = self.hash_algo or HASH_ALGO
+        cache = hash_cache() if cached else None
+        digest = cache.get(src_path, algo) if cache else None
+        if digest:
+            return digest, store.upload_encoded(ipath, src_path,
+                                                encoding=encoding)
+
+        version = file_version(src_path)
+        hasher = new_hasher(algo)
+        encoding = store.upload_encoded(ipath, src_path, encoding=encoding,
+                                        hasher=hasher)
+        digest = hash_str(hasher, algo)
+        if cache and file_version(src_path) == version:
+            cache.set(src_path, algo, digest, version)
+        return digest, encoding
+
+    def _upload_cas(self, store, ipath, target_path, body, src_path,
+                    encoding, cached=True):
+        """upload to <out_path>/.cas/<hash> (skipped if the blob exists)
+        and write a reference to it at the target, return (hash, encoding)
+        """
+        algo = self.hash_algo or HASH_ALGO
+        if body:
+            hash = blob_hash(body, algo)
+            size = len(body)
+        else:
+            hash = file_hash(src_path, algo) if cached else \
+                _file_hash(src_path, algo)
+            size = os.path.getsize(src_path)
+        encoding = check_encoding(encoding) or store.encoding(ipath)
+        suffix = ENCODINGS[encoding][0] if encoding else ''
+        root = cas_root(self.out_path or os.path.dirname(target_path))
+        blob_url = blob_path(root, hash, suffix)
+        blob_store, blob_key = self.get_store(blob_url)
+        if blob_exists(blob_store, blob_key):
+            logger.debug('blob {} exists, upload skipped'.format(blob_url))
+        elif body:
+            blob_store.put_encoded(blob_key, body, encoding=encoding)
+        else:
+            blob_store.upload_encoded(blob_key, src_path, encoding=encoding)
+        store.put(ipath, make_ref(blob_url, hash, size, encoding))
+        record_ref(self.data_stores, root, target_path)
+        return hash, encoding
+
     def get_store(self, url):
         return self.data_stores.get_or_create_store(url)
 
@@ -124,8 +460,10 @@ class ArtifactManager:
 class Artifact(ModelObj):
 
     _dict_fields = ['key', 'kind', 'tree', 'src_path', 'target_path', 'hash',
-                    'description', 'viewer', 'inline']
+                    'description', 'viewer', 'inline', 'encoding']
     kind = ''
+    # rendered bodies (plots, tables, charts) are rendered once and cached
+    _memoize = False
 
     def __init__(self, key, body=None, src_path=None, target_path='',
                  viewer=None, inline=False):
@@ -145,6 +483,10 @@ class Artifact(ModelObj):
         self.hash = None
         self._inline = inline
         self.license = ''
+        self._body_id = next(_body_ids)
+        self._body_version = 0
+        self._body_size = None
+        self._stored = False
         self._post_init()
 
     def _post_init(self):
@@ -156,13 +498,53 @@ class Artifact(ModelObj):
 
     @property
     def inline(self):
-        if self._inline:
-            return self.get_body()
-        return None
+        if not self._inline:
+            return None
+        body = self.get_body()
+        if self._stored and self._body_size > INLINE_MAX_SIZE:
+            # large bodies are read from the target_path
+            return None
+        return body
 
     def get_body(self):
+        if self._memoize:
+            body = body_cache.get((self._body_id, self._body_version),
+                                  self._render)
+        else:
+            body = self._render()
+        if self._body_size is None:
+            self._body_size = _body_size(body)
+        return body
+
+    def _render(self):
         return self._body
 
+    @property
+    def background(self):
+        """the body is rendered in the background (upload it there too)"""
+        return False
+
+    def extra_bodies(self):
+        """additional {target path: data} to upload (e.g. thumbnails)"""
+        return {}
+
+    def _after_upload(self, manager):
+        pass
+
+    @property
+    def file_body(self):
+        """the body is written to a file (write_body) and not to memory"""
+        return False
+
+    def write_body(self, filepath):
+        pass
+
+    def _body_changed(self):
+        """drop the rendered body after the artifact data was modified"""
+        body_cache.discard((self._body_id, self._body_version))
+        self._body_version += 1
+        self._body_size = None
+
     def base_dict(self):
         return super().to_dict()
 
@@ -171,17 +553,137 @@ class Artifact(ModelObj):
             self._dict_fields + ['updated', 'labels', 'annotations', 'producer', 'sources'])
 
 
-class PlotArtifact(Artifact):
+IMAGE_FORMATS = ['png', 'svg', 'webp', 'jpg']
+THUMBNAIL_SIZE = 128
+
+
+class ImageArtifact(Artifact):
+    """image artifact, the raw image (png, svg, webp or jpg) is stored
+
+    with thumbnail=True a small png (THUMBNAIL_SIZE pixels) is stored next
+    to it (<target>.thumb.png) for listings, requires Pillow for images
+    which are not rendered by mlrun.
+    """
+    _dict_fields = Artifact._dict_fields + ['format', 'thumbnail']
+    kind = 'image'
+    _default_format = 'png'
+
+    def __init__(self, key, body=None, src_path=None, target_path='',
+                 viewer='image', format=None, thumbnail=False):
+        suffix = pathlib.Path(key).suffix[1:].lower().replace('jpeg', 'jpg')
+        if not format:
+            format = suffix if suffix in IMAGE_FORMATS else \
+                self._default_format
+        format = format.replace('jpeg', 'jpg')
+        self._check_format(format)
+        if format in IMAGE_FORMATS and suffix != format:
+            key += '.' + format
+        self.format = format
+        self._thumbnail = thumbnail
+        super().__init__(key, body, src_path, target_path, viewer)
+
+    def _check_format(self, format):
+        if format not in IMAGE_FORMATS:
+            raise ValueError('image format must be one of {}'.format(
+                ', '.join(IMAGE_FORMATS)))
+
+    @property
+    def thumbnail(self):
+        if self._thumbnail and self.target_path and \
+                self.format in IMAGE_FORMATS:
+            return self.target_path + '.thumb.png'
+        return None
+
+    def extra_bodies(self):
+        if not self.thumbnail:
+            return {}
+        return {self.thumbnail: self._render_thumbnail()}
+
+    def _render_thumbnail(self):
+        from PIL import Image
+
+        body = self.get_body()
+        if body is None:
+            with open(self.src_path or self.key, 'rb') as fp:
+                body = fp.read()
+        image = Image.open(BytesIO(body))
+        image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        output = BytesIO()
+        image.save(output, format='png')
+        return output.getvalue()
+
+
+class PlotArtifact(ImageArtifact):
+    """matplotlib figure artifact
+
+    format html (default unless the key has an image suffix) stores an
+    <img> tag with the png base64 encoded, png, svg, webp or jpg store the
+    raw image. binary images are rendered in a background thread (and
+    uploaded there) from a copy (pickle) of the figure taken when the
+    artifact is created, so the figure can be cleared or reused right away.
+    """
     kind = 'plot'
+    _default_format = 'html'
+
+    def __init__(self, key, body=None, src_path=None, target_path='',
+                 viewer=None, format=None, thumbnail=False):
+        self._rendering = None
+        super().__init__(key, body, src_path, target_path, viewer,
+                         format, thumbnail)
+
+    def _check_format(self, format):
+        if format != 'html':
+            super()._check_format(format)
+
     def _post_init(self):
-        self.viewer = 'chart'
         import matplotlib
         if not self._body or not isinstance(self._body, matplotlib.figure.Figure):
             raise ValueError('matplotlib fig must be provided as artifact body')
-        if not pathlib.Path(self.key).suffix:
-            self._key += '.html'
+        if self.format == 'html':
+            self.viewer = 'chart'
+            self._memoize = True
+            if not pathlib.Path(self.key).suffix:
+                self._key += '.html'
+        else:
+            self.viewer = self.viewer or 'image'
+            snapshot = pickle.dumps(self._body)
+            self._rendering = _render_pool().submit(self._render_image,
+                                                    snapshot)
 
-    def get_body(self):
+    @property
+    def background(self):
+        return self._rendering is not None and not self._rendering.done()
+
+    @staticmethod
+    def _savefig(fig, format, dpi=None):
+        output = BytesIO()
+        fig.savefig(output, format=format, dpi=dpi)
+        return output.getvalue()
+
+    def _render_image(self, snapshot):
+        fig = pickle.loads(snapshot)
+        try:
+            body = self._savefig(fig, self.format)
+            thumbnail = None
+            if self._thumbnail:
+                dpi = THUMBNAIL_SIZE / max(fig.get_size_inches())
+                thumbnail = self._savefig(fig, 'png', dpi=dpi)
+        finally:
+            # unpickled pyplot figures are registered with pyplot again
+            pyplot = sys.modules.get('matplotlib.pyplot')
+            if pyplot:
+                pyplot.close(fig)
+        return body, thumbnail
+
+    def _render(self):
+        if self._rendering is not None:
+            return self._rendering.result()[0]
+        return self._render_html()
+
+    def _render_thumbnail(self):
+        return self._rendering.result()[1]
+
+    def _render_html(self):
         """ Convert Matplotlib figure 'fig' into a <img> tag for HTML use using base64 encoding. """
         from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
 
@@ -194,12 +696,26 @@ class PlotArtifact(Artifact):
         return '<img title="{}" src="data:image/png;base64,{}">'.format(self.key, data_uri)
 
 
+# rows per chunk when profiling table files
+PROFILE_CHUNK_SIZE = 100000
+
+
 class TableArtifact(Artifact):
-    _dict_fields = Artifact._dict_fields + ['format', 'schema', 'header']
+    _dict_fields = Artifact._dict_fields + ['format', 'schema', 'header',
+                                            'profile']
     kind = 'table'
 
     def __init__(self, key, body=None, df=None, src_path=None, target_path='',
-                         viewer=None, visible=False, inline=False, format=None, header=None, schema=None):
+                         viewer=None, visible=False, inline=False, format=None, header=None, schema=None,
+                         compression=None, row_group_size=None, profile=False):
+        """table artifact, from a body or a DataFrame (df)
+
+        DataFrames are stored as csv, parquet, feather or arrow (format),
+        compression and row_group_size apply to the binary formats which
+        are written to a file and streamed to the target store.
+        with profile=True column statistics (see mlrun.profiling) of the df
+        or the src_path file (read in chunks) are kept in the artifact.
+        """
 
         key_suffix = pathlib.Path(key).suffix
         if not format and key_suffix:
@@ -208,25 +724,45 @@ class TableArtifact(Artifact):
         if df is not None:
             self._is_df = True
             self.header = df.columns.values.tolist()
-            format = format or 'csv'
-            if format not in ['csv']:  # todo other formats
-                raise ValueError('format must be csv for now')
+            format = check_df_format(format or 'csv')
             if visible and not key_suffix:
-                key += '.csv'
+                key += '.' + format
+            schema = schema or df_schema(df, format)
             body = df
         else:
             self._is_df = False
             self.header = header
 
+        self.profile = None
+        if profile:
+            if df is None and src_path:
+                df = read_df(src_path, df_format(src_path),
+                             chunksize=PROFILE_CHUNK_SIZE)
+            if df is not None:
+                self.profile = profile_df(df)
+
         self.format = format
         self.schema = schema
+        self.compression = compression
+        self.row_group_size = row_group_size
+        self._memoize = self._is_df and format == 'csv'
         if not viewer:
             viewer = 'table' if visible else None
         super().__init__(key, body, src_path, target_path, viewer, inline)
 
-    def get_body(self):
+    @property
+    def file_body(self):
+        return self._is_df and self.format != 'csv'
+
+    def write_body(self, filepath):
+        write_df(self._body, filepath, self.format, self.compression,
+                 self.row_group_size)
+
+    def _render(self):
         if not self._is_df:
             return self._body
+        if self.format != 'csv':
+            return None
         csv_buffer = StringIO()
         self._body.to_csv(csv_buffer, index=False, line_terminator='\n', encoding='utf-8')
         return csv_buffer.getvalue()
@@ -253,31 +789,277 @@ chart_template = '''
 </html>
 '''
 
+# max points in the rendered chart, longer series are downsampled
+CHART_MAX_POINTS = int(os.environ.get('MLRUN_CHART_MAX_POINTS', 2000))
+
+
+def lttb(x, y, threshold):
+    """indices of the points selected by largest triangle three buckets"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.zeros(threshold, dtype=int)
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+        areas = np.abs((x[a] - next_x) * (y[start:end] - y[a]) -
+                       (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(areas.argmax())
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def minmax(y, buckets):
+    """indices of the min and max points in each bucket"""
+    n = len(y)
+    if buckets * 2 >= n:
+        return np.arange(n)
+    edges = np.linspace(0, n, buckets + 1).astype(int)
+    selected = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        chunk = y[start:end]
+        selected += [start + int(chunk.argmin()), start + int(chunk.argmax())]
+    return np.unique(selected)
+
+
+def _numeric(column):
+    """column as numbers, None if it has non numeric cells"""
+    if column.dtype != object:
+        return column
+    if not all(isinstance(v, numbers.Real) for v in column):
+        return None
+    return column.astype(float)
+
+
+def _cell_dtype(value):
+    if isinstance(value, bool) or not isinstance(value, numbers.Real):
+        return object
+    return np.int64 if isinstance(value, numbers.Integral) else float
+
+
+def _column_dtype(dtype, cell_dtype):
+    """dtype for both, ints stay ints until a float is added"""
+    if dtype == cell_dtype or dtype == object:
+        return dtype
+    if cell_dtype is object:
+        return object
+    return float
+
+
 class ChartArtifact(Artifact):
+    """chart (google charts html) of table rows
+
+    rows are kept in memory in preallocated numpy columns (int, float or
+    object once a non numeric cell is added), the rendered view is
+    downsampled to max_points (lttb or minmax per numeric series, by the
+    row position when the x column is not numeric, None to render all the
+    rows). the rows are written to a csv data file next to the chart
+    (data_path, <target>.data.csv) when the chart is logged and by flush(),
+    local files get the new rows appended, other stores the whole file.
+    """
+    _dict_fields = Artifact._dict_fields + ['data_path']
     kind = 'chart'
+    _memoize = True
 
     def __init__(self, key, data=[], src_path=None, target_path='',
-                         viewer='chart', options={}):
+                         viewer='chart', options={}, max_points=None,
+                         downsample='lttb', data_path=None):
         super().__init__(key, None, src_path, target_path, viewer)
+        if downsample not in ['lttb', 'minmax', None]:
+            raise ValueError('downsample must be lttb, minmax or None')
         self.header = []
-        self._rows = []
+        self._columns = []
+        self._size = 0
+        self._flushed = 0
+        self._sidecar = None
+        self.max_points = max_points or CHART_MAX_POINTS
+        self.downsample = downsample
+        self.data_path = data_path
         if data:
             self.header = data[0]
-            self._rows = data[1:]
+            for row in data[1:]:
+                self.add_row(row)
         self.options = options
         self.chart = 'LineChart'
 
+    @property
+    def rows(self):
+        """the rows array (rows x columns, object if the column types
+        differ)"""
+        return self._rows()
+
+    def _rows(self, indices=None):
+        columns = [column[:self._size] for column in self._columns]
+        if not columns:
+            return np.empty((0, len(self.header)))
+        if indices is not None:
+            columns = [column[indices] for column in columns]
+        if len(set(column.dtype for column in columns)) == 1:
+            return np.column_stack(columns)
+        rows = np.empty((len(columns[0]), len(columns)), dtype=object)
+        for i, column in enumerate(columns):
+            rows[:, i] = column.tolist()
+        return rows
+
     def add_row(self, row):
-        self._rows += [row]
+        width = len(self._columns) or len(self.header) or len(row)
+        if len(row) != width:
+            raise ValueError('chart row {} does not match the columns {}'
+                             .format(list(row), self.header or width))
+        if not self._columns:
+            self._columns = [np.empty(1024, dtype=_cell_dtype(value))
+                             for value in row]
+        elif self._size == len(self._columns[0]):
+            for i, column in enumerate(self._columns):
+                grown = np.empty(len(column) * 2, dtype=column.dtype)
+                grown[:self._size] = column[:self._size]
+                self._columns[i] = grown
+        for i, value in enumerate(row):
+            column = self._columns[i]
+            dtype = _column_dtype(column.dtype, _cell_dtype(value))
+            if column.dtype != dtype:
+                self._columns[i] = column.astype(dtype)
+            self._columns[i][self._size] = value
+        self._size += 1
+        self._body_changed()
 
-    def get_body(self):
+    def flush(self):
+        """write the new rows to the data file (once logged)"""
+        if not self._sidecar or (self._flushed and
+                                 self._flushed == self._size):
+            return
+        store, key = self._sidecar
+        append = self._flushed and isinstance(store, FileStore)
+        output = StringIO()
+        writer = csv.writer(output, lineterminator='\n')
+        if not append:
+            writer.writerow(self.header)
+        start = self._flushed if append else 0
+        writer.writerows(self._rows(np.arange(start, self._size)).tolist())
+        data = output.getvalue().encode()
+        if append:
+            store.append(key, data)
+        else:
+            store.put(key, data)
+        self._flushed = self._size
+
+    def _after_upload(self, manager):
+        if not self.data_path:
+            self.data_path = os.path.splitext(self.target_path)[0] + \
+                '.data.csv'
+        self._sidecar = manager.get_store(self.data_path)
+        self.flush()
+
+    def _view(self):
+        """rows to render, downsampled to max_points"""
+        columns = [column[:self._size] for column in self._columns]
+        if not self.downsample or self._size <= self.max_points or \
+                len(columns) < 2:
+            return self._rows()
+        series = [column for column in
+                  (_numeric(column) for column in columns[1:])
+                  if column is not None]
+        if not series:
+            return self._rows()
+        if self.downsample == 'lttb':
+            x = _numeric(columns[0])
+            if x is None:
+                x = np.arange(self._size, dtype=float)
+            budget = max(self.max_points // len(series), 3)
+            indices = np.unique(np.concatenate(
+                [lttb(x, y, budget) for y in series]))
+        else:
+            buckets = max(self.max_points // (2 * len(series)), 1)
+            indices = np.unique(np.concatenate(
+                [minmax(y, buckets) for y in series]))
+        return self._rows(indices)
+
+    def _render(self):
         if not self.options.get('title'):
             self.options['title'] = self.key
-        data = [self.header] + self._rows
+        data = [self.header] + self._view().tolist()
         return chart_template.replace('$data$', json.dumps(data))\
             .replace('$opts$', json.dumps(self.options))\
             .replace('$chart$', self.chart)
 
 
-def write_df(df, format, path):
-    pass
\ No newline at end of file
+MANIFEST_FILE = '.manifest.json'
+
+
+def read_manifest(store, key):
+    """the manifest of a directory artifact, None if missing"""
+    manifest_key = uxjoin(key, MANIFEST_FILE)
+    try:
+        store.stat(manifest_key)
+        return json.loads(store.get(manifest_key))
+    except (OSError, ValueError):
+        return None
+
+
+class DirArtifact(Artifact):
+    """directory artifact (e.g. a saved model)
+
+    the files are uploaded in parallel under the target path with a
+    manifest (.manifest.json) of their sizes and hashes, when logged again
+    only new and modified files are uploaded. the artifact hash is the
+    manifest hash.
+    """
+    _dict_fields = Artifact._dict_fields + ['size', 'num_files']
+    kind = 'dir'
+
+    def __init__(self, key, src_path=None, target_path='', viewer=None,
+                 parallel=DEFAULT_PARALLEL):
+        super().__init__(key, None, src_path, target_path, viewer)
+        self.parallel = parallel
+        self.size = None
+        self.num_files = None
+        self.uploaded_files = []
+
+
+class ModelArtifact(DirArtifact):
+    _dict_fields = DirArtifact._dict_fields + ['framework']
+    kind = 'model'
+
+    def __init__(self, key, src_path=None, target_path='', viewer=None,
+                 framework=None, parallel=DEFAULT_PARALLEL):
+        super().__init__(key, src_path, target_path, viewer, parallel)
+        self.framework = framework
+
+
+def download_dir(stores: StoreManager, url, target_dir,
+                 parallel=DEFAULT_PARALLEL):
+    """download a directory artifact in parallel
+
+    local files with the manifest size and hash are not downloaded again
+    :return: list of downloaded relative paths
+    """
+    store, key = stores.get_or_create_store(url)
+    manifest = read_manifest(store, key)
+    if manifest is None:
+        raise ValueError('{} is not a directory artifact (no {})'.format(
+            url, MANIFEST_FILE))
+    algo = manifest.get('algo', HASH_ALGO)
+
+    def download(item):
+        relpath, entry = item
+        filepath = os.path.join(target_dir, *relpath.split('/'))
+        if os.path.isfile(filepath) and \
+                os.path.getsize(filepath) == entry['size'] and \
+                file_hash(filepath, algo) == entry['hash']:
+            return None
+        dirpath = os.path.dirname(filepath)
+        if dirpath:
+            os.makedirs(dirpath, exist_ok=True)
+        store.download(uxjoin(key, relpath), filepath)
+        return relpath
+
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        results = pool.map(download, sorted(manifest['files'].items()))
+        return [relpath for relpath in results if relpath]
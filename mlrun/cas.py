@@ -0,0 +1,154 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""content addressed artifact storage
+
+blobs are stored once under <out_path>/.cas/<hash>, the artifact target
+path holds a small reference file (REF_MAGIC + json) which DataItem reads
+resolve transparently. the reference urls are logged in <cas>/.refs
+so gc finds references written outside of out_path.
+"""
+
+import json
+import posixpath
+import time
+from os import path
+from urllib.parse import urlparse
+
+from .utils import uxjoin, logger
+
+CAS_DIR = '.cas'
+REFS_FILE = '.refs'
+REF_MAGIC = b'MLRUN-CAS-REF/1\n'
+# reference files are smaller than this
+REF_MAX_SIZE = 4096
+
+
+def cas_root(out_path):
+    return uxjoin(out_path, CAS_DIR)
+
+
+def blob_path(root, hash, encoding_suffix=''):
+    """blob url of a hash (<algo>:<hex> hashes are stored as <algo>-<hex>)"""
+    return uxjoin(root, hash.replace(':', '-') + encoding_suffix)
+
+
+def normalize_url(url):
+    """comparable url, local paths are made absolute"""
+    parsed = urlparse(url)
+    if parsed.scheme in ['', 'file'] or len(parsed.scheme) == 1:
+        return path.abspath(url if parsed.scheme != 'file' else parsed.path)
+    return parsed._replace(
+        path=posixpath.normpath(parsed.path) if parsed.path else '').geturl()
+
+
+def make_ref(target, hash, size=None, encoding=None):
+    ref = {'target': normalize_url(target), 'hash': hash, 'size': size}
+    if encoding:
+        ref['encoding'] = encoding
+    return REF_MAGIC + json.dumps(ref).encode()
+
+
+def parse_ref(data):
+    """reference dict if data is a reference file, else None"""
+    if isinstance(data, str):
+        data = data.encode()
+    if not data or not data.startswith(REF_MAGIC) or \
+            len(data) > REF_MAX_SIZE:
+        return None
+    try:
+        return json.loads(data[len(REF_MAGIC):])
+    except ValueError:
+        return None
+
+
+def blob_exists(store, key):
+    try:
+        store.stat(key)
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+def record_ref(stores, root, ref_url):
+    """log a reference url in the cas root (read by gc)"""
+    store, root_key = stores.get_or_create_store(root)
+    store.append(uxjoin(root_key, REFS_FILE),
+                 (normalize_url(ref_url) + '\n').encode())
+
+
+def _logged_refs(store, root_key):
+    try:
+        data = store.get(uxjoin(root_key, REFS_FILE))
+    except FileNotFoundError:
+        return set()
+    if isinstance(data, bytes):
+        data = data.decode()
+    return set(line for line in data.splitlines() if line)
+
+
+def _read_ref(stores, url):
+    store, key = stores.get_or_create_store(url)
+    try:
+        size = store.stat(key).size
+        if size is not None and size > REF_MAX_SIZE:
+            return None
+        return parse_ref(store.get(key, size=REF_MAX_SIZE))
+    except FileNotFoundError:
+        return None  # the reference was deleted
+
+
+def cas_gc(stores, out_path, grace=3600, dry_run=False):
+    """delete blobs which are not referenced
+
+    references are the ones logged in the cas root (written anywhere) and
+    the reference files under out_path, urls are compared normalized.
+    blobs newer than grace seconds are kept (they may belong to an upload
+    which did not write its reference yet). nothing is deleted if a
+    reference can not be read.
+
+    :return: list of deleted (or to be deleted with dry_run) blob urls
+    """
+    root = normalize_url(cas_root(out_path))
+    store, root_key = stores.get_or_create_store(root)
+    out_store, out_key = stores.get_or_create_store(normalize_url(out_path))
+    referenced = set()
+    try:
+        refs = _logged_refs(store, root_key)
+        for rel, stats in out_store.listdir(out_key):
+            if rel.split('/')[0] != CAS_DIR and stats.size is not None \
+                    and stats.size <= REF_MAX_SIZE:
+                refs.add(normalize_url(uxjoin(normalize_url(out_path), rel)))
+        for url in refs:
+            ref = _read_ref(stores, url)
+            if ref:
+                referenced.add(normalize_url(ref['target']))
+    except (OSError, ValueError) as exc:
+        logger.warning('cas gc of {} skipped, references could not be '
+                       'read: {}'.format(root, exc))
+        return []
+
+    deleted = []
+    now = time.time()
+    for rel, stats in store.listdir(root_key):
+        url = uxjoin(root, rel)
+        if rel == REFS_FILE or normalize_url(url) in referenced:
+            continue
+        if stats.modified and now - stats.modified < grace:
+            continue
+        deleted.append(url)
+        if not dry_run:
+            logger.info('deleting unreferenced blob {}'.format(url))
+            store.delete(uxjoin(root_key, rel))
+    return deleted
@@ -0,0 +1,148 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gzip
+import shutil
+
+# encoding -> (key suffix, magic bytes of the compressed stream)
+ENCODINGS = {
+    'gzip': ('.gz', b'\x1f\x8b'),
+    'zstd': ('.zst', b'\x28\xb5\x2f\xfd'),
+}
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+_chunk_size = 1024 * 1024
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('zstd compression requires the zstandard package')
+    return zstandard
+
+
+def check_encoding(encoding):
+    if encoding and encoding not in ENCODINGS:
+        raise ValueError('unsupported encoding {}, use one of {}'.format(
+            encoding, ', '.join(ENCODINGS.keys())))
+    return encoding or None
+
+
+def encoding_from_suffix(key):
+    for encoding, (suffix, _) in ENCODINGS.items():
+        if key.endswith(suffix):
+            return encoding
+    return None
+
+
+def detect_encoding(head):
+    """encoding of compressed data by its first bytes (magic)"""
+    for encoding, (_, magic) in ENCODINGS.items():
+        if head[:len(magic)] == magic:
+            return encoding
+    return None
+
+
+def file_encoding(filepath):
+    """encoding of a local file by its magic (None if not compressed)"""
+    with open(filepath, 'rb') as fp:
+        return detect_encoding(fp.read(4))
+
+
+def compress(data, encoding):
+    if isinstance(data, str):
+        data = data.encode()
+    if encoding == 'gzip':
+        return gzip.compress(data, GZIP_LEVEL)
+    if encoding == 'zstd':
+        return _zstd().ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    raise ValueError('unsupported encoding {}'.format(encoding))
+
+
+def decompress(data, encoding):
+    """decompress data stored with the (recorded) encoding
+
+    data is returned as is if no encoding is given or it does not carry
+    the encoding magic (stored raw)
+    """
+    if not encoding or not isinstance(data, bytes) or \
+            detect_encoding(data) != encoding:
+        return data
+    if encoding == 'gzip':
+        return gzip.decompress(data)
+    if encoding == 'zstd':
+        # stream decompression, frames may not record the content size
+        return _zstd().ZstdDecompressor().decompressobj().decompress(data)
+    return data
+
+
+def compress_file(src_path, target_path, encoding, hasher=None):
+    """stream compress a file, return (raw size, compressed size)
+
+    hasher (optional) is updated with the raw data
+    """
+    with open(src_path, 'rb') as src, open(target_path, 'wb') as dst:
+        if hasher:
+            src = _HashingReader(src, hasher)
+        if encoding == 'gzip':
+            with gzip.GzipFile(fileobj=dst, mode='wb',
+                               compresslevel=GZIP_LEVEL) as fp:
+                shutil.copyfileobj(src, fp, _chunk_size)
+        elif encoding == 'zstd':
+            cctx = _zstd().ZstdCompressor(level=ZSTD_LEVEL)
+            with cctx.stream_writer(dst, closefd=False) as fp:
+                shutil.copyfileobj(src, fp, _chunk_size)
+        else:
+            raise ValueError('unsupported encoding {}'.format(encoding))
+        return src.tell(), dst.tell()
+
+
+class _HashingReader:
+    def __init__(self, fp, hasher):
+        self._fp = fp
+        self._hasher = hasher
+
+    def read(self, size=-1):
+        data = self._fp.read(size)
+        self._hasher.update(data)
+        return data
+
+    def tell(self):
+        return self._fp.tell()
+
+
+def decompress_file(src_path, target_path, encoding):
+    """stream decompress a file (copy it if not compressed)"""
+    with open(src_path, 'rb') as src, open(target_path, 'wb') as dst:
+        shutil.copyfileobj(open_decompressed(src, encoding), dst, _chunk_size)
+
+
+def open_decompressed(fp, encoding):
+    """wrap a binary reader with a streaming decompressor for the
+    (recorded) encoding, the magic is checked to pass raw data through"""
+    if not encoding:
+        return fp
+    head = fp.peek(4)[:4] if hasattr(fp, 'peek') else b''
+    if detect_encoding(head) != encoding:
+        return fp
+    if encoding == 'gzip':
+        return gzip.GzipFile(fileobj=fp, mode='rb')
+    if encoding == 'zstd':
+        return _zstd().ZstdDecompressor().stream_reader(fp)
+    return fp
+
+
+def ratio(raw_size, stored_size):
+    return raw_size / stored_size if stored_size else 0.0
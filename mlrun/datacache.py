@@ -0,0 +1,122 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+from os import path, environ, makedirs, scandir, remove, utime
+
+from .utils import FileLock, logger
+
+# node cache size cap (bytes)
+DEFAULT_CACHE_SIZE = 10 * 1024 ** 3
+LOCK_FILE = '.lock'
+
+
+class DataCache:
+    """node local read-through cache of remote objects
+
+    entries are keyed by the object url and version (etag or modification
+    time) so a changed object is fetched again, entries are evicted least
+    recently used first (by file mtime, touched on every hit) once the total
+    size exceeds max_size. fetches and eviction are guarded by file locks
+    so concurrent processes on the node can share the cache directory.
+
+    paths returned by get() stay valid until the entry is evicted.
+    """
+
+    def __init__(self, dirpath, max_size=DEFAULT_CACHE_SIZE):
+        self.dirpath = dirpath
+        self.max_size = max_size
+
+    def entry_path(self, url, version):
+        digest = hashlib.sha1('{}\0{}'.format(url, version).encode()).hexdigest()
+        return path.join(self.dirpath, digest[:2], digest)
+
+    def get(self, url, version, fetch, size=None):
+        """return the local path of url@version, fetch(target) on a miss
+
+        return None when the object can not be cached (larger than the cache)
+        """
+        if size is not None and size > self.max_size:
+            return None
+        filepath = self.entry_path(url, version)
+        if self._touch(filepath):
+            return filepath
+
+        # one lock per sub directory, avoids duplicate concurrent fetches
+        with FileLock(path.join(path.dirname(filepath), LOCK_FILE)):
+            if self._touch(filepath):
+                return filepath
+            logger.debug('data cache miss, fetching {}'.format(url))
+            fetch(filepath)
+
+        self.evict(keep=filepath)
+        return filepath
+
+    def _touch(self, filepath):
+        try:
+            utime(filepath)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def entries(self):
+        """list of (mtime, size, path) of all the cache entries"""
+        results = []
+        if not path.isdir(self.dirpath):
+            return results
+        for subdir in scandir(self.dirpath):
+            if not subdir.is_dir():
+                continue
+            for entry in scandir(subdir.path):
+                if entry.name == LOCK_FILE or entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                results.append((st.st_mtime, st.st_size, entry.path))
+        return results
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, max_size=None, keep=None):
+        """remove least recently used entries until under max_size"""
+        max_size = self.max_size if max_size is None else max_size
+        makedirs(self.dirpath, exist_ok=True)
+        with FileLock(path.join(self.dirpath, LOCK_FILE)):
+            entries = sorted(self.entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, filepath in entries:
+                if total <= max_size:
+                    break
+                if filepath == keep:
+                    continue
+                try:
+                    remove(filepath)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def clear(self):
+        self.evict(0)
+
+
+def default_cache():
+    """the node cache, enabled by setting MLRUN_CACHE_PATH"""
+    dirpath = environ.get('MLRUN_CACHE_PATH')
+    if not dirpath:
+        return None
+    size = int(environ.get('MLRUN_CACHE_SIZE', DEFAULT_CACHE_SIZE))
+    return DataCache(dirpath, size)
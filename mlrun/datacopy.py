@@ -0,0 +1,222 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from fnmatch import fnmatch
+from os import path, makedirs, remove
+from tempfile import NamedTemporaryFile
+
+from .datastore import FileStore, file_digest, DEFAULT_PARALLEL
+from .hashcache import hash_cache
+from .utils import logger, parse_iso
+
+_time_units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def parse_since(mtime):
+    """epoch time from a datetime, epoch, iso string or age (e.g. 30m, 2d)"""
+    if not mtime:
+        return None
+    if isinstance(mtime, datetime):
+        return mtime.timestamp()
+    if isinstance(mtime, (int, float)):
+        return float(mtime)
+    unit = mtime[-1:].lower()
+    if unit in _time_units and mtime[:-1].replace('.', '', 1).isdigit():
+        return time.time() - float(mtime[:-1]) * _time_units[unit]
+    return parse_iso(mtime).timestamp()
+
+
+class CopyStats:
+    """progress and results of a copy"""
+
+    def __init__(self, total=0, total_bytes=0):
+        self.total = total
+        self.total_bytes = total_bytes
+        self.copied = 0
+        self.skipped = 0
+        self.bytes = 0
+        self.errors = []
+        self.start = time.monotonic()
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self.copied + self.skipped + len(self.errors)
+
+    @property
+    def throughput(self):
+        """copied bytes per second"""
+        elapsed = self.elapsed or time.monotonic() - self.start
+        return self.bytes / elapsed if elapsed else 0.0
+
+    def add(self, size=0, skipped=False, error=None):
+        with self._lock:
+            if error:
+                self.errors.append(error)
+            elif skipped:
+                self.skipped += 1
+            else:
+                self.copied += 1
+                self.bytes += size or 0
+
+    def to_dict(self):
+        return {'total': self.total, 'copied': self.copied,
+                'skipped': self.skipped, 'errors': len(self.errors),
+                'bytes': self.bytes, 'elapsed': round(self.elapsed, 3),
+                'throughput': round(self.throughput)}
+
+    def __repr__(self):
+        return ('{}/{} files ({} skipped, {} errors), {:.1f} MB, '
+                '{:.1f} MB/s'.format(self.done, self.total, self.skipped,
+                                     len(self.errors), self.bytes / 1e6,
+                                     self.throughput / 1e6))
+
+
+def _match(relpath, stats, pattern, min_size, max_size, since):
+    if pattern:
+        name = relpath if '/' in pattern else path.basename(relpath)
+        if not fnmatch(name, pattern):
+            return False
+    size = stats.size or 0
+    if min_size and size < min_size:
+        return False
+    if max_size and size > max_size:
+        return False
+    if since and stats.modified and stats.modified < since:
+        return False
+    return True
+
+
+def _digest(store, key, stats):
+    checksum = store._checksum(stats)
+    if checksum:
+        return checksum
+    if isinstance(store, FileStore):
+        filepath = store._join(key)
+        cache = hash_cache()
+        if cache:
+            return 'md5', cache.digest(filepath, 'md5',
+                                       lambda f: file_digest(f, 'md5'))
+        return 'md5', file_digest(filepath, 'md5')
+    return None
+
+
+def _identical(src, src_key, src_stats, dst, dst_key, check):
+    try:
+        dst_stats = dst.stat(dst_key)
+    except (OSError, ValueError):
+        return False
+    if dst_stats.size is None or dst_stats.size != src_stats.size:
+        return False
+    if check == 'mtime':
+        # the copy is newer than the source unless the source changed since
+        return bool(src_stats.modified and dst_stats.modified and
+                    dst_stats.modified >= src_stats.modified)
+    if check == 'hash':
+        src_digest = _digest(src, src_key, src_stats)
+        dst_digest = _digest(dst, dst_key, dst_stats)
+        return src_digest is not None and src_digest == dst_digest
+    return True
+
+
+def _copy_object(src, src_key, dst, dst_key):
+    if isinstance(src, FileStore):
+        dst.upload(dst_key, src._join(src_key))
+    elif isinstance(dst, FileStore):
+        dirpath = path.dirname(dst._join(dst_key))
+        if dirpath:
+            makedirs(dirpath, exist_ok=True)
+        src.download(src_key, dst._join(dst_key))
+    else:
+        with NamedTemporaryFile(delete=False) as fp:
+            tmp = fp.name
+        try:
+            src.download(src_key, tmp)
+            dst.upload(dst_key, tmp)
+        finally:
+            remove(tmp)
+
+
+def _join_key(key, relpath):
+    return '{}/{}'.format(key.rstrip('/'), relpath) if relpath else key
+
+
+def copy(manager, src_url, dst_url, recursive=True, pattern='',
+         min_size=0, max_size=0, mtime=None, check='mtime',
+         parallel=DEFAULT_PARALLEL, progress=None):
+    """copy an object or a directory tree between data stores
+
+    :param manager:    StoreManager (for store credentials/options)
+    :param pattern:    copy only files matching the glob (name or rel path)
+    :param min_size:   min file size in bytes
+    :param max_size:   max file size in bytes
+    :param mtime:      copy files modified since (datetime, epoch, iso
+                       string or age like 30m, 12h, 2d)
+    :param check:      skip identical files, by 'mtime' (size and not
+                       modified since copied), 'size', 'hash' or none ('')
+    :param parallel:   number of copy workers
+    :param progress:   callback(stats) called after every file
+    :return: CopyStats
+    """
+    src, src_key = manager.get_or_create_store(src_url)
+    dst, dst_key = manager.get_or_create_store(dst_url)
+    since = parse_since(mtime)
+
+    entries = src.listdir(src_key, recursive) if recursive else []
+    if entries:
+        tasks = [(_join_key(src_key, rel), _join_key(dst_key, rel), stats)
+                 for rel, stats in entries
+                 if _match(rel, stats, pattern, min_size, max_size, since)]
+    else:
+        if isinstance(src, FileStore) and path.isdir(src._join(src_key)):
+            raise ValueError('source {} {}'.format(
+                src_url, 'has no files' if recursive else
+                'is a directory, copy it recursively'))
+        try:
+            stats = src.stat(src_key)
+        except FileNotFoundError:
+            raise FileNotFoundError('source {} not found'.format(src_url))
+        # single object, copy into the destination if it is a directory
+        if dst_key.endswith('/') or (isinstance(dst, FileStore) and
+                                     path.isdir(dst._join(dst_key))):
+            dst_key = _join_key(dst_key, path.basename(src_key))
+        tasks = [(src_key, dst_key, stats)] if _match(
+            path.basename(src_key), stats, pattern, min_size, max_size,
+            since) else []
+
+    results = CopyStats(len(tasks), sum(t[2].size or 0 for t in tasks))
+
+    def copy_one(task):
+        src_key, dst_key, stats = task
+        try:
+            if check and _identical(src, src_key, stats, dst, dst_key, check):
+                results.add(skipped=True)
+            else:
+                _copy_object(src, src_key, dst, dst_key)
+                results.add(stats.size)
+        except Exception as err:
+            logger.error('failed to copy {} - {}'.format(src_key, err))
+            results.add(error='{}: {}'.format(src_key, err))
+        if progress:
+            progress(results)
+
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        list(pool.map(copy_one, tasks))
+    results.elapsed = time.monotonic() - results.start
+    return results
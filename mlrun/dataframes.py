@@ -0,0 +1,246 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import operator
+
+import pandas as pd
+
+_suffix_formats = {
+    '.csv': 'csv', '.csv.gz': 'csv',
+    '.parquet': 'parquet', '.pq': 'parquet',
+    '.feather': 'feather', '.arrow': 'feather',
+}
+
+# format -> default compression (parquet/feather codecs)
+DF_FORMATS = {'csv': None, 'parquet': 'snappy', 'feather': 'lz4',
+              'arrow': None}
+DEFAULT_ROW_GROUP_SIZE = 128 * 1024
+
+_ops = {
+    '=': operator.eq, '==': operator.eq, '!=': operator.ne,
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+}
+
+
+def df_format(key):
+    """data format (csv, parquet, feather) from the file suffix"""
+    key = key.lower()
+    for suffix, format in _suffix_formats.items():
+        if key.endswith(suffix):
+            return format
+    return 'csv'
+
+
+def read_df(source, format='csv', columns=None, filters=None,
+            chunksize=None, compression=None):
+    """read a DataFrame (or an iterator of DataFrames when chunksize is set)
+
+    :param source:   local file path or a seekable binary file object
+    :param columns:  columns to read (projection)
+    :param filters:  list of (column, op, value) AND-ed row filters, op is
+                     one of = == != < <= > >= in, not in
+    """
+    if format == 'parquet':
+        reader = _read_parquet
+    elif format in ['feather', 'arrow']:
+        reader = _read_feather
+    elif format == 'csv':
+        reader = _read_csv
+    else:
+        raise ValueError('unsupported data format {}'.format(format))
+
+    chunks = reader(source, columns, filters, chunksize,
+                    compression=compression)
+    if chunksize:
+        return chunks
+    chunks = list(chunks)
+    if len(chunks) == 1:
+        return chunks[0]
+    return pd.concat(chunks, ignore_index=True)
+
+
+def _read_columns(columns, filters):
+    """columns to read, the projection plus the filtered columns"""
+    if columns is None:
+        return None
+    extra = [f[0] for f in filters or [] if f[0] not in columns]
+    return list(columns) + list(dict.fromkeys(extra))
+
+
+def _filter_df(df, filters, columns=None):
+    if filters:
+        mask = pd.Series(True, index=df.index)
+        for column, op, value in filters:
+            if op == 'in':
+                mask &= df[column].isin(value)
+            elif op == 'not in':
+                mask &= ~df[column].isin(value)
+            else:
+                mask &= _ops[op](df[column], value)
+        df = df[mask]
+    if columns is not None:
+        df = df[list(columns)]
+    return df
+
+
+def _read_csv(source, columns, filters, chunksize, compression=None):
+    usecols = _read_columns(columns, filters)
+    if not chunksize:
+        df = pd.read_csv(source, usecols=usecols, compression=compression)
+        yield _filter_df(df, filters, columns)
+        return
+    for df in pd.read_csv(source, usecols=usecols, chunksize=chunksize,
+                          compression=compression):
+        yield _filter_df(df, filters, columns)
+
+
+def _stats_match(stats, op, value):
+    """can a row group with these min/max statistics match the filter"""
+    if stats is None or not stats.has_min_max:
+        return True
+    lo, hi = stats.min, stats.max
+    try:
+        if op in ['=', '==']:
+            return lo <= value <= hi
+        if op == '<':
+            return lo < value
+        if op == '<=':
+            return lo <= value
+        if op == '>':
+            return hi > value
+        if op == '>=':
+            return hi >= value
+        if op == 'in':
+            return any(lo <= v <= hi for v in value)
+    except TypeError:
+        pass
+    return True
+
+
+def _row_groups(metadata, filters):
+    """row groups which may match the filters (statistics pushdown)"""
+    names = metadata.schema.names
+    selected = []
+    for i in range(metadata.num_row_groups):
+        group = metadata.row_group(i)
+        match = True
+        for column, op, value in filters or []:
+            if column not in names:
+                continue
+            stats = group.column(names.index(column)).statistics
+            if not _stats_match(stats, op, value):
+                match = False
+                break
+        if match:
+            selected.append(i)
+    return selected
+
+
+def _read_parquet(source, columns, filters, chunksize, compression=None):
+    import pyarrow.parquet as pq
+
+    pf = pq.ParquetFile(source)
+    groups = _row_groups(pf.metadata, filters)
+    read_columns = _read_columns(columns, filters)
+    if not groups:
+        schema = pf.schema_arrow
+        names = read_columns or schema.names
+        empty = schema.empty_table().select(names).to_pandas()
+        yield _filter_df(empty, filters, columns)
+        return
+    if chunksize:
+        for batch in pf.iter_batches(batch_size=chunksize, row_groups=groups,
+                                     columns=read_columns):
+            yield _filter_df(batch.to_pandas(), filters, columns)
+    else:
+        table = pf.read_row_groups(groups, columns=read_columns)
+        yield _filter_df(table.to_pandas(), filters, columns)
+
+
+def _read_feather(source, columns, filters, chunksize, compression=None):
+    import pyarrow as pa
+
+    if isinstance(source, str):
+        source = pa.memory_map(source)
+    reader = pa.ipc.open_file(source)
+    read_columns = _read_columns(columns, filters)
+    if not chunksize:
+        table = reader.read_all()
+        if read_columns is not None:
+            table = table.select(read_columns)
+        yield _filter_df(table.to_pandas(), filters, columns)
+        return
+
+    for i in range(reader.num_record_batches):
+        batch = reader.get_batch(i)
+        if read_columns is not None:
+            batch = batch.select(read_columns)
+        df = batch.to_pandas()
+        for start in range(0, len(df), chunksize):
+            yield _filter_df(df.iloc[start:start + chunksize], filters,
+                             columns)
+
+
+def check_df_format(format):
+    if format not in DF_FORMATS:
+        raise ValueError('unsupported data format {}, use one of {}'.format(
+            format, ', '.join(DF_FORMATS.keys())))
+    return format
+
+
+def df_schema(df, format='csv'):
+    """list of {name, type} column dicts, arrow types for arrow formats"""
+    if format == 'csv':
+        return [{'name': str(name), 'type': str(dtype)}
+                for name, dtype in df.dtypes.items()]
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    return [{'name': field.name, 'type': str(field.type)}
+            for field in schema]
+
+
+def write_df(df, target, format='csv', compression=None,
+             row_group_size=None):
+    """write a DataFrame to a local file path or a binary file object
+
+    :param format:         csv, parquet, feather or arrow (ipc file)
+    :param compression:    parquet (snappy, gzip, zstd, ..) or feather/arrow
+                           (lz4, zstd) codec, default by format
+    :param row_group_size: rows per parquet row group / ipc record batch
+    """
+    check_df_format(format)
+    compression = compression or DF_FORMATS[format]
+    if format == 'csv':
+        df.to_csv(target, index=False, encoding='utf-8',
+                  compression=compression)
+        return
+
+    import pyarrow as pa
+
+    row_group_size = row_group_size or DEFAULT_ROW_GROUP_SIZE
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if format == 'parquet':
+        import pyarrow.parquet as pq
+        pq.write_table(table, target, compression=compression,
+                       row_group_size=row_group_size)
+    elif format == 'feather':
+        import pyarrow.feather as feather
+        feather.write_feather(table, target, compression=compression,
+                              chunksize=row_group_size)
+    else:
+        options = pa.ipc.IpcWriteOptions(compression=compression)
+        with pa.ipc.new_file(target, table.schema, options=options) as writer:
+            for batch in table.to_batches(max_chunksize=row_group_size):
+                writer.write_batch(batch)
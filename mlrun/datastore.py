@@ -12,15 +12,57 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import hashlib
+import io
+import json
+import mimetypes
+import mmap
+import threading
+import time
+import weakref
 from base64 import b64encode
-from os import path, environ, makedirs
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from tempfile import gettempdir, NamedTemporaryFile
+from os import path, environ, makedirs, replace, stat, fstat, remove
+from os import walk
 from shutil import copyfile
+from email.utils import parsedate_to_datetime
+from xml.etree import ElementTree
 from urllib.parse import urlparse
-from .utils import run_keys
+from .cas import REF_MAX_SIZE, parse_ref
+from .compression import (ENCODINGS, check_encoding, encoding_from_suffix,
+                          detect_encoding, file_encoding, compress,
+                          decompress, compress_file, decompress_file,
+                          open_decompressed, ratio)
+from .datacache import default_cache
+from .dataframes import df_format, read_df
+from .utils import run_keys, atomic_write, tmp_path, logger, parse_iso
+import aiohttp
 import boto3
+from botocore.exceptions import ClientError
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 V3IO_LOCAL_ROOT = 'v3io'
+# read-ahead buffer size for streaming (open) access to remote objects
+DEFAULT_READ_AHEAD = 1024 * 1024
+# transfer defaults, can be overridden per store via store.options
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_PARALLEL = 8
+DEFAULT_RETRIES = 3
+# S3 multipart limits
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+S3_MAX_PARTS = 10000
+# http connection pools (per endpoint) and retries of idempotent requests
+HTTP_POOL_SIZE = int(environ.get('MLRUN_HTTP_POOL_SIZE', '32'))
+HTTP_RETRIES = int(environ.get('MLRUN_HTTP_RETRIES', '3'))
+HTTP_BACKOFF = float(environ.get('MLRUN_HTTP_BACKOFF', '0.3'))
+# max concurrent async datastore operations (per store manager)
+ASYNC_LIMIT = int(environ.get('MLRUN_ASYNC_LIMIT', '64'))
 
 
 def parseurl(url):
@@ -50,10 +92,130 @@ def uri_to_ipython(link):
     return schema_to_store(schema).uri_to_ipython(endpoint, subpath)
 
 
+class HttpSessions:
+    """shared keep-alive requests sessions, one pool per endpoint
+
+    idempotent requests (GET, HEAD, PUT, DELETE) are retried with
+    exponential backoff on connection errors and 5xx responses.
+    """
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, retries=HTTP_RETRIES,
+                 backoff=HTTP_BACKOFF):
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff = backoff
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session(self, url, retries=None):
+        """get the session for the url endpoint (scheme://host:port)"""
+        p = urlparse(url)
+        retries = self.retries if retries is None else retries
+        key = ('{}://{}'.format(p.scheme, p.netloc), retries)
+        with self._lock:
+            session = self._sessions.get(key)
+            if not session:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1,
+                                      pool_maxsize=self.pool_size,
+                                      max_retries=self._retry(retries))
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[key] = session
+        return session
+
+    def _retry(self, retries):
+        if not retries:
+            return 0
+        methods = frozenset(['HEAD', 'GET', 'PUT', 'DELETE', 'OPTIONS'])
+        kw = dict(total=retries, backoff_factor=self.backoff,
+                  status_forcelist=[500, 502, 503, 504],
+                  raise_on_status=False)
+        try:
+            return Retry(allowed_methods=methods, **kw)
+        except TypeError:
+            # urllib3 < 1.26
+            return Retry(method_whitelist=methods, **kw)
+
+    def stats(self):
+        """requests and opened connections per endpoint (connection reuse)"""
+        results = {}
+        with self._lock:
+            sessions = list(self._sessions.items())
+        for (endpoint, _), session in sessions:
+            stats = results.setdefault(endpoint,
+                                       {'requests': 0, 'connections': 0})
+            adapters = {id(a): a for a in session.adapters.values()}
+            for adapter in adapters.values():
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools[key]
+                    if pool:
+                        stats['requests'] += pool.num_requests
+                        stats['connections'] += pool.num_connections
+        return results
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+
+# process wide sessions, used by default by all store managers
+http_sessions = HttpSessions()
+
+
+class AsyncSessions:
+    """aiohttp sessions per endpoint and a concurrency limiter
+
+    aiohttp sessions are bound to an event loop, sessions are re-created
+    when used from a new loop.
+    """
+
+    def __init__(self, limit=ASYNC_LIMIT):
+        self.limit = limit
+        self._loop = None
+        self._sessions = {}
+        self._semaphore = None
+
+    def _check_loop(self):
+        loop = asyncio.get_event_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._sessions = {}
+            self._semaphore = asyncio.Semaphore(self.limit)
+
+    @property
+    def semaphore(self):
+        self._check_loop()
+        return self._semaphore
+
+    def session(self, url):
+        self._check_loop()
+        p = urlparse(url)
+        endpoint = '{}://{}'.format(p.scheme, p.netloc)
+        session = self._sessions.get(endpoint)
+        if not session or session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit)
+            session = aiohttp.ClientSession(connector=connector)
+            self._sessions[endpoint] = session
+        return session
+
+    async def close(self):
+        sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            await session.close()
+
+
 class StoreManager:
-    def __init__(self, secrets=None):
+    def __init__(self, secrets=None, sessions=None, cache=None,
+                 async_limit=ASYNC_LIMIT):
         self._stores = {}
         self._secrets = secrets
+        self._sessions = sessions or http_sessions
+        self._async = AsyncSessions(async_limit)
+        self.cache = cache if cache is not None else default_cache()
 
     def from_dict(self, struct: dict):
         stor_list = struct.get(run_keys.data_stores)
@@ -71,14 +233,59 @@ class StoreManager:
         struct[run_keys.data_stores] = [stor.to_dict() for stor in self._stores.values() if stor.from_spec]
 
     def secret(self, key):
+        if not self._secrets:
+            return None
         return self._secrets.get(key)
 
+    def http_session(self, url, retries=None):
+        return self._sessions.session(url, retries)
+
+    def http_stats(self):
+        return self._sessions.stats()
+
+    def async_session(self, url):
+        return self._async.session(url)
+
+    def async_limit(self):
+        """semaphore limiting concurrent async operations"""
+        return self._async.semaphore
+
+    async def aclose(self):
+        await self._async.close()
+
+    async def agather_get(self, urls):
+        """get many objects concurrently, results are in urls order"""
+        return await asyncio.gather(
+            *[self.object(url, url).aget() for url in urls])
+
+    def gather_get(self, urls):
+        """get many objects concurrently from the calling thread"""
+        async def gather():
+            try:
+                return await self.agather_get(urls)
+            finally:
+                await self.aclose()
+
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(gather())
+        finally:
+            loop.close()
+
+    def copy(self, src_url, dst_url, recursive=True, **kwargs):
+        """parallel copy of an object or a directory tree between stores,
+        see mlrun.datacopy.copy for filters and options"""
+        from .datacopy import copy
+        return copy(self, src_url, dst_url, recursive, **kwargs)
+
     def _add_store(self, store):
         self._stores[store.name] = store
 
-    def object(self, key, realpath=''):
+    def object(self, key, realpath='', encoding=None):
+        """data item for the url, encoding is the recorded compression
+        (e.g. the artifact encoding) to decode on reads"""
         store, ipath = self.get_or_create_store(realpath)
-        return DataItem(key, store, ipath, realpath)
+        return DataItem(key, store, ipath, realpath, encoding=encoding)
 
     def get_or_create_store(self, url):
         schema, endpoint, subpath = parseurl(url)
@@ -98,6 +305,15 @@ class StoreManager:
         return store, subpath
 
 
+mimetypes.add_type('image/webp', '.webp')
+
+
+def guess_content_type(key):
+    """content type by the key suffix (None if unknown or encoded)"""
+    content_type, encoding = mimetypes.guess_type(key)
+    return None if encoding else content_type
+
+
 class DataStore:
     def __init__(self, parent: StoreManager, name, kind, endpoint=''):
         self._parent = parent
@@ -108,6 +324,11 @@ class DataStore:
         self.secret_pfx = ''
         self.options = {}
         self.from_spec = False
+        # False once the store is known to ignore ranged gets, reads and
+        # downloads then use a single streaming get
+        self.ranges = True
+        # [raw bytes, stored bytes] of compressed writes
+        self.compression_stats = [0, 0]
 
     @property
     def is_structured(self):
@@ -133,24 +354,280 @@ class DataStore:
     def _secret(self, key):
         return self._parent.secret(self.secret_pfx + key)
 
+    def _session(self):
+        return self._parent.http_session(self.url)
+
     @property
     def url(self):
         return '{}://{}'.format(self.kind, self.endpoint)
 
-    def get(self, key, tag=''):
+    def get(self, key, tag='', offset=0, size=None):
         pass
 
+    def stat(self, key, tag=''):
+        raise ValueError('data store doesnt support stat')
+
+    def listdir(self, key, recursive=True):
+        """list objects under the key (directory/prefix)
+
+        return a list of (relative path, FileStats), empty if key is not a
+        directory
+        """
+        raise ValueError('data store doesnt support listing')
+
+    def open(self, key, mode='rb', tag=''):
+        """open a buffered, seekable reader backed by ranged gets"""
+        if mode not in ['r', 'rb']:
+            raise ValueError('only read modes are supported (r, rb)')
+        raw = RangeReader(self, key, tag)
+        reader = io.BufferedReader(
+            raw, self.options.get('read_ahead', DEFAULT_READ_AHEAD))
+        if mode == 'r':
+            return io.TextIOWrapper(reader, encoding='utf-8')
+        return reader
+
+    def cached(self, key, tag=''):
+        """local path of the object in the node cache (fetched on a miss),
+        None when there is no cache or the object version is unknown"""
+        cache = self._parent.cache
+        if not cache:
+            return None
+        try:
+            stats = self.stat(key, tag)
+        except ValueError:
+            return None
+        version = stats.etag or stats.modified
+        if not version:
+            return None
+        url = '{}/{}'.format(self.url, self._join(key).lstrip('/'))
+        return cache.get(url, version,
+                         lambda target: self.download(key, target, tag),
+                         stats.size)
+
+    def local(self, key, tag=''):
+        """local file path of the object (cached, or a temp file copy which
+        the caller removes, DataItem.local() does it on close)"""
+        cached = self.cached(key, tag)
+        if cached:
+            return cached
+        with NamedTemporaryFile(suffix='-' + path.basename(key),
+                                delete=False) as fp:
+            target = fp.name
+        self.download(key, target, tag)
+        return target
+
     def query(self, key, query='', tag='', **kwargs):
         raise ValueError('data store doesnt support structured queries')
 
     def put(self, key, data, tag=''):
         pass
 
+    def delete(self, key):
+        raise ValueError('data store doesnt support delete')
+
+    def append(self, key, data):
+        """append data to an object (created if missing), stores without
+        appends read and rewrite the whole object"""
+        try:
+            self.stat(key)
+            data = self.get(key) + data
+        except FileNotFoundError:
+            pass
+        self.put(key, data)
+
+    def _option(self, key, default):
+        return self.options.get(key, default)
+
+    # transparent compression, store option compression: gzip, zstd or
+    # auto (by the key suffix, .gz or .zst), reads decode only a recorded
+    # encoding (the option, an artifact/reference encoding), other objects
+    # are returned as stored
+    @property
+    def compressed(self):
+        return bool(self._option('compression', None))
+
+    def encoding(self, key):
+        """compression encoding for objects written to key"""
+        setting = self._option('compression', None)
+        if setting == 'auto':
+            return encoding_from_suffix(key)
+        return check_encoding(setting)
+
+    def put_encoded(self, key, data, tag='', encoding=None):
+        """put data compressed with the encoding (default from options)
+
+        return the encoding used (None if stored raw)
+        """
+        encoding = check_encoding(encoding) or self.encoding(key)
+        if not encoding:
+            self.put(key, data, tag)
+            return None
+        if isinstance(data, str):
+            data = data.encode()
+        raw_size = len(data)
+        data = compress(data, encoding)
+        self._add_compression_stats(key, raw_size, len(data))
+        self.put(key, data, tag)
+        return encoding
+
+    def upload_encoded(self, key, src_path, tag='', encoding=None,
+                       hasher=None):
+        """upload a file compressed (streaming) with the encoding
+
+        hasher (hashlib like object) is updated with the raw file data
+        while it is read for the upload (single pass)
+        """
+        encoding = check_encoding(encoding) or self.encoding(key)
+        if not encoding:
+            self.upload(key, src_path, tag, hasher=hasher)
+            return None
+        with NamedTemporaryFile(suffix=ENCODINGS[encoding][0],
+                                delete=False) as fp:
+            tmp = fp.name
+        try:
+            raw_size, size = compress_file(src_path, tmp, encoding, hasher)
+            self._add_compression_stats(key, raw_size, size)
+            self.upload(key, tmp, tag)
+        finally:
+            if path.isfile(tmp):
+                remove(tmp)
+        return encoding
+
+    def _add_compression_stats(self, key, raw_size, size):
+        self.compression_stats[0] += raw_size
+        self.compression_stats[1] += size
+        logger.debug('compressed {} {} -> {} bytes ({:.1f}x)'.format(
+            key, raw_size, size, ratio(raw_size, size)))
+
+    @property
+    def compression_ratio(self):
+        """raw/stored size ratio of the compressed writes"""
+        return ratio(*self.compression_stats)
+
+    def get_decoded(self, key, tag='', encoding=None):
+        """get data decoded with the encoding (default from options)"""
+        encoding = check_encoding(encoding) or self.encoding(key)
+        return decompress(self.get(key, tag), encoding)
+
+    async def aget_decoded(self, key, tag='', encoding=None):
+        encoding = check_encoding(encoding) or self.encoding(key)
+        data = await self.aget(key, tag)
+        if encoding and isinstance(data, bytes) and \
+                detect_encoding(data) == encoding:
+            return await self._in_thread(decompress, data, encoding)
+        return data
+
+    async def aput_encoded(self, key, data, tag='', encoding=None):
+        return await self._in_thread(self.put_encoded, key, data, tag,
+                                     encoding)
+
+    async def aupload_encoded(self, key, src_path, tag='', encoding=None):
+        return await self._in_thread(self.upload_encoded, key, src_path, tag,
+                                     encoding)
+
+    # async api, stores without a native implementation run the sync
+    # methods in the loop executor (thread pool)
+    async def _in_thread(self, func, *args):
+        async with self._parent.async_limit():
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(None, partial(func, *args))
+
+    async def aget(self, key, tag='', offset=0, size=None):
+        return await self._in_thread(self.get, key, tag, offset, size)
+
+    async def aput(self, key, data, tag=''):
+        await self._in_thread(self.put, key, data, tag)
+
+    async def aupload(self, key, src_path, tag=''):
+        await self._in_thread(self.upload, key, src_path, tag)
+
+    async def adownload(self, key, target_path, tag=''):
+        await self._in_thread(self.download, key, target_path, tag)
+
     def download(self, key, target_path, tag=''):
-        text = self.get(key, tag)
-        with open(target_path, 'w') as fp:
-            fp.write(text)
-            fp.close()
+        """download an object to a local file
+
+        objects larger than the part size are fetched as concurrent ranged
+        chunks written in place, store options: part_size, parallel,
+        retries, verify (check size and checksum, default True)
+        """
+        try:
+            stats = self.stat(key, tag)
+        except FileNotFoundError:
+            raise
+        except (ValueError, OSError):
+            # no stat support (e.g. http servers rejecting HEAD)
+            stats = None
+        part_size = self._option('part_size', DEFAULT_PART_SIZE)
+        tmp = tmp_path(target_path)
+        try:
+            if not stats or stats.size is None or \
+                    stats.size <= part_size or not self.ranges:
+                self._download_stream(key, tmp, tag)
+            else:
+                self._download_parts(key, tmp, stats.size, part_size, tag)
+
+            if stats and self._option('verify', True):
+                self._verify(tmp, stats)
+            replace(tmp, target_path)
+        except BaseException:
+            if path.isfile(tmp):
+                remove(tmp)
+            raise
+
+    def _download_stream(self, key, target_path, tag=''):
+        """download the object with a single (streaming) read"""
+        data = self.get(key, tag)
+        if isinstance(data, str):
+            data = data.encode()
+        with open(target_path, 'wb') as fp:
+            fp.write(data)
+
+    def _stream(self, key, tag=''):
+        """binary reader of the whole object (a single get)"""
+        data = self.get(key, tag)
+        return io.BytesIO(data.encode() if isinstance(data, str) else data)
+
+    def _download_parts(self, key, target_path, size, part_size, tag=''):
+        with open(target_path, 'wb') as fp:
+            fp.truncate(size)
+
+        def fetch(offset):
+            length = min(part_size, size - offset)
+            data = retry(self._option('retries', DEFAULT_RETRIES),
+                         self.get, key, tag, offset, length)
+            if len(data) != length:
+                raise OSError('short read at offset {} of {} ({} != {})'.format(
+                    offset, key, len(data), length))
+            with open(target_path, 'r+b') as fp:
+                fp.seek(offset)
+                fp.write(data)
+
+        # the first part tells if the server honors ranged gets
+        fetch(0)
+        if not self.ranges:
+            self._download_stream(key, target_path, tag)
+            return
+        workers = self._option('parallel', DEFAULT_PARALLEL)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # list() propagates the first chunk error
+            list(pool.map(fetch, range(part_size, size, part_size)))
+
+    def _checksum(self, stats):
+        """(hashlib algorithm, hex digest) of the object, if known"""
+        return None
+
+    def _verify(self, filepath, stats):
+        if stats.size is not None and path.getsize(filepath) != stats.size:
+            raise OSError('downloaded size mismatch ({} != {})'.format(
+                path.getsize(filepath), stats.size))
+        checksum = self._checksum(stats)
+        if checksum:
+            algo, expected = checksum
+            digest = file_digest(filepath, algo)
+            if digest != expected:
+                raise OSError('downloaded checksum mismatch ({} != {})'.format(
+                    digest, expected))
 
     def upload(self, key, src_path, tag=''):
         pass
@@ -164,29 +641,462 @@ class DataStore:
             }
 
 
+def retry(retries, func, *args, **kwargs):
+    """call func, retry with exponential backoff on errors"""
+    for attempt in range(retries + 1):
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            if attempt >= retries:
+                raise
+            time.sleep(0.1 * 2 ** attempt)
+
+
+def read_chunks(fp, hasher=None, size=None, chunk_size=1024 * 1024):
+    """iterate over file chunks (up to size bytes), updating the hasher"""
+    remaining = size
+    while remaining is None or remaining > 0:
+        data = fp.read(chunk_size if remaining is None
+                       else min(chunk_size, remaining))
+        if not data:
+            break
+        if hasher:
+            hasher.update(data)
+        if remaining is not None:
+            remaining -= len(data)
+        yield data
+
+
+def file_digest(filepath, algo='md5'):
+    h = hashlib.new(algo)
+    b = bytearray(1024 * 1024)
+    mv = memoryview(b)
+    with open(filepath, 'rb', buffering=0) as fp:
+        for n in iter(lambda: fp.readinto(mv), 0):
+            h.update(mv[:n])
+    return h.hexdigest()
+
+
+class UploadState:
+    """persisted progress of a multi-part upload, used to resume uploads
+
+    state files are kept under $MLRUN_UPLOAD_STATE_DIR (or the temp dir)
+    keyed by the target url and the source file path, size and mtime.
+    """
+
+    def __init__(self, url, src_path):
+        st = stat(src_path)
+        key = '{}|{}|{}|{}'.format(url, path.abspath(src_path),
+                                   st.st_size, st.st_mtime_ns)
+        dirpath = environ.get('MLRUN_UPLOAD_STATE_DIR') or \
+            path.join(gettempdir(), 'mlrun-uploads')
+        self.filepath = path.join(
+            dirpath, hashlib.sha1(key.encode()).hexdigest() + '.json')
+        self.upload_id = None
+        self.offset = 0
+        self.parts = {}
+        self._lock = threading.Lock()
+        if path.isfile(self.filepath):
+            with open(self.filepath) as fp:
+                struct = json.load(fp)
+            self.upload_id = struct.get('upload_id')
+            self.offset = struct.get('offset', 0)
+            self.parts = {int(k): v for k, v in struct.get('parts', {}).items()}
+
+    def save(self):
+        with self._lock:
+            makedirs(path.dirname(self.filepath), exist_ok=True)
+            atomic_write(self.filepath, json.dumps(
+                {'upload_id': self.upload_id, 'offset': self.offset,
+                 'parts': self.parts}))
+
+    def add_part(self, num, etag):
+        with self._lock:
+            self.parts[num] = etag
+        self.save()
+
+    def clear(self):
+        if path.isfile(self.filepath):
+            remove(self.filepath)
+
+
+class FileStats:
+    def __init__(self, size, modified, etag=None, content_type=None,
+                 encryption=None):
+        self.size = size
+        self.modified = modified
+        self.etag = etag
+        self.content_type = content_type
+        # server side encryption (e.g. aws:kms), may change the etag
+        self.encryption = encryption
+        # http Accept-Ranges header (bytes, none or None if unknown)
+        self.accept_ranges = None
+
+    def __repr__(self):
+        return 'FileStats(size={}, modified={}, etag={})'.format(
+            self.size, self.modified, self.etag)
+
+
+class RangeReader(io.RawIOBase):
+    """raw seekable reader over a store object using ranged gets
+
+    when the store ignores ranges (http servers replying 200 to a ranged
+    get) reads continue from a single streaming get, seeking backwards
+    restarts the stream.
+    """
+
+    def __init__(self, store, key, tag=''):
+        self._store = store
+        self._key = key
+        self._tag = tag
+        self._pos = 0
+        self._size = None
+        self._stream = None
+        self._stream_pos = 0
+
+    @property
+    def size(self):
+        if self._size is None:
+            self._size = self._store.stat(self._key, self._tag).size
+            if self._size is None:
+                raise OSError('object size is unknown ({})'.format(self._key))
+        return self._size
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError('negative seek position {}'.format(offset))
+        self._pos = offset
+        return self._pos
+
+    def _read(self, size):
+        size = min(size, self.size - self._pos)
+        if size <= 0:
+            return b''
+        if self._store.ranges:
+            data = self._store.get(self._key, self._tag, self._pos, size)
+        else:
+            data = self._read_stream(size)
+        self._pos += len(data)
+        return data
+
+    def _read_stream(self, size):
+        if self._stream is None or self._stream_pos > self._pos:
+            self._close_stream()
+            self._stream = self._store._stream(self._key, self._tag)
+            self._stream_pos = 0
+        while self._stream_pos < self._pos:
+            skipped = self._stream.read(
+                min(self._pos - self._stream_pos, DEFAULT_READ_AHEAD))
+            if not skipped:
+                return b''
+            self._stream_pos += len(skipped)
+        data = self._stream.read(size)
+        self._stream_pos += len(data)
+        return data
+
+    def _close_stream(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def close(self):
+        self._close_stream()
+        super().close()
+
+    def readinto(self, b):
+        data = self._read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def readall(self):
+        return self._read(self.size - self._pos)
+
+
+def _remove_files(filepaths):
+    while filepaths:
+        filepath = filepaths.pop()
+        try:
+            remove(filepath)
+        except FileNotFoundError:
+            pass
+
+
 class DataItem:
-    def __init__(self, key, store, path, realpath='', tag=''):
+    def __init__(self, key, store, path, realpath='', tag='', encoding=None):
         self._store = store
         self._key = key
         self._realpath = realpath
         self._path = path
         self._tag = tag
+        # recorded compression (e.g. artifact encoding), default by the
+        # store options
+        self._encoding = check_encoding(encoding)
+        self._source = None
+        self._source_encoding = None
+        # temp copies made by local(), removed by close() or on collection
+        self._tmpfiles = []
+        self._finalizer = weakref.finalize(self, _remove_files,
+                                           self._tmpfiles)
 
     @property
     def url(self):
         return self._realpath or self._key
 
+    def _resolve(self, head=None):
+        """(store, key, tag) to read the data from, content addressed
+        references (see mlrun.cas) are followed to their blob"""
+        if self._source is None:
+            ref = None
+            if head is not None or self._ref_size():
+                if head is None:
+                    head = self._store.get(self._path, self._tag, 0,
+                                           REF_MAX_SIZE)
+                ref = parse_ref(head)
+            if ref:
+                store, key = self._store._parent.get_or_create_store(
+                    ref['target'])
+                self._source = (store, key, '')
+                self._source_encoding = check_encoding(ref.get('encoding'))
+            else:
+                self._source = (self._store, self._path, self._tag)
+                self._source_encoding = self._encoding or \
+                    self._store.encoding(self._path)
+        return self._source
+
+    @property
+    def encoding(self):
+        """recorded compression of the data (None if stored raw)"""
+        self._resolve()
+        return self._source_encoding
+
+    def _encoded(self, filepath):
+        """True if the local file holds data in the recorded encoding"""
+        encoding = self.encoding
+        return bool(encoding) and file_encoding(filepath) == encoding
+
+    def _ref_size(self):
+        """False if the object is too large to be a reference (by stat),
+        saves reading its head"""
+        try:
+            size = self._store.stat(self._path, self._tag).size
+        except FileNotFoundError:
+            raise
+        except (ValueError, OSError):
+            return True
+        return size is None or size <= REF_MAX_SIZE
+
+    def _is_ref(self):
+        return self._source[0] is not self._store or \
+            self._source[1] != self._path
+
     def get(self):
-        return self._store.get(self._path, self._tag)
+        if self._source is None:
+            data = self._get(self._store, self._path, self._tag)
+            self._resolve(data)
+            if not self._is_ref():
+                return decompress(data, self._source_encoding)
+        return decompress(self._get(*self._source), self._source_encoding)
+
+    @staticmethod
+    def _get(store, key, tag):
+        cached = store.cached(key, tag)
+        if cached:
+            try:
+                with open(cached, 'rb') as fp:
+                    return fp.read()
+            except FileNotFoundError:
+                pass  # evicted meanwhile
+        return store.get(key, tag)
+
+    def local(self):
+        """local file path of the object, no copy for local (or cached)
+        files, compressed objects are decompressed to a temp file
+
+        temp copies are removed when the item is closed (close() or a with
+        block) or garbage collected
+        """
+        store, key, tag = self._resolve()
+        filepath = store.cached(key, tag)
+        if not filepath:
+            filepath = self._tmpfile(key)
+            store.download(key, filepath, tag)
+        if not self._encoded(filepath):
+            return filepath
+        target = self._tmpfile(key)
+        decompress_file(filepath, target, self._source_encoding)
+        if filepath in self._tmpfiles:
+            self._tmpfiles.remove(filepath)
+            remove(filepath)
+        return target
+
+    def _tmpfile(self, key):
+        with NamedTemporaryFile(suffix='-' + path.basename(key),
+                                delete=False) as fp:
+            self._tmpfiles.append(fp.name)
+            return fp.name
+
+    def close(self):
+        """remove the temp copies made by local()"""
+        _remove_files(self._tmpfiles)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def as_buffer(self):
+        """read-only buffer of the object data
+
+        local files and cached objects are memory mapped (zero copy, the
+        page cache is shared between processes), others are read to memory.
+        """
+        store, key, tag = self._resolve()
+        filepath = store.cached(key, tag)
+        if filepath:
+            try:
+                with open(filepath, 'rb') as fp:
+                    if fstat(fp.fileno()).st_size == 0:
+                        return memoryview(b'')
+                    encoding = self._source_encoding
+                    if encoding and detect_encoding(fp.read(4)) == encoding:
+                        fp.seek(0)
+                        return memoryview(decompress(fp.read(), encoding))
+                    # the map stays valid after the file is closed
+                    return memoryview(
+                        mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ))
+            except FileNotFoundError:
+                pass  # evicted meanwhile
+        data = decompress(store.get(key, tag), self._source_encoding)
+        if isinstance(data, str):
+            data = data.encode()
+        # memoryview of bytes is read-only
+        return memoryview(bytes(data))
+
+    def as_df(self, columns=None, filters=None, format='', chunksize=None):
+        """read the object as a pandas DataFrame
+
+        the format (csv, parquet, feather) is detected from the suffix,
+        parquet row groups are skipped using their statistics (filter
+        pushdown) and only the requested columns are read.
+
+        :param columns:   list of columns to read
+        :param filters:   list of (column, op, value) AND-ed row filters
+        :param format:    csv, parquet or feather (default by suffix)
+        :param chunksize: return an iterator of DataFrames with up to
+                          chunksize rows each
+        """
+        format = format or df_format(self._path)
+        store, key, tag = self._resolve()
+        source = store.cached(key, tag)
+        if source and not self._encoded(source):
+            return read_df(source, format, columns, filters, chunksize)
+
+        raw = open(source, 'rb') if source else self._open_raw()
+        fp = open_decompressed(raw, self._source_encoding)
+        if fp is not raw and format != 'csv':
+            # decompressed streams are not seekable (parquet/feather)
+            with fp:
+                data = fp.read()
+            return read_df(io.BytesIO(data), format, columns, filters,
+                           chunksize)
+        if not chunksize:
+            with fp:
+                return read_df(fp, format, columns, filters)
+
+        def chunks():
+            with fp:
+                yield from read_df(fp, format, columns, filters, chunksize)
+        return chunks()
+
+    def as_numpy(self, dtype='uint8', shape=None, offset=0):
+        """read-only numpy array view of the object data (no copy)"""
+        array = np.frombuffer(self.as_buffer(), dtype=dtype, offset=offset)
+        if shape is not None:
+            array = array.reshape(shape)
+        return array
+
+    def _open_raw(self):
+        store, key, tag = self._resolve()
+        fp = store.open(key, 'rb', tag)
+        # the encoding is detected by peeking at the first bytes
+        return fp if hasattr(fp, 'peek') else io.BufferedReader(fp)
+
+    def open(self, mode='rb'):
+        """open the object as a (streaming) file-like object, compressed
+        objects are decompressed while reading"""
+        if mode not in ['r', 'rb']:
+            store, key, tag = self._resolve()
+            return store.open(key, mode, tag)
+        fp = open_decompressed(self._open_raw(), self.encoding)
+        if mode == 'r':
+            return io.TextIOWrapper(fp, encoding='utf-8')
+        return fp
 
     def download(self, target_path):
-        self._store.download(self._path, target_path, self._tag)
+        store, key, tag = self._resolve()
+        store.download(key, target_path, tag)
+        if not self._encoded(target_path):
+            return
+        tmp = tmp_path(target_path, '.z.tmp')
+        try:
+            decompress_file(target_path, tmp, self._source_encoding)
+            replace(tmp, target_path)
+        finally:
+            if path.isfile(tmp):
+                remove(tmp)
 
     def put(self, data):
-        self._store.put(self._path, data, self._tag)
+        self._store.put_encoded(self._path, data, self._tag, self._encoding)
+        self._source = None
 
     def upload(self, src_path):
-        self._store.upload(self._path, src_path, self._tag)
+        self._store.upload_encoded(self._path, src_path, self._tag,
+                                   self._encoding)
+        self._source = None
+
+    async def aget(self):
+        if self._source is None:
+            data = await self._store.aget(self._path, self._tag)
+            self._resolve(data)
+            if not self._is_ref():
+                return await self._adecode(data)
+        store, key, tag = self._source
+        return await self._adecode(await store.aget(key, tag))
+
+    async def _adecode(self, data):
+        encoding = self._source_encoding
+        if encoding and isinstance(data, bytes) and \
+                detect_encoding(data) == encoding:
+            return await self._store._in_thread(decompress, data, encoding)
+        return data
+
+    async def aput(self, data):
+        await self._store.aput_encoded(self._path, data, self._tag,
+                                       self._encoding)
+        self._source = None
+
+    async def aupload(self, src_path):
+        await self._store.aupload_encoded(self._path, src_path, self._tag,
+                                          self._encoding)
+        self._source = None
+
+    async def adownload(self, target_path):
+        # resolves references and decodes, same as download
+        await self._store._in_thread(self.download, target_path)
 
     def to_dict(self):
         out = {
@@ -209,20 +1119,53 @@ class FileStore(DataStore):
     def _join(self, key):
         return path.join(self.subpath, key)
 
-    def get(self, key, tag=''):
+    def get(self, key, tag='', offset=0, size=None):
         with open(self._join(key), 'rb') as fp:
-            return fp.read()
+            if offset:
+                fp.seek(offset)
+            return fp.read(-1 if size is None else size)
+
+    def stat(self, key, tag=''):
+        st = stat(self._join(key))
+        return FileStats(st.st_size, st.st_mtime)
+
+    def listdir(self, key, recursive=True):
+        base = self._join(key)
+        if not path.isdir(base):
+            return []
+        results = []
+        for root, dirs, files in walk(base):
+            if not recursive:
+                dirs[:] = []
+            for name in files:
+                filepath = path.join(root, name)
+                st = stat(filepath)
+                results.append((path.relpath(filepath, base).replace('\\', '/'),
+                                FileStats(st.st_size, st.st_mtime)))
+        return results
+
+    def open(self, key, mode='rb', tag=''):
+        return open(self._join(key), mode)
+
+    def cached(self, key, tag=''):
+        # local files are used in place
+        return self._join(key)
 
     def put(self, key, data, tag=''):
         dir = path.dirname(self._join(key))
         if dir:
             makedirs(dir, exist_ok=True)
-        mode = 'w'
-        if isinstance(data, bytes):
-            mode = 'wb'
-        with open(self._join(key), mode) as fp:
+        atomic_write(self._join(key), data)
+
+    def delete(self, key):
+        remove(self._join(key))
+
+    def append(self, key, data):
+        dir = path.dirname(self._join(key))
+        if dir:
+            makedirs(dir, exist_ok=True)
+        with open(self._join(key), 'ab') as fp:
             fp.write(data)
-            fp.close()
 
     def download(self, key, target_path, tag=''):
         fullpath = self._join(key)
@@ -230,11 +1173,30 @@ class FileStore(DataStore):
             return
         copyfile(fullpath, target_path)
 
-    def upload(self, key, src_path, tag=''):
+    def upload(self, key, src_path, tag='', hasher=None):
         fullpath = self._join(key)
         if fullpath == src_path:
+            if hasher:
+                with open(src_path, 'rb') as fp:
+                    for _ in read_chunks(fp, hasher):
+                        pass
             return
-        copyfile(src_path, fullpath)
+        dir = path.dirname(fullpath)
+        if dir:
+            makedirs(dir, exist_ok=True)
+        tmp = tmp_path(fullpath)
+        try:
+            if hasher:
+                with open(src_path, 'rb') as src, open(tmp, 'wb') as dst:
+                    for data in read_chunks(src, hasher):
+                        dst.write(data)
+            else:
+                copyfile(src_path, tmp)
+            replace(tmp, fullpath)
+        except BaseException:
+            if path.isfile(tmp):
+                remove(tmp)
+            raise
 
 
 class S3Store(DataStore):
@@ -253,15 +1215,140 @@ class S3Store(DataStore):
             # from env variables
             self.s3 = boto3.resource('s3', region_name=region)
 
-    def upload(self, key, src_path, tag=''):
-        self.s3.Object(self.endpoint, self._join(key)[1:]).put(Body=open(src_path, 'rb'))
-
-    def get(self, key, tag=''):
+    def upload(self, key, src_path, tag='', hasher=None):
+        """upload a file, large files use a parallel multipart upload
+
+        store options: part_size, parallel, retries. an interrupted upload
+        is resumed (skipping completed parts) when called again with the
+        same unchanged file.
+        """
+        size = path.getsize(src_path)
+        part_size = max(self._option('part_size', DEFAULT_PART_SIZE),
+                        S3_MIN_PART_SIZE, -(-size // S3_MAX_PARTS))
+        if size <= part_size:
+            with open(src_path, 'rb') as fp:
+                data = fp.read()
+            if hasher:
+                hasher.update(data)
+            self.s3.Object(self.endpoint, self._join(key)[1:]).put(
+                Body=data, **self._put_args(key))
+        else:
+            self._multipart_upload(key, src_path, size, part_size, hasher)
+
+    def _multipart_upload(self, key, src_path, size, part_size, hasher=None):
+        client = self.s3.meta.client
+        bucket, objkey = self.endpoint, self._join(key)[1:]
+        retries = self._option('retries', DEFAULT_RETRIES)
+        workers = self._option('parallel', DEFAULT_PARALLEL)
+
+        state = UploadState('s3://{}/{}'.format(bucket, objkey), src_path)
+        if state.upload_id:
+            try:
+                resp = client.list_parts(Bucket=bucket, Key=objkey,
+                                         UploadId=state.upload_id)
+                state.parts = {p['PartNumber']: p['ETag']
+                               for p in resp.get('Parts', [])}
+            except client.exceptions.NoSuchUpload:
+                state.upload_id = None
+        if not state.upload_id:
+            resp = client.create_multipart_upload(Bucket=bucket, Key=objkey,
+                                                  **self._put_args(key))
+            state.upload_id = resp['UploadId']
+            state.parts = {}
+            state.save()
+
+        def upload_part(num, data):
+            resp = retry(retries, client.upload_part, Bucket=bucket,
+                         Key=objkey, UploadId=state.upload_id,
+                         PartNumber=num, Body=data)
+            state.add_part(num, resp['ETag'])
+
+        # parts are read sequentially, at most 2 x workers parts in memory
+        slots = threading.BoundedSemaphore(workers * 2)
+        futures = []
+        with ThreadPoolExecutor(max_workers=workers) as pool, \
+                open(src_path, 'rb') as fp:
+            for num, offset in enumerate(range(0, size, part_size), 1):
+                if num in state.parts and not hasher:
+                    continue
+                fp.seek(offset)
+                data = fp.read(part_size)
+                if hasher:
+                    hasher.update(data)
+                if num in state.parts:
+                    continue
+                slots.acquire()
+                future = pool.submit(upload_part, num, data)
+                future.add_done_callback(lambda f: slots.release())
+                futures.append(future)
+            for future in futures:
+                future.result()
+
+        parts = [{'PartNumber': num, 'ETag': etag}
+                 for num, etag in sorted(state.parts.items())]
+        client.complete_multipart_upload(
+            Bucket=bucket, Key=objkey, UploadId=state.upload_id,
+            MultipartUpload={'Parts': parts})
+        state.clear()
+
+    def get(self, key, tag='', offset=0, size=None):
         obj = self.s3.Object(self.endpoint, self._join(key)[1:])
+        if size == 0:
+            return b''
+        if offset or size:
+            return obj.get(Range=range_header(offset, size))['Body'].read()
         return obj.get()['Body'].read()
 
+    def stat(self, key, tag=''):
+        obj = self.s3.Object(self.endpoint, self._join(key)[1:])
+        try:
+            obj.load()
+        except ClientError as err:
+            if err.response.get('Error', {}).get('Code') in ['404', 'NoSuchKey']:
+                raise FileNotFoundError('object {} not found'.format(key))
+            raise
+        encryption = 'SSE-C' if obj.sse_customer_algorithm \
+            else obj.server_side_encryption
+        return FileStats(obj.content_length, obj.last_modified.timestamp(),
+                         obj.e_tag, obj.content_type, encryption)
+
+    def listdir(self, key, recursive=True):
+        prefix = self._join(key)[1:].rstrip('/')
+        prefix = prefix + '/' if prefix else ''
+        args = {'Bucket': self.endpoint, 'Prefix': prefix}
+        if not recursive:
+            args['Delimiter'] = '/'
+        results = []
+        paginator = self.s3.meta.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(**args):
+            for obj in page.get('Contents', []):
+                if obj['Key'].endswith('/'):
+                    continue  # directory marker
+                results.append((obj['Key'][len(prefix):], FileStats(
+                    obj['Size'], obj['LastModified'].timestamp(),
+                    obj.get('ETag'))))
+        return results
+
+    def _checksum(self, stats):
+        # single part uploads have the md5 as etag (multipart add -<parts>),
+        # except for objects encrypted with SSE-KMS or SSE-C keys
+        if stats.encryption and stats.encryption != 'AES256':
+            return None
+        etag = (stats.etag or '').strip('"')
+        if len(etag) == 32 and '-' not in etag:
+            return 'md5', etag
+        return None
+
     def put(self, key, data, tag=''):
-        self.s3.Object(self.endpoint, self._join(key)[1:]).put(Body=data)
+        self.s3.Object(self.endpoint, self._join(key)[1:]).put(
+            Body=data, **self._put_args(key))
+
+    def _put_args(self, key):
+        content_type = None if self.compressed else guess_content_type(key)
+        return {'ContentType': content_type} if content_type else {}
+
+    def delete(self, key):
+        self.s3.Object(self.endpoint, self._join(key)[1:]).delete()
 
 
 def basic_auth_header(user, password):
@@ -272,20 +1359,116 @@ def basic_auth_header(user, password):
     return {'Authorization': authstr}
 
 
-def http_get(url, headers=None, auth=None):
+def _xml_findall(element, tag):
+    # ignore xml namespaces
+    return [e for e in element if e.tag.rsplit('}', 1)[-1] == tag]
+
+
+def _xml_text(element, tag):
+    found = _xml_findall(element, tag)
+    return found[0].text if found else None
+
+
+def range_header(offset=0, size=None):
+    if size:
+        return 'bytes={}-{}'.format(offset, offset + size - 1)
+    return 'bytes={}-'.format(offset)
+
+
+def http_get(url, headers=None, auth=None, offset=0, size=None,
+             session=None):
+    return http_get_range(url, headers, auth, offset, size, session)[0]
+
+
+def http_get_range(url, headers=None, auth=None, offset=0, size=None,
+                   session=None):
+    """ranged GET, return (data, False if the server ignored the range)
+
+    when the range is ignored only the response prefix up to the range end
+    is read (the connection is closed, not drained)
+    """
+    if size == 0:
+        return b'', True
+    ranged = bool(offset or size)
+    if ranged:
+        headers = dict(headers or {})
+        headers['Range'] = range_header(offset, size)
     try:
-        resp = requests.get(url, headers=headers, auth=auth)
+        resp = (session or requests).get(url, headers=headers, auth=auth,
+                                         stream=ranged)
     except OSError:
         raise OSError('error: cannot connect to {}'.format(url))
 
+    with resp:
+        if not resp.ok:
+            raise OSError('failed to read file in {}'.format(url))
+        if not ranged or resp.status_code == 206:
+            return resp.content, True
+        # server ignored the range header, read up to the range end
+        data = resp.raw.read(offset + size, decode_content=True) \
+            if size else resp.content
+        return data[offset:offset + size if size else None], False
+
+
+def http_stream(url, headers=None, auth=None, session=None):
+    """binary reader of the GET response body (streaming)"""
+    try:
+        resp = (session or requests).get(url, headers=headers, auth=auth,
+                                         stream=True)
+    except OSError:
+        raise OSError('error: cannot connect to {}'.format(url))
+    if resp.status_code == 404:
+        resp.close()
+        raise FileNotFoundError('file not found in {}'.format(url))
     if not resp.ok:
+        resp.close()
         raise OSError('failed to read file in {}'.format(url))
-    return resp.content
+    resp.raw.decode_content = True
+    return resp.raw
+
+
+def http_head(url, headers=None, auth=None, session=None):
+    try:
+        resp = (session or requests).head(url, headers=headers, auth=auth,
+                                          allow_redirects=True)
+    except OSError:
+        raise OSError('error: cannot connect to {}'.format(url))
 
+    if resp.status_code == 404:
+        raise FileNotFoundError('file not found in {}'.format(url))
+    if not resp.ok:
+        raise OSError('failed to stat file in {}'.format(url))
+    modified = resp.headers.get('Last-Modified')
+    if modified:
+        modified = parsedate_to_datetime(modified).timestamp()
+    size = resp.headers.get('Content-Length')
+    stats = FileStats(int(size) if size is not None else None, modified,
+                      resp.headers.get('ETag'),
+                      resp.headers.get('Content-Type'))
+    stats.accept_ranges = resp.headers.get('Accept-Ranges')
+    return stats
+
+
+def http_download(url, target_path, headers=None, auth=None, session=None):
+    """stream a GET response body to a local file"""
+    try:
+        with (session or requests).get(url, headers=headers, auth=auth,
+                                       stream=True) as resp:
+            if resp.status_code == 404:
+                raise FileNotFoundError('file not found in {}'.format(url))
+            if not resp.ok:
+                raise OSError('failed to read file in {}'.format(url))
+            with open(target_path, 'wb') as fp:
+                for chunk in resp.iter_content(DEFAULT_READ_AHEAD):
+                    fp.write(chunk)
+    except requests.exceptions.RequestException:
+        raise OSError('error: cannot connect to {}'.format(url))
 
-def http_put(url, data, headers=None, auth=None):
+
+def http_put(url, data, headers=None, auth=None, session=None):
     try:
-        resp = requests.put(url, data=data, headers=headers, auth=auth)
+        resp = (session or requests).put(url, data=data, headers=headers,
+                                         auth=auth)
     except OSError:
         raise OSError('error: cannot connect to {}'.format(url))
     if not resp.ok:
@@ -293,9 +1476,50 @@ def http_put(url, data, headers=None, auth=None):
             'failed to upload to {} {}'.format(url, resp.status_code))
 
 
-def http_upload(url, file_path, headers=None, auth=None):
+def http_upload(url, file_path, headers=None, auth=None, session=None):
     with open(file_path, 'rb') as data:
-        http_put(url, data, headers, auth)
+        http_put(url, data, headers, auth, session)
+
+
+async def ahttp_get(session, url, headers=None, offset=0, size=None):
+    if size == 0:
+        return b''
+    if offset or size:
+        headers = dict(headers or {})
+        headers['Range'] = range_header(offset, size)
+    try:
+        async with session.get(url, headers=headers) as resp:
+            if resp.status >= 400:
+                raise OSError('failed to read file in {}'.format(url))
+            data = await resp.read()
+            status = resp.status
+    except aiohttp.ClientError:
+        raise OSError('error: cannot connect to {}'.format(url))
+
+    if (offset or size) and status != 206:
+        return data[offset:offset + size if size else None]
+    return data
+
+
+async def ahttp_put(session, url, data, headers=None):
+    try:
+        async with session.put(url, data=data, headers=headers) as resp:
+            if resp.status >= 400:
+                raise OSError(
+                    'failed to upload to {} {}'.format(url, resp.status))
+    except aiohttp.ClientError:
+        raise OSError('error: cannot connect to {}'.format(url))
+
+
+async def aretry(retries, func, *args, **kwargs):
+    """await func, retry with exponential backoff on errors"""
+    for attempt in range(retries + 1):
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            if attempt >= retries:
+                raise
+            await asyncio.sleep(0.1 * 2 ** attempt)
 
 
 class HttpStore(DataStore):
@@ -303,14 +1527,43 @@ class HttpStore(DataStore):
         super().__init__(parent, name, schema, endpoint)
         self.auth = None
 
-    def upload(self, key, src_path, tag=''):
+    def upload(self, key, src_path, tag='', hasher=None):
         raise ValueError('unimplemented')
 
     def put(self, key, data, tag=''):
         raise ValueError('unimplemented')
 
-    def get(self, key, tag=''):
-        return http_get(self.url + self._join(key), None, self.auth)
+    def get(self, key, tag='', offset=0, size=None):
+        data, ranged = http_get_range(self.url + self._join(key), None,
+                                      self.auth, offset, size,
+                                      self._session())
+        if not ranged:
+            self.ranges = False
+        return data
+
+    def stat(self, key, tag=''):
+        stats = http_head(self.url + self._join(key), None, self.auth,
+                          self._session())
+        if stats.accept_ranges == 'none':
+            self.ranges = False
+        return stats
+
+    def _stream(self, key, tag=''):
+        return http_stream(self.url + self._join(key), None, self.auth,
+                           self._session())
+
+    def _download_stream(self, key, target_path, tag=''):
+        http_download(self.url + self._join(key), target_path, None,
+                      self.auth, self._session())
+
+    async def aget(self, key, tag='', offset=0, size=None):
+        if self.auth:
+            return await super().aget(key, tag, offset, size)
+        url = self.url + self._join(key)
+        async with self._parent.async_limit():
+            return await aretry(self._option('retries', DEFAULT_RETRIES),
+                                ahttp_get, self._parent.async_session(url),
+                                url, None, offset, size)
 
 
 class V3ioStore(DataStore):
@@ -338,11 +1591,148 @@ class V3ioStore(DataStore):
         schema = 'http' if self.kind == 'v3io' else 'https'
         return '{}://{}'.format(schema, self.endpoint)
 
-    def upload(self, key, src_path, tag=''):
-        http_upload(self.url + self._join(key), src_path, self.headers, None)
+    def upload(self, key, src_path, tag='', hasher=None):
+        """upload a file, large files are uploaded as appended chunks
+
+        chunks are written in order using v3io range (offset) puts, an
+        interrupted upload resumes from the last confirmed offset.
+        """
+        url = self.url + self._join(key)
+        size = path.getsize(src_path)
+        part_size = self._option('part_size', DEFAULT_PART_SIZE)
+        if size <= part_size:
+            with open(src_path, 'rb') as fp:
+                data = fp.read()
+            if hasher:
+                hasher.update(data)
+            http_put(url, data, self.headers, None, self._session())
+            return
 
-    def get(self, key, tag=''):
-        return http_get(self.url + self._join(key), self.headers, None)
+        retries = self._option('retries', DEFAULT_RETRIES)
+        state = UploadState(url, src_path)
+        if state.offset:
+            try:
+                if self.stat(key).size != state.offset:
+                    state.offset = 0
+            except OSError:
+                state.offset = 0
+
+        with open(src_path, 'rb') as fp:
+            if hasher and state.offset:
+                # hash the already uploaded prefix
+                for _ in read_chunks(fp, hasher, state.offset):
+                    pass
+            fp.seek(state.offset)
+            while state.offset < size:
+                data = fp.read(part_size)
+                if hasher:
+                    hasher.update(data)
+                headers = dict(self.headers or {})
+                if state.offset:
+                    headers['Range'] = 'bytes={}'.format(state.offset)
+                retry(retries, http_put, url, data, headers, None,
+                      self._session())
+                state.offset += len(data)
+                state.save()
+        state.clear()
+
+    def get(self, key, tag='', offset=0, size=None):
+        return http_get(self.url + self._join(key), self.headers, None,
+                        offset, size, self._session())
+
+    def _download_stream(self, key, target_path, tag=''):
+        http_download(self.url + self._join(key), target_path, self.headers,
+                      None, self._session())
+
+    def stat(self, key, tag=''):
+        return http_head(self.url + self._join(key), self.headers, None,
+                         self._session())
+
+    def listdir(self, key, recursive=True):
+        """list a v3io directory (container/path) using the S3 style
+        container listing (<url>/<container>/?prefix=<path>/)"""
+        container, _, subpath = self._join(key).strip('/').partition('/')
+        base = subpath.rstrip('/') + '/' if subpath else ''
+        results = []
+        prefixes = [base]
+        while prefixes:
+            prefix = prefixes.pop()
+            marker = ''
+            while True:
+                params = {'prefix': prefix}
+                if marker:
+                    params['marker'] = marker
+                resp = self._session().get(
+                    '{}/{}/'.format(self.url, container), params=params,
+                    headers=self.headers)
+                if resp.status_code == 404:
+                    break
+                if not resp.ok:
+                    raise OSError('failed to list {} ({})'.format(
+                        key, resp.status_code))
+                root = ElementTree.fromstring(resp.content)
+                for obj in _xml_findall(root, 'Contents'):
+                    objkey = _xml_text(obj, 'Key')
+                    modified = _xml_text(obj, 'LastModified')
+                    if modified:
+                        modified = parse_iso(modified).timestamp()
+                    results.append((objkey[len(base):], FileStats(
+                        int(_xml_text(obj, 'Size') or 0), modified)))
+                if recursive:
+                    for item in _xml_findall(root, 'CommonPrefixes'):
+                        prefixes.append(_xml_text(item, 'Prefix'))
+                marker = _xml_text(root, 'NextMarker')
+                if _xml_text(root, 'IsTruncated') != 'true' or not marker:
+                    break
+        return results
 
     def put(self, key, data, tag=''):
-        http_put(self.url + self._join(key), data, self.headers, None)
+        headers = self.headers
+        content_type = None if self.compressed else guess_content_type(key)
+        if content_type:
+            headers = dict(headers or {}, **{'Content-Type': content_type})
+        http_put(self.url + self._join(key), data, headers, None,
+                 self._session())
+
+    def append(self, key, data):
+        """append using a v3io range (offset) put"""
+        headers = dict(self.headers or {})
+        try:
+            headers['Range'] = 'bytes={}'.format(self.stat(key).size)
+        except FileNotFoundError:
+            pass
+        http_put(self.url + self._join(key), data, headers, None,
+                 self._session())
+
+    def delete(self, key):
+        url = self.url + self._join(key)
+        try:
+            resp = self._session().delete(url, headers=self.headers)
+        except OSError:
+            raise OSError('error: cannot connect to {}'.format(url))
+        if not resp.ok:
+            raise OSError(
+                'failed to delete {} {}'.format(url, resp.status_code))
+
+    async def aget(self, key, tag='', offset=0, size=None):
+        url = self.url + self._join(key)
+        async with self._parent.async_limit():
+            return await aretry(self._option('retries', DEFAULT_RETRIES),
+                                ahttp_get, self._parent.async_session(url),
+                                url, self.headers, offset, size)
+
+    async def aput(self, key, data, tag=''):
+        url = self.url + self._join(key)
+        async with self._parent.async_limit():
+            await aretry(self._option('retries', DEFAULT_RETRIES), ahttp_put,
+                         self._parent.async_session(url), url, data,
+                         self.headers)
+
+    async def aupload(self, key, src_path, tag=''):
+        if path.getsize(src_path) > self._option('part_size',
+                                                 DEFAULT_PART_SIZE):
+            # chunked (resumable) upload
+            return await super().aupload(key, src_path, tag)
+        with open(src_path, 'rb') as fp:
+            data = fp.read()
+        await self.aput(key, data, tag)
@@ -21,6 +21,15 @@ class RunDBError(Exception):
     pass
 
 
+def run_uid(struct):
+    """run store key, <uid> or <uid>-<iteration> for child runs"""
+    uid = get_in(struct, 'metadata.uid')
+    iteration = get_in(struct, 'metadata.iteration')
+    if iteration:
+        return f'{uid}-{iteration}'
+    return uid
+
+
 class RunDBInterface:
     kind = ''
 
@@ -30,11 +39,18 @@ class RunDBInterface:
     def store_run(self, struct, uid, project='', commit=False):
         pass
 
+    def store_runs(self, runs, project=''):
+        for struct in runs:
+            self.store_run(struct, run_uid(struct), project, commit=True)
+
     def read_run(self, uid, project=''):
         pass
 
+    def read_runs(self, uids, project=''):
+        return [self.read_run(uid, project) for uid in uids]
+
     def list_runs(self, name='', project='', labels=[],
-                  state='', sort=True, last=0):
+                  state='', sort=True, last=0, since=None, until=None):
         pass
 
     def del_run(self, uid, project=''):
@@ -43,6 +59,9 @@ class RunDBInterface:
     def del_runs(self, name='', project='', labels=[], state='', days_ago=0):
         pass
 
+    def get_run_stats(self, project=''):
+        pass
+
     def store_artifact(self, key, artifact, uid, tag='', project=''):
         pass
 
@@ -58,9 +77,23 @@ class RunDBInterface:
     def del_artifacts(self, name='', project='', tag='', labels=[], days_ago=0):
         pass
 
-    def store_metric(self, keyvals={}, timestamp=None, labels={}):
+    def get_upstream(self, node, project='', depth=1):
+        """sources and producer runs an artifact was derived from"""
+        pass
+
+    def get_downstream(self, node, project='', depth=1):
+        """artifacts derived from a data source/artifact or produced by a run
+        (node 'run:<uid>')"""
+        pass
+
+    def store_metric(self, uid, project='', keyvals={}, timestamp=None,
+                     labels={}):
+        pass
+
+    def read_metric(self, keys, uid, project='', start=None, end=None,
+                    interval=0):
         pass
 
-    def read_metric(self, keys, query=''):
+    def read_metric_labels(self, uid, project=''):
         pass
 
@@ -14,15 +14,20 @@
 
 import json
 import time
-from os import path, remove
+import threading
+from contextlib import contextmanager
+from os import path, remove, scandir, stat
 import yaml
 import pathlib
 from datetime import datetime, timedelta
+from urllib.parse import urlparse
 
-from ..utils import get_in, match_labels, dict_to_yaml
+from ..utils import get_in, match_labels, dict_to_yaml, FileLock
 from ..datastore import StoreManager
 from ..render import run_to_html
 from .base import RunDBError, RunDBInterface
+from .metrics import MetricsStore, to_epoch
+from .index import RunsIndex, RunStats, LineageIndex, STATS_FILE, LOCK_FILE
 from ..collections import RunList, ArtifactList
 
 
@@ -34,8 +39,15 @@ class FileRunDB(RunDBInterface):
         self.dirpath = dirpath
         self._datastore = None
         self._subpath = None
+        self._indexes = {}
+        # runs dir mtime at the last index/run files reconcile
+        self._synced = {}
+        self._lineages = {}
+        self._held = threading.local()
+        self._lock = threading.RLock()
 
     def connect(self, secrets=None):
+        self._check_local()
         sm = StoreManager(secrets)
         self._datastore, self._subpath = sm.get_or_create_store(self.dirpath)
         return self
@@ -47,38 +59,69 @@ class FileRunDB(RunDBInterface):
             data = json.dumps(struct)
         filepath = self._filepath('runs', project, uid, '') + self.format
         self._datastore.put(filepath, data)
+        with self._locked(project):
+            # the files changed here are indexed below, no sync needed
+            index = self._index(project, sync=False)
+            index.update(uid, struct)
+            index.save()
 
     def read_run(self, uid, project='', display=True):
+        """read a run by uid, a unique uid prefix or '...<uid suffix>'"""
         filepath = self._filepath('runs', project, uid, '') + self.format
-        data = self._datastore.get(filepath)
+        try:
+            data = self._datastore.get(filepath)
+        except FileNotFoundError:
+            uid = self._resolve_uid(uid, project)
+            filepath = self._filepath('runs', project, uid, '') + self.format
+            data = self._datastore.get(filepath)
         result = self._loads(data)
 
         run_to_html(result, display)
 
         return result
 
+    def read_runs(self, uids, project=''):
+        """read a list of runs, missing runs are returned as None"""
+        results = []
+        for uid in uids:
+            try:
+                uid = self._resolve_uid(uid, project)
+            except RunDBError:
+                results.append(None)
+                continue
+            results.append(self._load_run(uid, project))
+        return results
+
     def list_runs(self, name='', project='', labels=[],
-                  state='', sort=True, last=30):
-        filepath = self._filepath('runs', project)
+                  state='', sort=True, last=30, since=None, until=None):
         results = RunList()
         if isinstance(labels, str):
             labels = labels.split(',')
-        for run, _ in self._load_list(filepath, '*'):
-            if (name == '' or name in get_in(run, 'metadata.name', ''))\
-                    and match_labels(get_in(run, 'metadata.labels', {}), labels)\
-                    and (state == '' or get_in(run, 'status.state', '') == state):
-                results.append(run)
 
+        # filter by time, name and state in the index, load only matches
+        with self._lock:
+            index = self._index(project)
+            uids = [uid for uid in index.between(since, until)
+                    if (name == '' or name in index.runs[uid][1])
+                    and (state == '' or index.runs[uid][2] == state)]
         if sort or last:
-            results.sort(key=lambda i: get_in(
-                i, ['status', 'start_time'], ''), reverse=True)
-        if last and len(results) > last:
-            return RunList(results[:last])
+            uids.reverse()
+        for uid in uids:
+            run = self._load_run(uid, project)
+            if run and match_labels(get_in(run, 'metadata.labels', {}), labels):
+                results.append(run)
+                if last and len(results) >= last:
+                    break
         return results
 
     def del_run(self, uid, project=''):
         filepath = self._filepath('runs', project, uid, '') + self.format
         self._safe_del(filepath)
+        with self._locked(project):
+            # the files changed here are indexed below, no sync needed
+            index = self._index(project, sync=False)
+            index.remove(uid)
+            index.save()
 
     def del_runs(self, name='', project='', labels=[], state='', days_ago=0):
         if not name and not state and not days_ago:
@@ -95,24 +138,47 @@ class FileRunDB(RunDBInterface):
             return datetime.strptime(get_in(run, 'status.start_time', ''),
                                      '%Y-%m-%d %H:%M:%S.%f') < days_ago
 
-        for run, p in self._load_list(filepath, '*'):
-            if (name == '' or name == get_in(run, 'metadata.name', ''))\
-                    and match_labels(get_in(run, 'metadata.labels', {}), labels)\
-                    and (state == '' or get_in(run, 'status.state', '') == state)\
-                    and (not days_ago or date_before(run)):
-
-                self._safe_del(p)
+        with self._locked(project):
+            # the files changed here are indexed below, no sync needed
+            index = self._index(project, sync=False)
+            for run, p in self._load_list(filepath, '*'):
+                if (name == '' or name == get_in(run, 'metadata.name', ''))\
+                        and match_labels(get_in(run, 'metadata.labels', {}), labels)\
+                        and (state == '' or get_in(run, 'status.state', '') == state)\
+                        and (not days_ago or date_before(run)):
+
+                    self._safe_del(p)
+                    index.remove(pathlib.Path(p).stem)
+            index.save()
+
+    def get_run_stats(self, project=''):
+        """run counts by state/name/day and numeric output aggregates"""
+        self._check_local()
+        dirpath = self._filepath('runs', project)
+        stats = RunStats.load(path.join(dirpath, STATS_FILE))
+        if stats is None:
+            with self._lock:
+                stats = self._index(project).stats
+        return stats.summary()
 
     def store_artifact(self, key, artifact, uid, tag='', project=''):
-        artifact.updated = time.time()
-        if self.format == '.yaml':
-            data = artifact.to_yaml()
+        if isinstance(artifact, dict):
+            artifact = dict(artifact, updated=time.time())
+            if self.format == '.yaml':
+                data = dict_to_yaml(artifact)
+            else:
+                data = json.dumps(artifact)
+            struct = artifact
         else:
-            data = artifact.to_json()
+            artifact.updated = time.time()
+            data = self._dumps(artifact)
+            struct = artifact.to_dict()
         filepath = self._filepath('artifacts', project, key, uid) + self.format
         self._datastore.put(filepath, data)
         filepath = self._filepath('artifacts', project, key, tag or 'latest') + self.format
         self._datastore.put(filepath, data)
+        with self._lock:
+            self._lineage(project).add(key, struct, uid)
 
     def read_artifact(self, key, tag='', project=''):
         filepath = self._filepath('artifacts', project, key, tag) + self.format
@@ -143,7 +209,14 @@ class FileRunDB(RunDBInterface):
 
     def del_artifact(self, key, tag='', project=''):
         filepath = self._filepath('artifacts', project, key, tag) + self.format
+        try:
+            artifact = self._loads(pathlib.Path(filepath).read_text())
+        except FileNotFoundError:
+            artifact = None
         self._safe_del(filepath)
+        if artifact:
+            with self._lock:
+                self._lineage(project).remove([dict(artifact, key=key)])
 
     def del_artifacts(self, name='', project='', tag='', labels=[]):
         tag = tag or 'latest'
@@ -158,11 +231,174 @@ class FileRunDB(RunDBInterface):
         else:
             mask = '**/*'
 
+        deleted = []
         for artifact, p in self._load_list(filepath, mask):
             if (name == '' or name == get_in(artifact, 'key', ''))\
                     and match_labels(get_in(artifact, 'labels', {}), labels):
 
                 self._safe_del(p)
+                deleted.append(artifact)
+        with self._lock:
+            self._lineage(project).remove(deleted)
+
+    def get_upstream(self, node, project='', depth=1):
+        """sources and producer runs an artifact was derived from
+
+        :param node:  artifact target path (or key), data url or 'run:<uid>'
+        :param depth: levels to traverse, 0 for unlimited
+        :return: list of {node, via, depth, kind (artifact, data or run),
+                 key, uid} dicts, nearest first
+        """
+        with self._lock:
+            return self._lineage(project).upstream(node, depth)
+
+    def get_downstream(self, node, project='', depth=1):
+        """artifacts derived from a data source/artifact or produced by a
+        run (node 'run:<uid>'), see get_upstream()"""
+        with self._lock:
+            return self._lineage(project).downstream(node, depth)
+
+    def store_metric(self, uid, project='', keyvals={}, timestamp=None,
+                     labels={}):
+        store = self._metrics(uid, project)
+        store.append(keyvals, timestamp)
+        if labels:
+            store.set_labels(labels)
+
+    def read_metric_labels(self, uid, project=''):
+        return self._metrics(uid, project).labels()
+
+    def read_metric(self, keys, uid, project='', start=None, end=None,
+                    interval=0):
+        """read run metrics (dict of key -> column arrays)
+
+        :param keys:     metric key or list of keys, '*' for all keys
+        :param uid:      run uid
+        :param project:  project name
+        :param start:    optional start time (datetime or epoch seconds)
+        :param end:      optional end time (datetime or epoch seconds)
+        :param interval: aggregate into buckets of N seconds, returns
+                         min/max/mean/count columns per bucket
+        """
+        store = self._metrics(uid, project)
+        if keys == '*':
+            keys = store.keys()
+        elif isinstance(keys, str):
+            keys = [keys]
+        start, end = to_epoch(start), to_epoch(end)
+
+        results = {}
+        for key in keys:
+            if interval:
+                results[key] = store.downsample(key, interval, start, end)
+            else:
+                results[key] = store.read(key, start, end)
+        return results
+
+    def _check_local(self):
+        # metrics, indexes, stats and locks are local files (mmap, append,
+        # flock), refuse remote dirpaths rather than create local dirs
+        scheme = urlparse(self.dirpath).scheme.lower()
+        if scheme == 'file':
+            self.dirpath = urlparse(self.dirpath).path
+        elif '://' in self.dirpath:
+            raise RunDBError('file run db requires a local dirpath, got {} '
+                             '(use an http db service for remote stores)'
+                             .format(self.dirpath))
+
+    def _metrics(self, uid, project=''):
+        self._check_local()
+        return MetricsStore(self._filepath('metrics', project, uid))
+
+    def _lineage(self, project=''):
+        self._check_local()
+        dirpath = self._filepath('artifacts', project)
+        lineage = self._lineages.get(dirpath)
+        if not lineage:
+            lineage = self._lineages[dirpath] = LineageIndex(dirpath)
+        lineage.load()
+        return lineage
+
+    def _index(self, project='', sync=True):
+        self._check_local()
+        dirpath = self._filepath('runs', project)
+        index = self._indexes.get(dirpath)
+        if not index:
+            index = self._indexes[dirpath] = RunsIndex(dirpath)
+        if not index.load():
+            with self._locked(project):
+                if not index.load():
+                    # no index yet (older db), build it from the run files
+                    index.clear()
+                    for run, p in self._load_list(dirpath, '*'):
+                        index.update(pathlib.Path(p).stem, run)
+                    if index.runs:
+                        index.save()
+                    self._synced[dirpath] = None
+        if sync:
+            self._reconcile(index, dirpath, project)
+        return index
+
+    def _reconcile(self, index, dirpath, project=''):
+        """sync the index with run files written or deleted without it
+        (e.g. by older clients), checked when the runs dir changes"""
+        try:
+            mtime = stat(dirpath).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if self._synced.get(dirpath) == mtime:
+            return
+        with scandir(dirpath) as entries:
+            uids = set(entry.name[:-len(self.format)] for entry in entries
+                       if entry.name.endswith(self.format) and
+                       not entry.name.startswith('.') and entry.is_file())
+        if uids != set(index.runs):
+            with self._locked(project):
+                index.load()
+                for uid in uids - set(index.runs):
+                    run = self._load_run(uid, project)
+                    if run:
+                        index.update(uid, run)
+                for uid in set(index.runs) - uids:
+                    index.remove(uid)
+                index.save()
+        self._synced[dirpath] = mtime
+
+    @contextmanager
+    def _locked(self, project=''):
+        """serialize index read-modify-write across threads and processes"""
+        self._check_local()
+        dirpath = self._filepath('runs', project)
+        held = self._held.__dict__.setdefault('dirs', set())
+        if dirpath in held:
+            yield
+            return
+        with self._lock, FileLock(path.join(dirpath, LOCK_FILE)):
+            held.add(dirpath)
+            try:
+                yield
+            finally:
+                held.discard(dirpath)
+
+    def _resolve_uid(self, uid, project=''):
+        with self._lock:
+            index = self._index(project)
+            if uid in index.runs or not index.runs:
+                return uid
+            matches = index.find(uid)
+        if not matches:
+            raise RunDBError(f'run {uid} not found')
+        if len(matches) > 1:
+            raise RunDBError('uid {} is ambiguous, matching runs: {}'.format(
+                uid, ', '.join(matches[:10])))
+        return matches[0]
+
+    def _load_run(self, uid, project=''):
+        filepath = self._filepath('runs', project, uid, '') + self.format
+        try:
+            return self._loads(pathlib.Path(filepath).read_text())
+        except FileNotFoundError:
+            return None
 
     def _filepath(self, table, project, key='', tag=''):
         if tag == '*':
@@ -191,7 +427,11 @@ class FileRunDB(RunDBInterface):
             if p.is_file():
                 if '.ipynb_checkpoints' in p.parts:
                     continue
-                data = self._loads(p.read_text())
+                try:
+                    data = self._loads(p.read_text())
+                except FileNotFoundError:
+                    # deleted by another process
+                    continue
                 if data:
                     yield data, str(p)
 
@@ -0,0 +1,271 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gzip
+import json
+import threading
+from collections import OrderedDict
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qsl
+
+from ..utils import logger
+from .base import RunDBError, run_uid
+
+API_PREFIX = '/api/'
+# compress responses larger than this (when the client accepts gzip)
+GZIP_MIN_SIZE = 1024
+
+
+class RunCache:
+    """LRU cache of run documents, keyed by (project, uid)
+
+    only full run keys (uid or uid-iteration) are cached, reads by a uid
+    prefix are resolved by the backend so updates can not leave them stale.
+    """
+
+    def __init__(self, size=1024):
+        self.size = size
+        self._runs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, project, uid):
+        with self._lock:
+            run = self._runs.get((project, uid))
+            if run is not None:
+                self._runs.move_to_end((project, uid))
+            return run
+
+    def set(self, project, uid, run):
+        with self._lock:
+            self._runs[(project, uid)] = run
+            self._runs.move_to_end((project, uid))
+            if len(self._runs) > self.size:
+                self._runs.popitem(last=False)
+
+    def remove(self, project, uid):
+        with self._lock:
+            self._runs.pop((project, uid), None)
+
+    def clear(self):
+        with self._lock:
+            self._runs.clear()
+
+
+class RunDBService:
+    """maps API calls to a run DB backend, keeps the backend and a run
+    cache alive between requests"""
+
+    def __init__(self, db, cache_size=1024):
+        self.db = db
+        self.cache = RunCache(cache_size)
+
+    # runs
+    def get_run(self, params, body):
+        project, uid = params.get('project', ''), params['uid']
+        run = self.cache.get(project, uid)
+        if run is None:
+            run = self.db.read_runs([uid], project)[0]
+            if run is None:
+                raise RunDBError(f'run {uid} not found')
+            self._cache_run(project, uid, run)
+        return run
+
+    def _cache_run(self, project, uid, run):
+        if run_uid(run) == uid:
+            self.cache.set(project, uid, run)
+
+    def post_run(self, params, body):
+        project, uid = params.get('project', ''), params['uid']
+        self.db.store_run(body, uid, project, params.get('commit') == 'true')
+        self.cache.set(project, uid, body)
+
+    def delete_run(self, params, body):
+        project, uid = params.get('project', ''), params['uid']
+        self.cache.remove(project, uid)
+        self.db.del_run(uid, project)
+
+    def get_runs(self, params, body):
+        return self.db.list_runs(
+            name=params.get('name', ''),
+            project=params.get('project', ''),
+            labels=_list_param(params, 'labels'),
+            state=params.get('state', ''),
+            sort=params.get('sort', 'true') == 'true',
+            last=int(params.get('last', 0)),
+            since=params.get('since'),
+            until=params.get('until'))
+
+    def delete_runs(self, params, body):
+        self.cache.clear()
+        self.db.del_runs(name=params.get('name', ''),
+                         project=params.get('project', ''),
+                         labels=_list_param(params, 'labels'),
+                         state=params.get('state', ''),
+                         days_ago=int(params.get('days_ago', 0)))
+
+    def post_runs_store(self, params, body):
+        project = params.get('project', '')
+        self.db.store_runs(body, project)
+        for struct in body:
+            self.cache.set(project, run_uid(struct), struct)
+
+    def post_runs_read(self, params, body):
+        project = params.get('project', '')
+        results = [self.cache.get(project, uid) for uid in body]
+        missing = [uid for uid, run in zip(body, results) if run is None]
+        if missing:
+            found = dict(zip(missing, self.db.read_runs(missing, project)))
+            for uid, run in found.items():
+                if run is not None:
+                    self._cache_run(project, uid, run)
+            results = [run if run is not None else found[uid]
+                       for uid, run in zip(body, results)]
+        return results
+
+    def get_stats(self, params, body):
+        return self.db.get_run_stats(params.get('project', ''))
+
+    # artifacts
+    def get_artifact(self, params, body):
+        return self.db.read_artifact(params['key'], params.get('tag', ''),
+                                     params.get('project', ''))
+
+    def post_artifact(self, params, body):
+        self.db.store_artifact(params['key'], body, params.get('uid', ''),
+                               params.get('tag', ''),
+                               params.get('project', ''))
+
+    def delete_artifact(self, params, body):
+        self.db.del_artifact(params['key'], params.get('tag', ''),
+                             params.get('project', ''))
+
+    def get_artifacts(self, params, body):
+        return self.db.list_artifacts(params.get('name', ''),
+                                      params.get('project', ''),
+                                      params.get('tag', ''),
+                                      _list_param(params, 'labels'))
+
+    def delete_artifacts(self, params, body):
+        self.db.del_artifacts(params.get('name', ''),
+                              params.get('project', ''),
+                              params.get('tag', ''),
+                              _list_param(params, 'labels'))
+
+    def get_lineage(self, params, body):
+        if params.get('direction', 'upstream') == 'downstream':
+            query = self.db.get_downstream
+        else:
+            query = self.db.get_upstream
+        return query(params['node'], params.get('project', ''),
+                     int(params.get('depth', 1)))
+
+    # metrics
+    def post_metrics(self, params, body):
+        self.db.store_metric(params['uid'], params.get('project', ''),
+                             body.get('keyvals', {}), body.get('timestamp'),
+                             body.get('labels', {}))
+
+    def get_metrics(self, params, body):
+        keys = params.get('keys', '*') or '*'
+        if keys != '*':
+            keys = keys.split(',')
+        results = self.db.read_metric(
+            keys, params['uid'],
+            params.get('project', ''), _float_param(params, 'start'),
+            _float_param(params, 'end'), _float_param(params, 'interval'))
+        return {key: {col: values.tolist() for col, values in cols.items()}
+                for key, cols in results.items()}
+
+    def get_metrics_labels(self, params, body):
+        return self.db.read_metric_labels(params['uid'],
+                                          params.get('project', ''))
+
+
+def _list_param(params, key):
+    value = params.get(key, '')
+    return value.split(',') if value else []
+
+
+def _float_param(params, key):
+    value = params.get(key)
+    return float(value) if value else None
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    service = None
+
+    def _call(self, method):
+        url = urlparse(self.path)
+        params = dict(parse_qsl(url.query))
+        size = int(self.headers.get('Content-Length', 0))
+        data = self.rfile.read(size) if size else None
+
+        name = method + '_' + url.path[len(API_PREFIX):].replace('/', '_')
+        func = getattr(self.service, name, None)
+        if not url.path.startswith(API_PREFIX) or not func:
+            return self._reply(404, {'error': f'bad request {method} {url.path}'})
+
+        try:
+            body = None
+            if data:
+                if self.headers.get('Content-Encoding') == 'gzip':
+                    data = gzip.decompress(data)
+                body = json.loads(data)
+            self._reply(200, func(params, body))
+        except (RunDBError, KeyError, FileNotFoundError) as err:
+            self._reply(404, {'error': repr(err)})
+        except Exception as err:
+            logger.error(f'api error in {method} {url.path} - {err}')
+            self._reply(500, {'error': repr(err)})
+
+    def _reply(self, status, resp=None):
+        data = json.dumps(resp).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if len(data) > GZIP_MIN_SIZE and \
+                'gzip' in self.headers.get('Accept-Encoding', ''):
+            data = gzip.compress(data, 5)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._call('get')
+
+    def do_POST(self):
+        self._call('post')
+
+    def do_DELETE(self):
+        self._call('delete')
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def make_server(db, host='127.0.0.1', port=8080, cache_size=1024):
+    """create an HTTP server exposing the db (a RunDBInterface)
+
+    the service has no authentication (and delete endpoints), it listens on
+    localhost unless another host (e.g. 0.0.0.0) is given explicitly
+    """
+    handler = type('RunDBHandler', (Handler,),
+                   {'service': RunDBService(db, cache_size)})
+    return ThreadingServer((host, port), handler)
@@ -0,0 +1,182 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gzip
+import json
+import time
+
+import numpy as np
+
+from ..datastore import http_sessions
+from ..render import run_to_html
+from ..collections import RunList, ArtifactList
+from .base import RunDBError, RunDBInterface
+from .httpd import API_PREFIX, GZIP_MIN_SIZE
+
+
+class HTTPRunDB(RunDBInterface):
+    """run DB client for the 'mlrun db serve' HTTP service
+
+    uses the shared pooled keep-alive sessions, gzip bodies and batch
+    endpoints (store_runs, read_runs) to reduce per call overhead.
+    """
+    kind = 'http'
+
+    def __init__(self, base_url, timeout=60):
+        if base_url.startswith('httpdb://'):
+            base_url = 'http://' + base_url[len('httpdb://'):]
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = None
+
+    def connect(self, secrets=None):
+        self.session = http_sessions.session(self.base_url)
+        return self
+
+    def _api_call(self, method, path, params=None, body=None):
+        headers = {}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+            if len(data) > GZIP_MIN_SIZE:
+                data = gzip.compress(data, 5)
+                headers['Content-Encoding'] = 'gzip'
+
+        if not self.session:
+            self.connect()
+        url = self.base_url + API_PREFIX + path
+        try:
+            resp = self.session.request(method, url, params=params, data=data,
+                                        headers=headers, timeout=self.timeout)
+        except OSError as err:
+            raise RunDBError(f'cannot connect to run db at {url} - {err}')
+        if not resp.ok:
+            try:
+                error = resp.json().get('error')
+            except ValueError:
+                error = resp.text
+            raise RunDBError(f'run db {method} {path} failed - {error}')
+        return resp.json()
+
+    def store_run(self, struct, uid, project='', commit=False):
+        params = {'uid': uid, 'project': project,
+                  'commit': 'true' if commit else 'false'}
+        self._api_call('POST', 'run', params, struct)
+
+    def store_runs(self, runs, project=''):
+        self._api_call('POST', 'runs/store', {'project': project}, list(runs))
+
+    def read_run(self, uid, project='', display=True):
+        result = self._api_call('GET', 'run', {'uid': uid, 'project': project})
+        run_to_html(result, display)
+        return result
+
+    def read_runs(self, uids, project=''):
+        return self._api_call('POST', 'runs/read', {'project': project},
+                              list(uids))
+
+    def list_runs(self, name='', project='', labels=[],
+                  state='', sort=True, last=30, since=None, until=None):
+        params = {'name': name, 'project': project, 'state': state,
+                  'labels': _list_str(labels),
+                  'sort': 'true' if sort else 'false', 'last': last}
+        if since:
+            params['since'] = str(since)
+        if until:
+            params['until'] = str(until)
+        return RunList(self._api_call('GET', 'runs', params))
+
+    def del_run(self, uid, project=''):
+        self._api_call('DELETE', 'run', {'uid': uid, 'project': project})
+
+    def del_runs(self, name='', project='', labels=[], state='', days_ago=0):
+        params = {'name': name, 'project': project, 'state': state,
+                  'labels': _list_str(labels), 'days_ago': days_ago}
+        self._api_call('DELETE', 'runs', params)
+
+    def get_run_stats(self, project=''):
+        return self._api_call('GET', 'stats', {'project': project})
+
+    def store_artifact(self, key, artifact, uid, tag='', project=''):
+        if not isinstance(artifact, dict):
+            artifact.updated = time.time()
+            artifact = artifact.to_dict()
+        params = {'key': key, 'uid': uid, 'tag': tag, 'project': project}
+        self._api_call('POST', 'artifact', params, artifact)
+
+    def read_artifact(self, key, tag='', project=''):
+        params = {'key': key, 'tag': tag, 'project': project}
+        return self._api_call('GET', 'artifact', params)
+
+    def list_artifacts(self, name='', project='', tag='', labels=[]):
+        params = {'name': name, 'project': project, 'tag': tag,
+                  'labels': _list_str(labels)}
+        results = ArtifactList(tag or 'latest')
+        results.extend(self._api_call('GET', 'artifacts', params))
+        return results
+
+    def del_artifact(self, key, tag='', project=''):
+        params = {'key': key, 'tag': tag, 'project': project}
+        self._api_call('DELETE', 'artifact', params)
+
+    def del_artifacts(self, name='', project='', tag='', labels=[]):
+        params = {'name': name, 'project': project, 'tag': tag,
+                  'labels': _list_str(labels)}
+        self._api_call('DELETE', 'artifacts', params)
+
+    def get_upstream(self, node, project='', depth=1):
+        params = {'node': node, 'project': project, 'depth': depth,
+                  'direction': 'upstream'}
+        return self._api_call('GET', 'lineage', params)
+
+    def get_downstream(self, node, project='', depth=1):
+        params = {'node': node, 'project': project, 'depth': depth,
+                  'direction': 'downstream'}
+        return self._api_call('GET', 'lineage', params)
+
+    def store_metric(self, uid, project='', keyvals={}, timestamp=None,
+                     labels={}):
+        if hasattr(timestamp, 'timestamp'):
+            timestamp = timestamp.timestamp()
+        body = {'keyvals': keyvals, 'timestamp': timestamp, 'labels': labels}
+        self._api_call('POST', 'metrics', {'uid': uid, 'project': project},
+                       body)
+
+    def read_metric(self, keys, uid, project='', start=None, end=None,
+                    interval=0):
+        params = {'keys': _list_str(keys), 'uid': uid, 'project': project,
+                  'start': _epoch(start), 'end': _epoch(end),
+                  'interval': interval or ''}
+        results = self._api_call('GET', 'metrics', params)
+        return {key: {col: np.array(values) for col, values in cols.items()}
+                for key, cols in results.items()}
+
+    def read_metric_labels(self, uid, project=''):
+        return self._api_call('GET', 'metrics/labels',
+                              {'uid': uid, 'project': project})
+
+
+def _list_str(items):
+    if isinstance(items, str):
+        return items
+    return ','.join(items)
+
+
+def _epoch(ts):
+    if ts is None:
+        return ''
+    if hasattr(ts, 'timestamp'):
+        return ts.timestamp()
+    return ts
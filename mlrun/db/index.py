@@ -0,0 +1,410 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from os import path, stat, makedirs
+
+from ..utils import get_in, atomic_write, parse_iso
+
+# append-only log of index records, replaces the older full .runs_index
+INDEX_FILE = '.runs_log'
+STATS_FILE = '.runs_stats'
+LOCK_FILE = '.runs_lock'
+# compact the log once it has more than COMPACT_RATIO records per live run
+COMPACT_RATIO = 4
+COMPACT_MIN_RECORDS = 1000
+_max_char = chr(0x10ffff)
+
+
+def to_datetime(t):
+    """naive (local time) datetime of a datetime or an iso string, start
+    times are stored as str(datetime) but may come with a T or a zone"""
+    if not isinstance(t, datetime):
+        t = parse_iso(str(t))
+    if t.tzinfo:
+        t = t.astimezone().replace(tzinfo=None)
+    return t
+
+
+def _start_time(text):
+    try:
+        return to_datetime(text) if text else datetime.min
+    except ValueError:
+        return datetime.min
+
+
+class RunsIndex:
+    """per project index of runs: uid -> [start_time, name, state]
+
+    the index is persisted next to the run files as an append-only log, a
+    store or delete appends one record and loading reads only the records
+    added since the last load. the log starts with a snapshot line and is
+    compacted (rewritten as a single snapshot) once it is mostly stale
+    records. sorted views are built lazily for uid prefix/suffix lookups
+    and start time range scans (log time per lookup).
+
+    the index also maintains incremental run statistics (see RunStats),
+    replayed from the log records and saved in a separate small file so
+    they can be read without the index.
+    """
+
+    def __init__(self, dirpath):
+        self.dirpath = dirpath
+        self.filepath = path.join(dirpath, INDEX_FILE)
+        self.stats_path = path.join(dirpath, STATS_FILE)
+        self._reset()
+        self._uids = None
+        self._ruids = None
+        self._times = None
+
+    def _reset(self):
+        self.runs = {}
+        self.stats = RunStats()
+        self._pending = []
+        self._records = 0
+        self._compact = False
+        self._inode = None
+        self._offset = 0
+
+    def load(self):
+        """apply the records added to the log since the last load, return
+        False if there is no log yet"""
+        try:
+            st = stat(self.filepath)
+        except FileNotFoundError:
+            return False
+        if (st.st_dev, st.st_ino) != self._inode or st.st_size < self._offset:
+            # the log was compacted (replaced), reload it
+            self._reset()
+            self._inode = (st.st_dev, st.st_ino)
+            self._invalidate()
+        if st.st_size == self._offset:
+            return True
+        with open(self.filepath, 'rb') as fp:
+            fp.seek(self._offset)
+            data = fp.read(st.st_size - self._offset)
+        # skip a partially written last record
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            if line:
+                self._apply(json.loads(line))
+        self._offset += end
+        self._invalidate()
+        return True
+
+    def save(self):
+        """append the pending records (compact the log when needed)"""
+        makedirs(self.dirpath, exist_ok=True)
+        if self._compact or self._records > max(
+                COMPACT_MIN_RECORDS, COMPACT_RATIO * len(self.runs)):
+            data = json.dumps({'runs': self.runs,
+                               'stats': self.stats.to_dict()}) + '\n'
+            atomic_write(self.filepath, data)
+            self._records = 0
+            self._compact = False
+        elif self._pending:
+            with open(self.filepath, 'ab') as fp:
+                fp.write(b''.join(json.dumps(record).encode() + b'\n'
+                                  for record in self._pending))
+        self._pending = []
+        self.stats.save(self.stats_path)
+        # writers hold the project lock, the log has only our records
+        st = stat(self.filepath)
+        self._inode = (st.st_dev, st.st_ino)
+        self._offset = st.st_size
+
+    def clear(self):
+        """empty the index, the next save rewrites the log"""
+        self._reset()
+        self._compact = True
+        self._invalidate()
+
+    def _invalidate(self):
+        self._uids = self._ruids = self._times = None
+
+    def _apply(self, record):
+        if 'runs' in record:
+            # snapshot (first line of a compacted log)
+            self.runs = record['runs']
+            self.stats = RunStats(record['stats'])
+            return
+        uid, entry = record['uid'], record.get('run')
+        prev = self.runs.get(uid)
+        if prev is None and entry is None:
+            return
+        self.stats.update(prev, entry, record.get('outputs'))
+        if entry is None:
+            del self.runs[uid]
+        else:
+            self.runs[uid] = entry
+        self._records += 1
+
+    def _log(self, record):
+        self._apply(record)
+        self._pending.append(record)
+        self._invalidate()
+
+    def update(self, uid, struct):
+        entry = [get_in(struct, 'status.start_time', ''),
+                 get_in(struct, 'metadata.name', ''),
+                 get_in(struct, 'status.state', '')]
+        record = {'uid': uid, 'run': entry}
+        if entry[2] == 'completed':
+            # outputs are aggregated once, when the run completes
+            record['outputs'] = get_in(struct, 'status.outputs')
+        self._log(record)
+
+    def remove(self, uid):
+        if uid in self.runs:
+            self._log({'uid': uid})
+
+    def find(self, uid):
+        """find run uids by unique prefix or by '...<suffix>'"""
+        if uid.startswith('...'):
+            if self._ruids is None:
+                self._ruids = sorted(u[::-1] for u in self.runs.keys())
+            matches = [u[::-1] for u in _prefixed(self._ruids, uid[3:][::-1])]
+        else:
+            if self._uids is None:
+                self._uids = sorted(self.runs.keys())
+            matches = _prefixed(self._uids, uid)
+
+        # a parent run hides its child iterations (<uid>-<iter>)
+        if len(matches) > 1:
+            parent = min(matches, key=len)
+            if all(m == parent or m.startswith(parent + '-') for m in matches):
+                return [parent]
+        return matches
+
+    def between(self, since='', until=''):
+        """run uids with since <= start_time <= until, ordered by time"""
+        if self._times is None:
+            self._times = sorted((_start_time(v[0]), k)
+                                 for k, v in self.runs.items())
+        i = bisect_left(self._times, (to_datetime(since),)) if since else 0
+        j = bisect_right(self._times, (to_datetime(until), _max_char)) \
+            if until else len(self._times)
+        return [uid for _, uid in self._times[i:j]]
+
+
+def _prefixed(sorted_list, prefix):
+    out = []
+    i = bisect_left(sorted_list, prefix)
+    while i < len(sorted_list) and sorted_list[i].startswith(prefix):
+        out.append(sorted_list[i])
+        i += 1
+    return out
+
+
+class RunStats:
+    """incrementally maintained run statistics (materialized view)
+
+    counts runs by state, name and (start) day, and keeps count/sum/min/max
+    of numeric outputs per run name, outputs are accumulated once when a
+    run reaches the completed state (and are not reverted on deletion).
+    """
+
+    def __init__(self, struct=None):
+        struct = struct or {}
+        self.runs = struct.get('runs', 0)
+        self.state = struct.get('state', {})
+        self.name = struct.get('name', {})
+        self.day = struct.get('day', {})
+        self.outputs = struct.get('outputs', {})
+
+    @classmethod
+    def load(cls, filepath):
+        try:
+            with open(filepath) as fp:
+                return cls(json.load(fp))
+        except FileNotFoundError:
+            return None
+
+    def save(self, filepath):
+        atomic_write(filepath, json.dumps(self.to_dict()))
+
+    def to_dict(self):
+        return {'runs': self.runs, 'state': self.state, 'name': self.name,
+                'day': self.day, 'outputs': self.outputs}
+
+    def update(self, prev, entry, outputs=None):
+        """apply a run transition, prev/entry are [start_time, name, state]"""
+        if prev:
+            self._count(prev, -1)
+        if entry:
+            self._count(entry, 1)
+            was_completed = prev and prev[2] == 'completed'
+            if entry[2] == 'completed' and not was_completed and outputs:
+                self._add_outputs(entry[1], outputs)
+
+    def _count(self, entry, inc):
+        start, name, state = entry
+        self.runs += inc
+        for counts, key in [(self.state, state), (self.name, name),
+                            (self.day, start[:10])]:
+            counts[key] = counts.get(key, 0) + inc
+            if counts[key] <= 0:
+                del counts[key]
+
+    def _add_outputs(self, name, outputs):
+        results = self.outputs.setdefault(name, {})
+        for key, value in outputs.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            agg = results.get(key)
+            if agg:
+                results[key] = [agg[0] + 1, agg[1] + value,
+                                min(agg[2], value), max(agg[3], value)]
+            else:
+                results[key] = [1, value, value, value]
+
+    def summary(self):
+        """stats dict with count/mean/min/max per output"""
+        struct = self.to_dict()
+        struct['outputs'] = {
+            name: {key: {'count': c, 'mean': total / c, 'min': lo, 'max': hi}
+                   for key, (c, total, lo, hi) in results.items()}
+            for name, results in self.outputs.items()}
+        return struct
+
+
+LINEAGE_FILE = '.lineage'
+
+
+def lineage_node(item):
+    """node id of an artifact/input object dict (its path or key)"""
+    return item.get('target_path') or item.get('path') or item.get('key')
+
+
+def run_node(uri):
+    """node id of a run, from its uid or <project>/<uid> uri"""
+    return 'run:' + uri.split('/')[-1]
+
+
+class LineageIndex:
+    """artifact lineage graph, the sources and producer run of an artifact
+    are its parents (edges source -> artifact and run -> artifact)
+
+    every stored artifact appends a record (its node, key, sources and
+    producer) to an append-only log, loading reads only the records added
+    since the last load. the graph keeps parent and child sets per node so
+    a traversal costs time proportional to the nodes it returns.
+    """
+
+    def __init__(self, dirpath):
+        self.filepath = path.join(dirpath, LINEAGE_FILE)
+        self._reset()
+
+    def _reset(self):
+        self.parents = {}
+        self.children = {}
+        self.artifacts = {}
+        self._offset = 0
+
+    def load(self):
+        try:
+            size = path.getsize(self.filepath)
+        except FileNotFoundError:
+            return
+        if size < self._offset:
+            # the log was replaced, reload it
+            self._reset()
+        if size == self._offset:
+            return
+        with open(self.filepath, 'rb') as fp:
+            fp.seek(self._offset)
+            data = fp.read(size - self._offset)
+        # skip a partially written last record
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            if line:
+                self._apply(json.loads(line))
+        self._offset += end
+
+    def add(self, key, artifact, uid=''):
+        """log an artifact (dict) record and apply it to the graph"""
+        producer = artifact.get('producer') or {}
+        record = {'node': lineage_node(dict(artifact, key=key)),
+                  'key': key, 'uid': uid,
+                  'sources': [lineage_node(s)
+                              for s in artifact.get('sources') or []],
+                  'producer': run_node(producer['uri'])
+                  if producer.get('uri') else None}
+        self._append([record])
+
+    def remove(self, artifacts):
+        """log the deletion of artifacts (dicts), their parent edges are
+        removed (artifacts derived from them keep their sources)"""
+        self._append([{'node': lineage_node(artifact), 'deleted': True}
+                      for artifact in artifacts])
+
+    def _append(self, records):
+        if not records:
+            return
+        makedirs(path.dirname(self.filepath), exist_ok=True)
+        with open(self.filepath, 'ab') as fp:
+            fp.write(b''.join(json.dumps(record).encode() + b'\n'
+                              for record in records))
+        self.load()
+
+    def _apply(self, record):
+        node = record['node']
+        for parent in self.parents.pop(node, ()):
+            self.children[parent].discard(node)
+        if record.get('deleted'):
+            self.artifacts.pop(node, None)
+            return
+        parents = set(record['sources'])
+        if record['producer']:
+            parents.add(record['producer'])
+        self.parents[node] = parents
+        for parent in parents:
+            self.children.setdefault(parent, set()).add(node)
+        self.artifacts[node] = {'key': record['key'], 'uid': record['uid']}
+
+    def upstream(self, node, depth=1):
+        return self._traverse(node, self.parents, depth)
+
+    def downstream(self, node, depth=1):
+        return self._traverse(node, self.children, depth)
+
+    def _traverse(self, node, edges, depth):
+        """breadth first walk, depth 0 is unlimited"""
+        results = []
+        seen = {node}
+        level, distance = [node], 0
+        while level and (not depth or distance < depth):
+            distance += 1
+            next_level = []
+            for current in level:
+                for other in sorted(edges.get(current, ())):
+                    if other in seen:
+                        continue
+                    seen.add(other)
+                    next_level.append(other)
+                    results.append(self._describe(other, current, distance))
+            level = next_level
+        return results
+
+    def _describe(self, node, via, depth):
+        entry = {'node': node, 'via': via, 'depth': depth}
+        if node.startswith('run:'):
+            entry.update({'kind': 'run', 'uid': node[4:]})
+        elif node in self.artifacts:
+            entry.update(dict(self.artifacts[node], kind='artifact'))
+        else:
+            entry['kind'] = 'data'
+        return entry
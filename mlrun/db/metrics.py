@@ -0,0 +1,213 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from datetime import datetime
+from os import path, makedirs, listdir
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from ..utils import atomic_write, parse_iso, FileLock
+
+# time partition of a metric chunk (seconds)
+CHUNK_SECONDS = 3600
+LABELS_FILE = 'labels.json'
+LOCK_FILE = '.lock'
+_dtype = np.dtype('<f8')
+
+
+def to_epoch(ts):
+    if ts is None:
+        return None
+    if isinstance(ts, datetime):
+        return ts.timestamp()
+    if isinstance(ts, str):
+        return parse_iso(ts).timestamp()
+    return float(ts)
+
+
+class MetricsStore:
+    """append-only columnar store for per-run time-series metrics
+
+    every metric key is a directory (the url quoted key) holding time
+    partitioned chunks, each chunk is a pair of raw float64 columns
+    (<chunk>.ts and <chunk>.val) kept sorted by time so it can be sliced
+    with a binary search over a memory map. in order points are appended,
+    a late point rewrites its chunk with the point in place. writes and
+    reads hold a per run file lock (the two columns change together), reads
+    return copies so no file stays mapped.
+    """
+
+    def __init__(self, dirpath, chunk_seconds=CHUNK_SECONDS):
+        self.dirpath = dirpath
+        self.chunk_seconds = chunk_seconds
+
+    def keys(self):
+        if not path.isdir(self.dirpath):
+            return []
+        return sorted(unquote(k) for k in listdir(self.dirpath)
+                      if path.isdir(path.join(self.dirpath, k)))
+
+    def _keydir(self, key):
+        # keys may have '/' (e.g. train/loss), '.' and '..' are not dirs
+        name = quote(str(key), safe='')
+        if name.startswith('.'):
+            name = '%2E' + name[1:]
+        return path.join(self.dirpath, name)
+
+    def _locked(self):
+        return FileLock(path.join(self.dirpath, LOCK_FILE))
+
+    def append(self, keyvals: dict, timestamp=None):
+        ts = to_epoch(timestamp) or datetime.now().timestamp()
+        with self._locked():
+            self._append(keyvals, ts)
+
+    def _append(self, keyvals, ts):
+        chunk = int(ts // self.chunk_seconds)
+        for key, value in keyvals.items():
+            keydir = self._keydir(key)
+            makedirs(keydir, exist_ok=True)
+            base = path.join(keydir, str(chunk))
+            last = _last(base + '.ts')
+            if last is not None and ts < last:
+                self._insert(base, ts, value)
+                continue
+            with open(base + '.ts', 'ab') as fp:
+                fp.write(np.array([ts], dtype=_dtype).tobytes())
+            with open(base + '.val', 'ab') as fp:
+                fp.write(np.array([value], dtype=_dtype).tobytes())
+
+    def _insert(self, base, ts, value):
+        """rewrite a chunk with an out of order point in place"""
+        times, vals = _memmap(base + '.ts'), _memmap(base + '.val')
+        size = min(len(times), len(vals))
+        i = int(np.searchsorted(times[:size], ts, 'right'))
+        times = np.insert(times[:size], i, ts)
+        vals = np.insert(vals[:size], i, value)
+        atomic_write(base + '.val', vals.astype(_dtype).tobytes())
+        atomic_write(base + '.ts', times.astype(_dtype).tobytes())
+
+    def set_labels(self, labels: dict):
+        """merge labels into the run metrics labels"""
+        with self._locked():
+            current = self.labels()
+            current.update(labels)
+            atomic_write(path.join(self.dirpath, LABELS_FILE),
+                         json.dumps(current))
+
+    def labels(self):
+        try:
+            with open(path.join(self.dirpath, LABELS_FILE)) as fp:
+                return json.load(fp)
+        except FileNotFoundError:
+            return {}
+
+    def _chunks(self, key, start=None, end=None):
+        keydir = self._keydir(key)
+        if not path.isdir(keydir):
+            return []
+        chunks = sorted(int(f[:-3]) for f in listdir(keydir)
+                        if f.endswith('.ts'))
+        first = None if start is None else int(start // self.chunk_seconds)
+        last = None if end is None else int(end // self.chunk_seconds)
+        return [path.join(keydir, str(c)) for c in chunks
+                if (first is None or c >= first)
+                and (last is None or c <= last)]
+
+    def iter_slices(self, key, start=None, end=None):
+        """yield (timestamps, values) slices per chunk, the chunks are
+        searched memory mapped and only the slices are copied"""
+        if not path.isdir(self.dirpath):
+            return
+        slices = []
+        with self._locked():
+            for base in self._chunks(key, start, end):
+                ts = _memmap(base + '.ts')
+                vals = _memmap(base + '.val')
+                size = min(len(ts), len(vals))
+                if not size:
+                    continue
+                ts, vals = ts[:size], vals[:size]
+                i = 0 if start is None else np.searchsorted(ts, start, 'left')
+                j = size if end is None else np.searchsorted(ts, end, 'right')
+                if j > i:
+                    slices.append((np.array(ts[i:j]), np.array(vals[i:j])))
+        yield from slices
+
+    def read(self, key, start=None, end=None):
+        slices = list(self.iter_slices(key, start, end))
+        if not slices:
+            return {'time': np.empty(0, _dtype), 'value': np.empty(0, _dtype)}
+        if len(slices) == 1:
+            ts, vals = slices[0]
+            return {'time': ts, 'value': vals}
+        return {'time': np.concatenate([s[0] for s in slices]),
+                'value': np.concatenate([s[1] for s in slices])}
+
+    def downsample(self, key, interval, start=None, end=None):
+        """aggregate points into time buckets (min/max/mean/count)"""
+        parts = [_bucket_agg(ts, vals, interval)
+                 for ts, vals in self.iter_slices(key, start, end)]
+        if not parts:
+            empty = np.empty(0, _dtype)
+            return {'time': empty, 'min': empty, 'max': empty,
+                    'mean': empty, 'count': np.empty(0, np.int64)}
+
+        # merge buckets which span chunk boundaries
+        buckets, mins, maxs, sums, counts = \
+            [np.concatenate(col) for col in zip(*parts)]
+        idx = _group_starts(buckets)
+        counts = np.add.reduceat(counts, idx)
+        return {'time': buckets[idx] * interval,
+                'min': np.minimum.reduceat(mins, idx),
+                'max': np.maximum.reduceat(maxs, idx),
+                'mean': np.add.reduceat(sums, idx) / counts,
+                'count': counts}
+
+
+def _last(filepath):
+    """last value of a column file, None if empty"""
+    try:
+        with open(filepath, 'rb') as fp:
+            size = fp.seek(0, 2) // _dtype.itemsize
+            if not size:
+                return None
+            fp.seek((size - 1) * _dtype.itemsize)
+            return float(np.frombuffer(fp.read(_dtype.itemsize), _dtype)[0])
+    except FileNotFoundError:
+        return None
+
+
+def _memmap(filepath):
+    if not path.isfile(filepath) or path.getsize(filepath) < _dtype.itemsize:
+        return np.empty(0, _dtype)
+    size = path.getsize(filepath) // _dtype.itemsize
+    return np.memmap(filepath, dtype=_dtype, mode='r', shape=(size,))
+
+
+def _group_starts(sorted_ids):
+    return np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+
+
+def _bucket_agg(ts, vals, interval):
+    buckets = np.floor(ts / interval)
+    idx = _group_starts(buckets)
+    counts = np.diff(np.r_[idx, len(buckets)])
+    return (buckets[idx],
+            np.minimum.reduceat(vals, idx),
+            np.maximum.reduceat(vals, idx),
+            np.add.reduceat(vals, idx),
+            counts)
@@ -264,33 +264,42 @@ class MLClientCtx(object):
             self._update_db(commit=True)
 
     def log_metric(self, key: str, value, timestamp=None, labels={}):
-        """TBD, log a real-time time-series metric"""
+        """log a real-time time-series metric"""
         if not timestamp:
             timestamp = datetime.now()
         if self._rundb:
-            self._rundb.store_metric({key: value}, timestamp, labels)
+            self._rundb.store_metric(self.uid, self.project, {key: value},
+                                     timestamp, labels)
 
     def log_metrics(self, keyvals: dict, timestamp=None, labels={}):
-        """TBD, log a set of real-time time-series metrics"""
+        """log a set of real-time time-series metrics"""
         if not timestamp:
             timestamp = datetime.now()
         if self._rundb:
-            self._rundb.store_metric(keyvals, timestamp, labels)
+            self._rundb.store_metric(self.uid, self.project, keyvals,
+                                     timestamp, labels)
 
     def log_artifact(self, item, body=None, target_path='', src_path=None,
-                     tag='', viewer=None, upload=True, labels=None):
-        """log an output artifact and optionally upload it"""
+                     tag='', viewer=None, upload=True, labels=None,
+                     encoding=None):
+        """log an output artifact and optionally upload it
+
+        encoding (gzip or zstd) stores the artifact compressed, artifacts
+        rendered in the background (e.g. png plots) are uploaded there and
+        completed by commit() or set_state()"""
         self._artifacts_manager.log_artifact(self, item, body=body,
                                              target_path=target_path,
                                              src_path=src_path,
                                              tag=tag,
                                              viewer=viewer,
                                              upload=upload,
-                                             labels=labels)
+                                             labels=labels,
+                                             encoding=encoding)
         self._update_db()
 
     def commit(self, message: str = ''):
         """save run state and add a commit message"""
+        self._artifacts_manager.wait()
         self._annotations['message'] = message
         self._update_db(commit=True, message=message)
 
@@ -301,6 +310,7 @@ class MLClientCtx(object):
             self._error = str(error)
             self._update_db('error', commit=True)
         elif state and state != self._state and self._state != 'error':
+            self._artifacts_manager.wait()
             self._state = state
             self._update_db(state, commit=True)
 
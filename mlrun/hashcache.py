@@ -0,0 +1,123 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sqlite3
+import threading
+from os import path, environ, makedirs, stat
+
+from .utils import logger
+
+
+def default_cache_path():
+    cache_dir = environ.get('XDG_CACHE_HOME') or \
+        path.join(path.expanduser('~'), '.cache')
+    return path.join(cache_dir, 'mlrun', 'hashes.sqlite')
+
+
+def file_version(filepath):
+    st = stat(filepath)
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+class HashCache:
+    """persistent cache of file digests
+
+    digests are stored per (real path, algorithm) together with the file
+    size, mtime (ns) and inode, an entry is used only while all of them
+    match so modified or replaced files are hashed again. the sqlite db can
+    be shared by concurrent processes.
+    """
+
+    def __init__(self, filepath=None):
+        self.filepath = filepath or default_cache_path()
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            dirpath = path.dirname(self.filepath)
+            if dirpath:
+                makedirs(dirpath, exist_ok=True)
+            conn = sqlite3.connect(self.filepath, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS hashes (path TEXT, algo TEXT, '
+                'size INTEGER, mtime_ns INTEGER, inode INTEGER, '
+                'digest TEXT, PRIMARY KEY (path, algo))')
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def get(self, filepath, algo):
+        """the cached digest, None if missing or the file changed"""
+        try:
+            version = file_version(filepath)
+        except FileNotFoundError:
+            return None
+        row = self._conn().execute(
+            'SELECT size, mtime_ns, inode, digest FROM hashes '
+            'WHERE path=? AND algo=?',
+            (path.realpath(filepath), algo)).fetchone()
+        if row and tuple(row[:3]) == version:
+            return row[3]
+        return None
+
+    def set(self, filepath, algo, digest, version=None):
+        """store a digest, version is the (size, mtime_ns, inode) the
+        digest was computed for (default: the current file version)"""
+        version = version or file_version(filepath)
+        conn = self._conn()
+        conn.execute(
+            'INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)',
+            (path.realpath(filepath), algo) + tuple(version) + (digest,))
+        conn.commit()
+
+    def digest(self, filepath, algo, compute):
+        """cached digest, or compute(filepath) and cache it"""
+        digest = self.get(filepath, algo)
+        if digest is not None:
+            return digest
+        version = file_version(filepath)
+        digest = compute(filepath)
+        # don't cache digests of files modified while hashing
+        if file_version(filepath) == version:
+            self.set(filepath, algo, digest, version)
+        return digest
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute('DELETE FROM hashes')
+        conn.commit()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def hash_cache():
+    """the process hash cache (MLRUN_HASH_CACHE path, 'off' to disable)"""
+    global _cache
+    filepath = environ.get('MLRUN_HASH_CACHE', '')
+    if filepath.lower() in ['off', 'false', 'none']:
+        return None
+    with _cache_lock:
+        if _cache is None or (filepath and _cache.filepath != filepath):
+            try:
+                _cache = HashCache(filepath or None)
+                _cache._conn()
+            except (OSError, sqlite3.Error) as err:
+                logger.warning('hash cache disabled - {}'.format(err))
+                _cache = None
+                return None
+        return _cache
@@ -0,0 +1,249 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""dataset profiling (column statistics) in a single streaming pass
+
+all the statistics are mergeable so DataFrames larger than memory are
+profiled chunk by chunk, quantiles come from a KLL like sketch and
+cardinality from HyperLogLog.
+"""
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+
+class QuantileSketch:
+    """mergeable streaming quantiles (a simplified KLL sketch)
+
+    values are kept in levels of compactors, a full level is sorted and
+    every other value (random offset) moves to the next level where it
+    weighs twice as much. memory is O(k log(n/k)), the rank error is about
+    1/k.
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - 1 - level
+        return max(int(self.k * (2 / 3) ** depth), 8)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                items = np.sort(items)
+                # an odd item stays, the others are halved
+                end = len(items) - len(items) % 2
+                keep = items[end:]
+                promoted = items[self._rng.integers(2):end:2]
+                self.levels[level] = keep
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[level + 1] = np.concatenate(
+                    [self.levels[level + 1], promoted])
+            level += 1
+
+    def merge(self, other):
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self._compress()
+
+    def quantiles(self, qs):
+        if not self.count:
+            return [None] * len(qs)
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2 ** level)
+                                  for level, items in enumerate(self.levels)])
+        order = np.argsort(values)
+        values = values[order]
+        cumulative = np.cumsum(weights[order])
+        ranks = np.asarray(qs) * cumulative[-1]
+        indices = np.searchsorted(cumulative, ranks, side='left')
+        return values[np.minimum(indices, len(values) - 1)].tolist()
+
+
+def _bit_length(values):
+    """vectorized bit length of uint64 values"""
+    values = values.copy()
+    length = np.zeros(len(values), dtype=np.uint8)
+    for shift in [32, 16, 8, 4, 2, 1]:
+        big = values >= np.uint64(1 << shift)
+        length[big] += shift
+        values[big] >>= np.uint64(shift)
+    length[values > 0] += 1
+    return length
+
+
+class HyperLogLog:
+    """mergeable distinct count estimate, relative error ~1.04/sqrt(2^p)"""
+
+    def __init__(self, p=12):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+
+    def update(self, values):
+        hashes = pd.util.hash_array(np.asarray(values, dtype=object))
+        self.update_hashes(hashes)
+
+    def update_hashes(self, hashes):
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.intp)
+        rest = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - _bit_length(rest).astype(np.int64) + 1
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(2.0 ** -self.registers.astype(float))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)  # linear counting
+        return int(round(estimate))
+
+
+def _is_numeric(dtype):
+    return pd.api.types.is_numeric_dtype(dtype) and \
+        not pd.api.types.is_bool_dtype(dtype)
+
+
+class ColumnProfile:
+    """mergeable statistics of a column
+
+    the column type is decided by the first non null values (an all null
+    chunk is read as float), a numeric column which later has non numeric
+    values (e.g. a late 'n/a') continues as a categorical column, its
+    distinct count seeded from the values kept in the quantile sketch.
+    """
+
+    def __init__(self, dtype=None):
+        self.dtype = None if dtype is None else str(dtype)
+        self.numeric = None
+        self.count = 0
+        self.nulls = 0
+        self.min = None
+        self.max = None
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.sketch = None
+        self.hll = None
+
+    def _set_type(self, dtype):
+        self.dtype = str(dtype)
+        self.numeric = _is_numeric(dtype)
+        if self.numeric:
+            self.sketch = QuantileSketch()
+        else:
+            self.hll = HyperLogLog()
+
+    def _to_categorical(self, dtype):
+        self.dtype = str(dtype)
+        self.numeric = False
+        self.hll = HyperLogLog()
+        for items in self.sketch.levels:
+            if len(items):
+                self.hll.update(items)
+        self.sketch = None
+        self.min = self.max = None
+        self.mean = self._m2 = 0.0
+
+    def update(self, series):
+        nulls = int(series.isna().sum())
+        self.nulls += nulls
+        if self.dtype is None:
+            self.dtype = str(series.dtype)
+        values = series.dropna()
+        if not len(values):
+            return
+        if self.numeric is None:
+            self._set_type(values.dtype)
+        elif self.numeric and not _is_numeric(values.dtype):
+            self._to_categorical(values.dtype)
+        if not self.numeric:
+            self.count += len(values)
+            self.hll.update(values.values)
+            return
+
+        values = values.values.astype(float)
+        n, mean = len(values), float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        # merge the chunk mean/variance (Chan et al.)
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += m2 + delta ** 2 * self.count * n / total
+        self.count = total
+        low, high = float(values.min()), float(values.max())
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        self.sketch.update(values)
+
+    def to_dict(self, quantiles=DEFAULT_QUANTILES):
+        struct = {'dtype': self.dtype, 'count': self.count,
+                  'nulls': self.nulls}
+        if self.numeric is None:
+            return struct
+        if self.numeric:
+            if self.count:
+                struct.update({
+                    'min': self.min, 'max': self.max, 'mean': self.mean,
+                    'std': (self._m2 / (self.count - 1)) ** 0.5
+                    if self.count > 1 else 0.0,
+                    'quantiles': dict(zip(
+                        [str(q) for q in quantiles],
+                        self.sketch.quantiles(quantiles)))})
+        else:
+            struct['distinct'] = self.hll.estimate()
+        return struct
+
+
+def profile_df(df, quantiles=DEFAULT_QUANTILES):
+    """profile a DataFrame or an iterator of DataFrames (chunks)
+
+    :return: {'rows': n, 'columns': {name: {dtype, count, nulls, min, max,
+             mean, std, quantiles} or {dtype, count, nulls, distinct}}}
+    """
+    chunks = [df] if isinstance(df, pd.DataFrame) else df
+    rows = 0
+    columns = {}
+    for chunk in chunks:
+        rows += len(chunk)
+        for name in chunk.columns:
+            if name not in columns:
+                columns[name] = ColumnProfile(chunk[name].dtype)
+            columns[name].update(chunk[name])
+    return {'rows': rows,
+            'columns': {str(name): column.to_dict(quantiles)
+                        for name, column in columns.items()}}
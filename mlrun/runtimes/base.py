@@ -85,7 +85,7 @@ class MLRuntime:
             self.task_generator = GridGenerator(hyperparams)
         elif param_file:
             obj = self.execution.get_object('param_file.csv', param_file)
-            self.task_generator = ListGenerator(obj.get())
+            self.task_generator = ListGenerator(obj.as_df())
 
     def run(self):
         def show(results, resp):
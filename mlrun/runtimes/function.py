@@ -13,7 +13,6 @@
 # limitations under the License.
 
 import json
-import requests
 from datetime import datetime
 import asyncio
 from aiohttp.client import ClientSession
@@ -21,6 +20,7 @@ import logging
 from sys import stdout
 
 from .base import MLRuntime
+from ..datastore import http_sessions
 from ..utils import update_in
 from ..collections import RunList
 
@@ -39,7 +39,9 @@ class RemoteRuntime(MLRuntime):
         log_level = self.execution.log_level
         headers = {'x-nuclio-log-level': log_level}
         try:
-            resp = requests.put(self.command, json=struct, headers=headers)
+            # function invocations are not idempotent, no retries
+            session = http_sessions.session(self.command, retries=0)
+            resp = session.put(self.command, json=struct, headers=headers)
         except OSError as err:
             print('ERROR: %s', str(err))
             raise OSError('error: cannot run function at url {}'.format(self.command))
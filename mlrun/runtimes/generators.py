@@ -59,8 +59,12 @@ class GridGenerator(TaskGenerator):
 
 class ListGenerator(TaskGenerator):
     def __init__(self, body):
-
-        self.df = pd.read_csv(BytesIO(body), encoding='utf-8')
+        """param rows from a csv body (bytes or str) or a DataFrame"""
+        if isinstance(body, str):
+            body = body.encode()
+        if isinstance(body, bytes):
+            body = pd.read_csv(BytesIO(body), encoding='utf-8')
+        self.df = body
 
     def generate(self, struct):
         i = 0
@@ -14,10 +14,18 @@
 
 import json
 import logging
-from os import path
+import re
+from datetime import datetime
+from os import path, replace, remove, getpid, makedirs
 from sys import stdout
+from threading import get_ident
 import yaml
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 yaml.Dumper.ignore_aliases = lambda *args : True
 
 
@@ -161,6 +169,68 @@ def dict_to_yaml(struct):
                      sort_keys=False)
 
 
+def parse_iso(text):
+    """datetime from an iso 8601 string, like datetime.fromisoformat (which
+    is python 3.7+), also accepts a Z (utc) suffix"""
+    text = text.strip().replace('T', ' ', 1)
+    tzfmt = ''
+    if ' ' in text:
+        if text.endswith('Z'):
+            text = text[:-1] + '+0000'
+        # %z of python 3.6 does not accept the +HH:MM form
+        text, count = re.subn(r'([+-]\d\d):?(\d\d)$', r'\1\2', text)
+        tzfmt = '%z' if count else ''
+    for fmt in ['%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S',
+                '%Y-%m-%d %H:%M', '%Y-%m-%d %H', '%Y-%m-%d']:
+        try:
+            return datetime.strptime(text, fmt + tzfmt)
+        except ValueError:
+            pass
+    raise ValueError('invalid iso format string {}'.format(text))
+
+
+def tmp_path(filepath, suffix='.tmp'):
+    """temp file path next to filepath, unique per process and thread"""
+    return '{}.{}-{}{}'.format(filepath, getpid(), get_ident(), suffix)
+
+
+def atomic_write(filepath, data):
+    """write to a temp file and rename, readers never see partial data"""
+    tmp = tmp_path(filepath)
+    mode = 'wb' if isinstance(data, bytes) else 'w'
+    try:
+        with open(tmp, mode) as fp:
+            fp.write(data)
+        replace(tmp, filepath)
+    except BaseException:
+        if path.isfile(tmp):
+            remove(tmp)
+        raise
+
+
+class FileLock:
+    """advisory inter-process lock (flock), a no-op where unsupported"""
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._fp = None
+
+    def __enter__(self):
+        dirpath = path.dirname(self.filepath)
+        if dirpath:
+            makedirs(dirpath, exist_ok=True)
+        self._fp = open(self.filepath, 'a')
+        if fcntl:
+            fcntl.flock(self._fp.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        if fcntl:
+            fcntl.flock(self._fp.fileno(), fcntl.LOCK_UN)
+        self._fp.close()
+        self._fp = None
+
+
 def uxjoin(base, path):
     if base:
         if not base.endswith('/'):
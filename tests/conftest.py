@@ -11,6 +11,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import asyncio
 from copy import deepcopy
 
 import pytest
@@ -28,6 +29,7 @@ out_path = f'{results}/out'
 
 pathlib.Path(f'{results}/kfp').mkdir(parents=True, exist_ok=True)
 environ['KFPMETA_OUT_DIR'] = f'{results}/kfp/'
+environ['MLRUN_HASH_CACHE'] = f'{results}/hashes.sqlite'
 
 
 from mlrun.utils import update_in
@@ -37,3 +39,12 @@ def tag_test(spec, name):
     update_in(spec, 'metadata.name', name)
     update_in(spec, 'metadata.lables.test', name)
     return spec
+
+
+def run_async(coro):
+    # asyncio.run is python 3.7+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
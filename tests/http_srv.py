@@ -48,7 +48,8 @@ class Handler(BaseHTTPRequestHandler):
 
 
 class ThreadingSimpleServer(ThreadingMixIn, HTTPServer):
-    pass
+    # keep-alive clients hold handler threads, don't block exit on them
+    daemon_threads = True
 
 
 def create_function(handler, port):
@@ -60,3 +61,73 @@ def create_function(handler, port):
 
     server = ThreadingSimpleServer(('0.0.0.0', port), CustomHandler)
     server.serve_forever()
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    """serve files from a directory, with HEAD, Range and PUT support"""
+    protocol_version = 'HTTP/1.1'
+    dirpath = ''
+    # simulate servers without HEAD (405) or Range (200 full body) support
+    head = True
+    ranges = True
+
+    def _filepath(self):
+        return self.dirpath + self.path.split('?')[0]
+
+    def do_HEAD(self):
+        if not self.head:
+            self.send_response(405)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self._send_file(with_body=False)
+
+    def do_GET(self):
+        self._send_file()
+
+    def do_PUT(self):
+        size = int(self.headers.get('Content-Length', 0))
+        data = self.rfile.read(size)
+        ranges = self.headers.get('Range')
+        with open(self._filepath(), 'r+b' if ranges else 'wb') as fp:
+            if ranges:
+                # v3io style offset write, Range: bytes=<offset>
+                fp.seek(int(ranges.replace('bytes=', '')))
+            fp.write(data)
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _send_file(self, with_body=True):
+        try:
+            with open(self._filepath(), 'rb') as fp:
+                data = fp.read()
+        except FileNotFoundError:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        status = 200
+        ranges = self.headers.get('Range') if self.ranges else None
+        if ranges:
+            start, end = ranges.replace('bytes=', '').split('-')
+            end = int(end) + 1 if end else len(data)
+            data = data[int(start):end]
+            status = 206
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', '"{}"'.format(hash(data)))
+        self.end_headers()
+        if with_body:
+            self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def create_file_server(dirpath, port=0, head=True, ranges=True):
+    handler = type('DirHandler', (FileHandler,),
+                   {'dirpath': dirpath, 'head': head, 'ranges': ranges})
+    server = ThreadingSimpleServer(('127.0.0.1', port), handler)
+    return server
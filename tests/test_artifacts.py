@@ -0,0 +1,523 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gzip
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mlrun import get_or_create_ctx
+from mlrun import artifacts
+from mlrun.artifacts import ArtifactManager, blob_hash, file_hash
+from mlrun.cas import cas_root, cas_gc, REFS_FILE
+from mlrun.compression import detect_encoding
+from mlrun.datastore import StoreManager
+from mlrun.hashcache import hash_cache
+from conftest import results, run_async
+
+data_dir = f'{results}/artifacts_src'
+
+
+def test_compressed_artifact():
+    ctx = get_or_create_ctx('compressed', with_env=False)
+    body = 'x,y\n' + '1,2\n' * 1000
+    target = f'{results}/artifacts/data.csv'
+    ctx.log_artifact('data.csv', body=body, target_path=target,
+                     encoding='gzip')
+    artifact = ctx._artifacts_manager.output_artifacts['data.csv']
+    assert artifact.to_dict()['encoding'] == 'gzip'
+    assert artifact.hash == blob_hash(body)
+    with open(target, 'rb') as fp:
+        assert gzip.decompress(fp.read()).decode() == body
+
+    # readers decode the recorded (artifact) encoding
+    item = StoreManager().object('data', target, encoding=artifact.encoding)
+    assert item.get() == body.encode()
+    assert bytes(item.as_buffer()) == body.encode()
+    assert item.as_df()['y'].sum() == 2000
+    with StoreManager().object('data', target, 'gzip') as copy:
+        filepath = copy.local()
+        with open(filepath) as fp:
+            assert fp.read() == body
+    assert not os.path.exists(filepath), 'temp copy was not removed'
+    with item.open('r') as fp:
+        assert fp.readline() == 'x,y\n'
+    assert run_async(item.aget()) == body.encode()
+    item.download(f'{results}/artifacts/data.out')
+    with open(f'{results}/artifacts/data.out') as fp:
+        assert fp.read() == body
+    with open(target, 'rb') as fp:
+        assert StoreManager().gather_get([target]) == [fp.read()]
+
+    # async writes are encoded as well
+    run_async(item.aput(body))
+    with open(target, 'rb') as fp:
+        assert detect_encoding(fp.read(4)) == 'gzip'
+    run_async(item.adownload(f'{results}/artifacts/data.out'))
+    with open(f'{results}/artifacts/data.out') as fp:
+        assert fp.read() == body
+
+
+
+def test_zstd_artifact():
+    zstd = pytest.importorskip('zstandard')
+    ctx = get_or_create_ctx('compressed', with_env=False)
+    body = 'x,y\n' + '1,2\n' * 1000
+    target = f'{results}/artifacts/data.zst.csv'
+    ctx.log_artifact('data.zst.csv', body=body, target_path=target,
+                     encoding='zstd')
+    artifact = ctx._artifacts_manager.output_artifacts['data.zst.csv']
+    assert artifact.to_dict()['encoding'] == 'zstd'
+    with open(target, 'rb') as fp:
+        data = zstd.ZstdDecompressor().decompressobj().decompress(fp.read())
+    assert data.decode() == body
+
+    item = StoreManager().object('data', target, encoding=artifact.encoding)
+    assert item.get() == body.encode()
+    assert item.as_df()['y'].sum() == 2000
+    item.download(f'{results}/artifacts/data.zst.out')
+    with open(f'{results}/artifacts/data.zst.out') as fp:
+        assert fp.read() == body
+
+@pytest.mark.parametrize('algo', ['sha1', 'sha256', 'blake2b'])
+def test_hash_while_upload(algo):
+    os.makedirs(data_dir, exist_ok=True)
+    src = f'{data_dir}/model.bin'
+    with open(src, 'wb') as fp:
+        fp.write(os.urandom(32 * 1024 * 1024))
+    stores = StoreManager()
+    manager = ArtifactManager(stores, hash_algo=algo)
+    ctx = get_or_create_ctx('hashing', with_env=False)
+
+    expected = file_hash(src, algo)
+    manager.log_artifact(ctx, 'model.bin', src_path=src,
+                         target_path=f'{results}/models/model.bin')
+    artifact = manager.output_artifacts['model.bin']
+    assert artifact.hash == expected
+    assert algo == 'sha1' or expected.startswith(algo + ':')
+    assert file_hash(f'{results}/models/model.bin', algo) == expected
+
+
+def test_hash_cache(monkeypatch):
+    calls = []
+    compute = artifacts._file_hash
+    monkeypatch.setattr(artifacts, '_file_hash',
+                        lambda *args: calls.append(args) or compute(*args))
+    os.makedirs(data_dir, exist_ok=True)
+    src = f'{data_dir}/tokenizer.bin'
+    with open(src, 'wb') as fp:
+        fp.write(b'vocab' * 1000)
+
+    digest = file_hash(src, 'sha256')
+    assert file_hash(src, 'sha256') == digest
+    assert len(calls) == 1, 'unchanged file was hashed again'
+
+    with open(src, 'ab') as fp:
+        fp.write(b'more')
+    assert file_hash(src, 'sha256') != digest
+    assert len(calls) == 2
+
+    # uploaded artifacts populate and use the cache
+    manager = ArtifactManager(StoreManager(), hash_algo='blake2b')
+    ctx = get_or_create_ctx('hash_cache', with_env=False)
+    manager.log_artifact(ctx, 'tok', src_path=src,
+                         target_path=f'{results}/models/tok.bin')
+    assert hash_cache().get(src, 'blake2b') == \
+        manager.output_artifacts['tok'].hash
+    assert file_hash(src, 'blake2b') == manager.output_artifacts['tok'].hash
+    assert len(calls) == 2
+
+
+def _blobs(out_path):
+    return sorted(name for name in os.listdir(cas_root(out_path))
+                  if name != REFS_FILE)
+
+
+def test_cas_artifacts(monkeypatch):
+    out_path = f'{results}/cas'
+    stores = StoreManager()
+    manager = ArtifactManager(stores, out_path=out_path, cas=True)
+    ctx = get_or_create_ctx('cas', with_env=False)
+    body = 'x,y\n' + '1,2\n' * 1000
+    manager.log_artifact(ctx, 'a.csv', body=body)
+
+    uploads = []
+    store = stores.get_or_create_store(out_path)[0]
+    put_encoded = store.put_encoded
+    monkeypatch.setattr(store, 'put_encoded',
+                        lambda *a, **kw: uploads.append(a) or put_encoded(
+                            *a, **kw))
+    manager.log_artifact(ctx, 'b.csv', body=body)
+    assert not uploads, 'identical blob was uploaded again'
+    blobs = _blobs(out_path)
+    assert blobs == [blob_hash(body)]
+
+    item = stores.object('b', f'{out_path}/b.csv')
+    assert item.get().decode() == body
+    with item.open('r') as fp:
+        assert fp.read() == body
+    assert item.as_df()['y'].sum() == 2000
+    assert os.path.realpath(item.local()) == os.path.realpath(
+        f'{cas_root(out_path)}/{blobs[0]}')
+    run_async(item.adownload(f'{out_path}/b.out'))
+    with open(f'{out_path}/b.out') as fp:
+        assert fp.read() == body
+
+    # objects larger than a reference are not probed for one
+    gets = []
+    get = store.get
+    monkeypatch.setattr(store, 'get',
+                        lambda *a, **kw: gets.append(a) or get(*a, **kw))
+    large = stores.object('large', f'{out_path}/large.csv')
+    large.put(body * 2)
+    large.download(f'{out_path}/large.out')
+    with large.open() as fp:
+        assert fp.read() == (body * 2).encode()
+    assert gets == []
+
+    # gc keeps referenced blobs and deletes the unreferenced
+    manager.log_artifact(ctx, 'b.csv', body='other')
+    assert len(_blobs(out_path)) == 2
+    os.remove(f'{out_path}/a.csv')
+    assert cas_gc(stores, out_path, grace=3600) == []
+    deleted = cas_gc(stores, out_path, grace=0)
+    assert deleted == [f'{cas_root(out_path)}/{blobs[0]}']
+    assert _blobs(out_path) == [blob_hash('other')]
+    assert stores.object('b', f'{out_path}/b.csv').get() == b'other'
+
+
+def test_cas_gc_references(monkeypatch):
+    out_path = f'{results}/cas_refs'
+    stores = StoreManager()
+    ctx = get_or_create_ctx('cas_refs', with_env=False)
+    # references outside out_path and a relative out_path are kept
+    monkeypatch.chdir(results)
+    manager = ArtifactManager(stores, out_path='cas_refs', cas=True)
+    manager.log_artifact(ctx, 'a.csv', body='outside',
+                         target_path=f'{results}/elsewhere/a.csv')
+    manager.log_artifact(ctx, 'b.csv', body='inside')
+    assert cas_gc(stores, out_path, grace=0) == []
+    assert len(_blobs(out_path)) == 2
+    assert stores.object('a', f'{results}/elsewhere/a.csv').get() == \
+        b'outside'
+
+    # deleted references release their blob
+    os.remove(f'{results}/elsewhere/a.csv')
+    assert cas_gc(stores, out_path, grace=0) == [
+        f'{cas_root(out_path)}/{blob_hash("outside")}']
+
+    # unreadable references skip the deletion
+    os.remove(f'{out_path}/b.csv')
+    store = stores.get_or_create_store(out_path)[0]
+
+    def stat(key, tag=''):
+        raise PermissionError(key)
+    monkeypatch.setattr(store, 'stat', stat)
+    assert cas_gc(stores, out_path, grace=0) == []
+
+
+def test_memoized_bodies(monkeypatch):
+    renders = []
+    render = artifacts.ChartArtifact._render
+    monkeypatch.setattr(artifacts.ChartArtifact, '_render',
+                        lambda self: renders.append(1) or render(self))
+    ctx = get_or_create_ctx('bodies', with_env=False)
+    manager = ArtifactManager(StoreManager(), out_path=f'{results}/bodies')
+    chart = artifacts.ChartArtifact('chart.html', [['x', 'y'], [1, 2]])
+    chart._inline = True
+    manager.log_artifact(ctx, chart)
+    for i in range(100):
+        struct = {'spec': {}, 'status': {}}
+        manager.to_dict(struct)
+    assert len(renders) == 1
+    assert struct['status']['output_artifacts'][0]['inline'] == \
+        chart.get_body()
+
+    chart.add_row([3, 4])
+    assert '[3, 4]' in chart.get_body()
+    assert len(renders) == 2
+
+    # large stored bodies are referenced by their target path
+    monkeypatch.setattr(artifacts, 'INLINE_MAX_SIZE', 10)
+    manager.to_dict(struct)
+    output = struct['status']['output_artifacts'][0]
+    assert 'inline' not in output
+    assert output['target_path'] == f'{results}/bodies/chart.html'
+
+
+def test_body_cache_eviction():
+    cache = artifacts.BodyCache(max_size=25)
+    for i in range(3):
+        cache.get(i, lambda: str(i) * 10)
+    assert cache.size == 20 and list(cache._bodies) == [1, 2]
+    assert cache.get(1, lambda: 'new') == '1' * 10
+    assert cache.get(0, lambda: 'a' * 30) == 'a' * 30, 'too large to cache'
+    assert cache.hits == 1 and list(cache._bodies) == [2, 1]
+
+
+@pytest.mark.parametrize('format', ['png', 'svg'])
+def test_plot_image_artifact(format):
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(4, 3))
+    fig.add_subplot(111).plot([1, 3, 2])
+    ctx = get_or_create_ctx('images', with_env=False)
+    plot = artifacts.PlotArtifact('fig', body=fig, format=format,
+                                  thumbnail=True)
+    assert plot.key == f'fig.{format}' and plot.viewer == 'image'
+    target = f'{results}/images/fig.{format}'
+    ctx.log_artifact(plot, target_path=target)
+    # the figure is rendered from a snapshot, it can be cleared right away
+    fig.clf()
+    ctx.commit()
+
+    with open(target, 'rb') as fp:
+        data = fp.read()
+    assert data.startswith(b'\x89PNG' if format == 'png' else b'<?xml')
+    assert data != artifacts.PlotArtifact._savefig(fig, format)
+    assert plot.hash == blob_hash(data)
+    output = plot.to_dict()
+    assert output['format'] == format and 'inline' not in output
+    assert output['thumbnail'] == target + '.thumb.png'
+    from PIL import Image
+    thumb = Image.open(output['thumbnail'])
+    assert max(thumb.size) <= artifacts.THUMBNAIL_SIZE
+
+
+@pytest.mark.parametrize('format', ['parquet', 'feather', 'arrow'])
+def test_table_formats(format):
+    pytest.importorskip('pyarrow')
+    df = pd.DataFrame({'id': np.arange(1000), 'x': np.random.rand(1000),
+                       'name': ['n{}'.format(i % 7) for i in range(1000)]})
+    ctx = get_or_create_ctx('tables', with_env=False)
+    table = artifacts.TableArtifact('features', df=df, format=format,
+                                    visible=True, row_group_size=300)
+    assert table.key == f'features.{format}'
+    target = f'{results}/tables/features.{format}'
+    ctx.log_artifact(table, target_path=target)
+
+    output = table.to_dict()
+    assert output['format'] == format and 'inline' not in output
+    assert output['schema'] == [{'name': 'id', 'type': 'int64'},
+                                {'name': 'x', 'type': 'double'},
+                                {'name': 'name', 'type': 'string'}]
+    assert table.hash == file_hash(target)
+    item = StoreManager().object('t', target)
+    pd.testing.assert_frame_equal(item.as_df(format=format), df)
+    if format == 'parquet':
+        import pyarrow.parquet as pq
+        assert pq.ParquetFile(target).metadata.num_row_groups == 4
+
+
+def test_table_format_sizes():
+    pytest.importorskip('pyarrow')
+    from mlrun.dataframes import write_df, read_df
+
+    rows = 100000
+    df = pd.DataFrame({'id': np.arange(rows),
+                       'x': np.random.rand(rows),
+                       'y': np.random.randint(0, 100, rows),
+                       'label': np.random.choice(['a', 'b', 'c'], rows)})
+    os.makedirs(data_dir, exist_ok=True)
+    sizes = {}
+    for format in ['csv', 'parquet', 'feather']:
+        filepath = f'{data_dir}/bench.{format}'
+        write_df(df, filepath, format)
+        assert len(read_df(filepath, format)) == rows
+        sizes[format] = os.path.getsize(filepath)
+    assert sizes['parquet'] < sizes['csv']
+
+
+def test_chart_downsampling():
+    x = np.arange(100000, dtype=float)
+    y = np.sin(x / 1000) + (x == 50000) * 5
+    for method in ['lttb', 'minmax']:
+        chart = artifacts.ChartArtifact('chart.html', max_points=500,
+                                        downsample=method)
+        chart.header = ['x', 'y']
+        for row in zip(x, y):
+            chart.add_row(row)
+        view = chart._view()
+        assert len(chart.rows) == 100000
+        assert len(view) <= 500
+        assert view[:, 1].max() == y.max(), 'spike was dropped'
+        assert view[0, 0] == 0 and (method == 'minmax' or
+                                    view[-1, 0] == 99999)
+        assert len(chart.get_body()) < 50000
+
+
+def test_chart_data_file(monkeypatch):
+    ctx = get_or_create_ctx('charts', with_env=False)
+    chart = artifacts.ChartArtifact('loss.html', [['step', 'loss']])
+    for i in range(5):
+        chart.add_row([i, 1 / (i + 1)])
+    ctx.log_artifact(chart, target_path=f'{results}/charts/loss.html')
+    data_path = f'{results}/charts/loss.data.csv'
+    assert chart.to_dict()['data_path'] == data_path
+
+    # rows are written when the chart is logged (or flushed), local files
+    # get the new rows appended
+    store = chart._sidecar[0]
+    appends = []
+    append = store.append
+    monkeypatch.setattr(store, 'append',
+                        lambda *a: appends.append(a) or append(*a))
+    for i in range(5, 25):
+        chart.add_row([i, 1 / (i + 1)])
+    assert len(pd.read_csv(data_path)) == 5
+    chart.flush()
+    assert len(pd.read_csv(data_path)) == 25
+    chart.add_row([25, 0])
+    ctx.log_artifact(chart)
+    assert len(appends) == 2
+    df = pd.read_csv(data_path)
+    assert df.columns.tolist() == ['step', 'loss']
+    assert df['step'].tolist() == list(range(26))
+    assert df['step'].dtype == np.int64
+
+
+def test_chart_text_cells():
+    chart = artifacts.ChartArtifact('models.html',
+                                    [['model', 'acc'], ['a', 0.5]])
+    chart.add_row(['b, large', 0.75])
+    assert '["b, large", 0.75]' in chart.get_body()
+    with pytest.raises(ValueError, match='model'):
+        chart.add_row(['c', 0.5, 1])
+
+    # text x values are downsampled by the row position
+    chart = artifacts.ChartArtifact('steps.html', [['step', 'loss', 'note']],
+                                    max_points=100)
+    for i in range(1000):
+        chart.add_row([f'step-{i}', 1 / (i + 1), 'warmup' if i < 10 else ''])
+    view = chart._view()
+    assert len(view) <= 100 and view[0, 0] == 'step-0'
+
+    ctx = get_or_create_ctx('charts', with_env=False)
+    ctx.log_artifact(chart, target_path=f'{results}/charts/steps.html')
+    df = pd.read_csv(f'{results}/charts/steps.data.csv')
+    assert df['step'].tolist()[:2] == ['step-0', 'step-1']
+    assert len(df) == 1000
+
+
+def test_dir_artifact(monkeypatch):
+    src = f'{results}/model_src'
+    for name in ['saved_model.pb', 'variables/data-0', 'variables/index']:
+        os.makedirs(os.path.dirname(f'{src}/{name}'), exist_ok=True)
+        with open(f'{src}/{name}', 'wb') as fp:
+            fp.write(os.urandom(1000))
+    stores = StoreManager()
+    manager = ArtifactManager(stores, out_path=f'{results}/dirs')
+    ctx = get_or_create_ctx('dirs', with_env=False)
+    manager.log_artifact(ctx, 'model', src_path=src)
+    model = manager.output_artifacts['model']
+    assert model.kind == 'dir' and model.num_files == 3
+    assert model.size == 3000 and len(model.uploaded_files) == 3
+    first_hash = model.hash
+
+    # re-log, only the modified file is uploaded
+    time.sleep(0.01)
+    with open(f'{src}/variables/data-0', 'wb') as fp:
+        fp.write(os.urandom(1000))
+    model = artifacts.ModelArtifact('model', src_path=src,
+                                    framework='tensorflow')
+    manager.log_artifact(ctx, model)
+    assert model.uploaded_files == ['variables/data-0']
+    assert model.hash != first_hash
+    assert model.to_dict()['framework'] == 'tensorflow'
+
+    target = f'{results}/model_dst'
+    downloaded = artifacts.download_dir(stores, f'{results}/dirs/model',
+                                        target)
+    assert downloaded == ['saved_model.pb', 'variables/data-0',
+                          'variables/index']
+    for name in downloaded:
+        assert file_hash(f'{target}/{name}') == file_hash(f'{src}/{name}')
+    assert artifacts.download_dir(stores, f'{results}/dirs/model',
+                                  target) == []
+
+    # files deleted from the source are removed from the target, new files
+    # are hashed while uploaded (single pass)
+    os.remove(f'{src}/variables/index')
+    with open(f'{src}/extra.bin', 'wb') as fp:
+        fp.write(b'extra')
+    hashed = []
+    compute = artifacts._file_hash
+    monkeypatch.setattr(artifacts, '_file_hash',
+                        lambda *args: hashed.append(args) or compute(*args))
+    model = artifacts.DirArtifact('model', src_path=src)
+    manager.log_artifact(ctx, model)
+    assert model.uploaded_files == ['extra.bin'] and model.num_files == 3
+    assert not os.path.exists(f'{results}/dirs/model/variables/index')
+    assert not [args for args in hashed if args[0].endswith('extra.bin')]
+    assert file_hash(f'{src}/extra.bin') == \
+        file_hash(f'{results}/dirs/model/extra.bin')
+
+
+def test_table_profile():
+    from mlrun.profiling import profile_df, HyperLogLog, QuantileSketch
+
+    rows = 200000
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({'x': rng.uniform(0, 100, rows),
+                       'n': rng.integers(0, 10, rows),
+                       'name': ['user{}'.format(i % 5000)
+                                for i in range(rows)]})
+    df.loc[::100, 'x'] = np.nan
+    table = artifacts.TableArtifact('users.csv', df=df, profile=True)
+    profile = table.to_dict()['profile']
+    assert profile['rows'] == rows
+    x = profile['columns']['x']
+    assert x['nulls'] == rows // 100 and x['count'] == rows - rows // 100
+    assert x['mean'] == pytest.approx(df['x'].mean())
+    assert x['std'] == pytest.approx(df['x'].std())
+    assert x['min'] == df['x'].min() and x['max'] == df['x'].max()
+    assert x['quantiles']['0.5'] == pytest.approx(50, abs=2)
+    assert profile['columns']['name']['distinct'] == pytest.approx(5000,
+                                                                   rel=0.05)
+
+    # chunked profile of a file matches
+    os.makedirs(data_dir, exist_ok=True)
+    df.to_csv(f'{data_dir}/users.csv', index=False)
+    chunked = artifacts.TableArtifact(
+        'users.csv', src_path=f'{data_dir}/users.csv', profile=True).profile
+    assert chunked['rows'] == rows
+    assert chunked['columns']['x']['mean'] == pytest.approx(x['mean'])
+    assert chunked['columns']['x']['std'] == pytest.approx(x['std'])
+    assert chunked['columns']['n']['quantiles']['0.25'] in [2, 3]
+
+    # columns are typed by their first non null values
+    sparse = pd.DataFrame({'tag': [None] * 1000 + ['a', 'b'],
+                           'code': list(range(1000)) + ['n/a', 'x']})
+    chunks = [sparse[:1000], sparse[1000:]]
+    chunks[0] = chunks[0].astype({'tag': float, 'code': int})
+    columns = profile_df(iter(chunks))['columns']
+    assert columns['tag'] == {'dtype': 'object', 'count': 2, 'nulls': 1000,
+                              'distinct': 2}
+    assert columns['code']['count'] == 1002 and \
+        'distinct' in columns['code']
+
+    # sketches merge
+    a, b = HyperLogLog(), HyperLogLog()
+    a.update(np.arange(10000))
+    b.update(np.arange(5000, 15000))
+    a.merge(b)
+    assert a.estimate() == pytest.approx(15000, rel=0.05)
+    left, right = QuantileSketch(), QuantileSketch()
+    left.update(np.arange(0, 50000))
+    right.update(np.arange(50000, 100000))
+    left.merge(right)
+    assert left.quantiles([0.9])[0] == pytest.approx(90000, rel=0.03)
@@ -0,0 +1,382 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import gzip
+import mmap
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+
+from mlrun.__main__ import main
+from mlrun.compression import detect_encoding
+from mlrun.datacache import DataCache
+from mlrun.dataframes import _row_groups
+from mlrun.datastore import StoreManager, HttpSessions
+from http_srv import create_file_server
+from conftest import results, run_async
+
+data_dir = f'{results}/datastore'
+payload = bytes(range(256)) * 4096 + b'tail'
+
+
+@pytest.fixture(scope='module')
+def http_url():
+    os.makedirs(data_dir, exist_ok=True)
+    with open(f'{data_dir}/data.bin', 'wb') as fp:
+        fp.write(payload)
+    server = create_file_server(data_dir)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    yield f'http://{host}:{port}'
+    server.shutdown()
+
+
+def test_open_ranged(http_url):
+    item = StoreManager().object('data', f'{http_url}/data.bin')
+    item._store.options['read_ahead'] = 64 * 1024
+    with item.open() as fp:
+        assert fp.read(10) == payload[:10]
+        fp.seek(-4, os.SEEK_END)
+        assert fp.read() == b'tail'
+        fp.seek(1000)
+        assert fp.read(5000) == payload[1000:6000]
+    with item.open() as fp:
+        assert fp.read() == payload
+
+
+def test_open_file():
+    os.makedirs(data_dir, exist_ok=True)
+    item = StoreManager().object('data', f'{data_dir}/local.bin')
+    item.put(payload)
+    with item.open() as fp:
+        fp.seek(100)
+        assert fp.read(10) == payload[100:110]
+
+
+def test_parallel_download(http_url):
+    item = StoreManager().object('data', f'{http_url}/data.bin')
+    item._store.options.update({'part_size': 100 * 1024, 'parallel': 4})
+    target = f'{data_dir}/downloaded.bin'
+    item.download(target)
+    with open(target, 'rb') as fp:
+        assert fp.read() == payload, 'downloaded data mismatch'
+
+
+def test_concurrent_transfers(http_url):
+    # threads of a process writing the same target use their own temp files
+    item = StoreManager().object('data', f'{http_url}/data.bin')
+    item._store.options.update({'part_size': 100 * 1024, 'parallel': 2})
+    local = StoreManager().object('local', f'{data_dir}/shared_upload.bin')
+    target = f'{data_dir}/shared.bin'
+
+    def transfer(i):
+        item.download(target)
+        local.upload(f'{data_dir}/data.bin')
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(transfer, range(8)))
+    for filepath in [target, f'{data_dir}/shared_upload.bin']:
+        with open(filepath, 'rb') as fp:
+            assert fp.read() == payload
+    assert not [f for f in os.listdir(data_dir) if f.endswith('.tmp')]
+
+
+def test_download_without_head(http_url):
+    server = create_file_server(data_dir, head=False)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    try:
+        item = StoreManager().object('data', f'http://{host}:{port}/data.bin')
+        target = f'{data_dir}/no_head.bin'
+        item.download(target)
+        with open(target, 'rb') as fp:
+            assert fp.read() == payload
+        with pytest.raises(OSError):
+            item._store.download('/missing.bin', target)
+    finally:
+        server.shutdown()
+
+
+def test_ranges_ignored(http_url):
+    server = create_file_server(data_dir, ranges=False)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    try:
+        url = f'http://{host}:{port}/data.bin'
+        item = StoreManager().object('data', url)
+        item._store.options['read_ahead'] = 64 * 1024
+        with item.open() as fp:
+            assert fp.read(10) == payload[:10]
+            assert not item._store.ranges
+            fp.seek(300000)
+            assert fp.read(5000) == payload[300000:305000]
+            fp.seek(-4, os.SEEK_END)
+            assert fp.read() == b'tail'
+            fp.seek(1000)
+            assert fp.read(10) == payload[1000:1010]
+
+        # parallel downloads fall back to a single streaming get
+        item = StoreManager().object('data', url)
+        item._store.options.update({'part_size': 100 * 1024, 'parallel': 4})
+        target = f'{data_dir}/no_ranges.bin'
+        item.download(target)
+        assert not item._store.ranges
+        with open(target, 'rb') as fp:
+            assert fp.read() == payload
+    finally:
+        server.shutdown()
+
+
+def test_v3io_chunked_upload(http_url):
+    src = f'{data_dir}/data.bin'
+    endpoint = http_url.replace('http://', '')
+    item = StoreManager().object('data', f'v3io://{endpoint}/uploaded.bin')
+    item._store.options['part_size'] = 100 * 1024
+    item.upload(src)
+    with open(f'{data_dir}/uploaded.bin', 'rb') as fp:
+        assert fp.read() == payload, 'uploaded data mismatch'
+
+
+def test_http_keep_alive(http_url):
+    sessions = HttpSessions(pool_size=4)
+    item = StoreManager(sessions=sessions).object('data', f'{http_url}/data.bin')
+    for i in range(10):
+        assert item._store.get(item._path, offset=i, size=3) == \
+            payload[i:i + 3]
+    stats = sessions.stats()[http_url]
+    assert stats['requests'] == 10
+    assert stats['connections'] == 1, 'connection was not reused'
+
+
+def test_data_cache(http_url):
+    cache = DataCache(f'{results}/cache', max_size=len(payload) + 10)
+    cache.clear()
+    stores = StoreManager(cache=cache)
+    item = stores.object('data', f'{http_url}/data.bin')
+    filepath = item.local()
+    assert filepath.startswith(cache.dirpath)
+    assert item.local() == filepath, 'cache miss on same version'
+    assert item.get() == payload
+
+    # a new version (etag) is a new entry, old entries are evicted (LRU)
+    small = stores.object('small', f'{http_url}/small.bin')
+    for data in [b'small', b'changed']:
+        with open(f'{data_dir}/small.bin', 'wb') as fp:
+            fp.write(data)
+        assert small.get() == data
+    assert item.local() == filepath
+    assert cache.size() <= cache.max_size
+    assert {p for _, _, p in cache.entries()} == {filepath, small.local()}
+
+    # local files are used in place
+    local = stores.object('local', f'{data_dir}/data.bin')
+    assert local.local() == f'{data_dir}/data.bin'
+
+    # uncached copies are temp files, removed when the item is closed or
+    # collected
+    remote = StoreManager(cache=False).object('data', f'{http_url}/data.bin')
+    filepath = remote.local()
+    with open(filepath, 'rb') as fp:
+        assert fp.read() == payload
+    remote.close()
+    assert not os.path.exists(filepath)
+    filepath = remote.local()
+    del remote
+    assert not os.path.exists(filepath)
+    assert os.path.isfile(f'{data_dir}/data.bin')
+
+
+def test_as_numpy(http_url):
+    array = np.arange(1000, dtype='<f8')
+    os.makedirs(data_dir, exist_ok=True)
+    with open(f'{data_dir}/array.bin', 'wb') as fp:
+        fp.write(array.tobytes())
+
+    item = StoreManager().object('array', f'{data_dir}/array.bin')
+    buf = item.as_buffer()
+    assert buf.readonly and isinstance(buf.obj, mmap.mmap)
+    mapped = item.as_numpy('<f8', (10, 100))
+    assert (mapped.ravel() == array).all()
+    assert not mapped.flags.writeable
+
+    remote = StoreManager(cache=False).object(
+        'array', f'{http_url}/array.bin')
+    assert (remote.as_numpy('<f8', offset=80) == array[10:]).all()
+
+
+def test_async_api(http_url):
+    endpoint = http_url.replace('http://', '')
+    stores = StoreManager(cache=False)
+
+    async def put_all():
+        items = [stores.object(f'obj{i}', f'v3io://{endpoint}/obj{i}.txt')
+                 for i in range(100)]
+        try:
+            await asyncio.gather(
+                *[item.aput(f'data{i}'.encode())
+                  for i, item in enumerate(items)])
+            return await items[7].aget()
+        finally:
+            await stores.aclose()
+
+    assert run_async(put_all()) == b'data7'
+
+    urls = [f'{http_url}/obj{i}.txt' for i in range(100)]
+    assert stores.gather_get(urls) == [f'data{i}'.encode()
+                                       for i in range(100)]
+
+
+def test_copy_tree():
+    src = f'{data_dir}/tree'
+    dst = f'{results}/tree_copy'
+    for name in ['a.csv', 'b.txt', 'sub/c.csv', 'sub/deep/d.csv']:
+        os.makedirs(os.path.dirname(f'{src}/{name}'), exist_ok=True)
+        with open(f'{src}/{name}', 'w') as fp:
+            fp.write(name * 10)
+
+    stores = StoreManager()
+    stats = stores.copy(src, dst, pattern='*.csv', parallel=2)
+    assert (stats.copied, stats.skipped, stats.errors) == (3, 0, [])
+    assert sorted(rel for rel, _ in stores.object('', dst)._store.listdir(
+        dst)) == ['a.csv', 'sub/c.csv', 'sub/deep/d.csv']
+
+    # identical files are skipped, changed and new ones are copied
+    with open(f'{src}/a.csv', 'w') as fp:
+        fp.write('changed')
+    stats = stores.copy(src, dst, check='hash')
+    assert (stats.copied, stats.skipped) == (2, 2)
+    with open(f'{dst}/a.csv') as fp:
+        assert fp.read() == 'changed'
+
+    # by default same size files are copied if changed since the copy
+    with open(f'{src}/a.csv', 'w') as fp:
+        fp.write('CHANGED')
+    stats = stores.copy(src, dst, pattern='*.csv')
+    assert (stats.copied, stats.skipped) == (1, 2)
+    with open(f'{dst}/a.csv') as fp:
+        assert fp.read() == 'CHANGED'
+
+    result = CliRunner().invoke(main, ['cp', f'{src}/b.txt', f'{dst}/'])
+    assert result.exit_code == 0, result.output
+    assert os.path.isfile(f'{dst}/b.txt')
+
+    # missing or empty sources are errors
+    for source in [f'{src}/missing.csv', f'{data_dir}/empty_tree']:
+        os.makedirs(f'{data_dir}/empty_tree', exist_ok=True)
+        result = CliRunner().invoke(main, ['cp', '-r', source, dst])
+        assert result.exit_code == 1
+        assert 'error: source' in result.output
+
+
+def test_as_df(http_url):
+    pq = pytest.importorskip('pyarrow.parquet')
+    df = pd.DataFrame({'id': range(1000), 'x': np.arange(1000) * 0.5,
+                       'label': ['a', 'b'] * 500})
+    df.to_parquet(f'{data_dir}/df.parquet', row_group_size=100)
+    df.to_csv(f'{data_dir}/df.csv', index=False)
+    df.to_feather(f'{data_dir}/df.feather')
+
+    stores = StoreManager(cache=False)
+    filters = [('id', '>=', 150), ('id', '<', 250), ('label', '=', 'a')]
+    expected = df[(df.id >= 150) & (df.id < 250) & (df.label == 'a')][['x']]
+    for name in ['df.parquet', 'df.csv', 'df.feather']:
+        for url in [f'{data_dir}/{name}', f'{http_url}/{name}']:
+            item = stores.object(name, url)
+            result = item.as_df(columns=['x'], filters=filters)
+            assert list(result.columns) == ['x']
+            assert result['x'].tolist() == expected['x'].tolist(), url
+
+            chunks = list(item.as_df(chunksize=300))
+            assert max(len(c) for c in chunks) <= 300
+            assert sum(len(c) for c in chunks) == len(df)
+
+    # only the matching row groups are read
+    pf = pq.ParquetFile(f'{data_dir}/df.parquet')
+    assert _row_groups(pf.metadata, filters) == [1, 2]
+
+
+@pytest.mark.parametrize('encoding', ['gzip', 'zstd'])
+def test_compression(encoding):
+    if encoding == 'zstd':
+        pytest.importorskip('zstandard')
+    os.makedirs(data_dir, exist_ok=True)
+    text = 'id,value\n' + ''.join(f'{i},{i % 7}\n' for i in range(10000))
+    item = StoreManager().object('table', f'{data_dir}/table.{encoding}.csv')
+    store = item._store
+    store.options['compression'] = encoding
+    item.put(text)
+    with open(f'{data_dir}/table.{encoding}.csv', 'rb') as fp:
+        assert detect_encoding(fp.read(4)) == encoding
+    assert store.compression_ratio > 2
+    assert item.get() == text.encode()
+    with item.open('r') as fp:
+        assert fp.readline() == 'id,value\n'
+    assert item.as_df()['value'].sum() == sum(i % 7 for i in range(10000))
+
+    # file uploads are compressed while streaming, reads of raw objects
+    # are not affected
+    src = f'{data_dir}/table.csv'
+    with open(src, 'w') as fp:
+        fp.write(text)
+    item.upload(src)
+    item.download(f'{data_dir}/table.out')
+    with open(f'{data_dir}/table.out') as fp:
+        assert fp.read() == text
+    raw = StoreManager().object('raw', src)
+    raw._store.options['compression'] = encoding
+    assert raw.get() == text.encode()
+
+
+def test_raw_reads():
+    os.makedirs(data_dir, exist_ok=True)
+    # user compressed files and binaries with a gzip magic are not decoded
+    # unless an encoding was recorded
+    compressed = gzip.compress(b'id\n1\n')
+    with open(f'{data_dir}/user.csv.gz', 'wb') as fp:
+        fp.write(compressed)
+    binary = b'\x1f\x8b' + os.urandom(1000)
+    with open(f'{data_dir}/magic.bin', 'wb') as fp:
+        fp.write(binary)
+
+    stores = StoreManager()
+    item = stores.object('user', f'{data_dir}/user.csv.gz')
+    assert item.get() == compressed
+    with item.open() as fp:
+        assert fp.read() == compressed
+    item.download(f'{data_dir}/copy.csv.gz')
+    with open(f'{data_dir}/copy.csv.gz', 'rb') as fp:
+        assert fp.read() == compressed
+    item = stores.object('magic', f'{data_dir}/magic.bin')
+    assert item.get() == binary
+    assert bytes(item.as_buffer()) == binary
+    assert run_async(item.aget()) == binary
+
+    # an explicit store option decodes
+    item = StoreManager().object('user', f'{data_dir}/user.csv.gz')
+    item._store.options['compression'] = 'auto'
+    assert item.get() == b'id\n1\n'
+
+
+def test_image_content_type():
+    from mlrun.datastore import guess_content_type
+    assert guess_content_type('a/b.png') == 'image/png'
+    assert guess_content_type('a/b.webp') == 'image/webp'
+    assert guess_content_type('a/b.svg') == 'image/svg+xml'
+    assert guess_content_type('a/b.csv.gz') is None
@@ -0,0 +1,82 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import multiprocessing
+
+from mlrun.db import FileRunDB
+from conftest import results
+
+dbpath = f'{results}/stress'
+runs_per_writer = 50
+
+
+def writer(project, worker, errors):
+    db = FileRunDB(dbpath).connect()
+    try:
+        for i in range(runs_per_writer):
+            uid = f'w{worker}x{i}'
+            run = {'metadata': {'name': f'writer{worker}', 'uid': uid},
+                   'status': {'state': 'running',
+                              'start_time': f'2019-01-01 00:00:{i:02d}'}}
+            db.store_run(run, uid, project)
+            run['status']['state'] = 'completed'
+            db.store_run(run, uid, project)
+    except Exception as err:
+        errors.put(repr(err))
+
+
+def reader(project, done, errors):
+    db = FileRunDB(dbpath).connect()
+    try:
+        while not done.is_set():
+            db.list_runs(project=project, last=0)
+    except Exception as err:
+        errors.put(repr(err))
+
+
+def stress(procs):
+    ctx = multiprocessing.get_context('fork')
+    project = f'stress{procs}'
+    errors = ctx.Queue()
+    done = ctx.Event()
+    writers = [ctx.Process(target=writer, args=(project, i, errors))
+               for i in range(procs)]
+    readers = [ctx.Process(target=reader, args=(project, done, errors))
+               for i in range(procs)]
+
+    for p in writers + readers:
+        p.start()
+    for p in writers:
+        p.join()
+    done.set()
+    for p in readers:
+        p.join()
+
+    failures = []
+    while not errors.empty():
+        failures.append(errors.get())
+    return project, failures
+
+
+def test_concurrent_writers():
+    for procs in [1, 2, 4]:
+        project, failures = stress(procs)
+        assert not failures, 'concurrent access failed: ' + failures[0]
+
+        db = FileRunDB(dbpath).connect()
+        expected = procs * runs_per_writer
+        runs = db.list_runs(project=project, last=0)
+        assert len(runs) == expected, 'lost run index updates'
+        stats = db.get_run_stats(project)
+        assert stats['state'] == {'completed': expected}, 'bad run stats'
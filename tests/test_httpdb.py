@@ -0,0 +1,102 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+
+import pytest
+
+from mlrun.db import get_run_db, FileRunDB, RunDBError
+from mlrun.db.httpd import make_server
+from conftest import results
+
+
+@pytest.fixture(scope='module')
+def db():
+    backend = FileRunDB(f'{results}/httpdb').connect()
+    server = make_server(backend, '127.0.0.1', 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    yield get_run_db(f'http://{host}:{port}').connect()
+    server.shutdown()
+
+
+def new_run(uid, start_time, name='http-test', state='completed'):
+    return {'metadata': {'name': name, 'uid': uid}, 'spec': {},
+            'status': {'state': state, 'start_time': start_time,
+                       'outputs': {'accuracy': 0.9}}}
+
+
+def test_runs(db):
+    db.store_run(new_run('h1', '2019-01-01 00:00:00'), 'h1', 'p1')
+    run = db.read_run('h1', 'p1', display=False)
+    assert run['metadata']['uid'] == 'h1', 'bad run'
+
+    db.store_runs([new_run(f'b{i}', f'2019-01-02 00:00:0{i}')
+                   for i in range(5)], 'p1')
+    runs = db.read_runs(['b0', 'b4', 'missing'], 'p1')
+    assert [r and r['metadata']['uid'] for r in runs] == ['b0', 'b4', None]
+
+    runs = db.list_runs(project='p1', since='2019-01-02')
+    assert len(runs) == 5, 'bad list result'
+    assert db.get_run_stats('p1')['state'] == {'completed': 6}
+
+    db.del_run('h1', 'p1')
+    with pytest.raises(RunDBError):
+        db.read_run('h1', 'p1', display=False)
+
+
+def test_run_prefix_cache(db):
+    db.store_run(new_run('abcdef01', '2019-01-03 00:00:00'), 'abcdef01', 'p2')
+    assert db.read_run('abcd', 'p2', display=False)['status']['state'] == \
+        'completed'
+    db.store_run(new_run('abcdef01', '2019-01-03 00:00:00', state='error'),
+                 'abcdef01', 'p2')
+    assert db.read_run('abcd', 'p2', display=False)['status']['state'] == \
+        'error'
+    assert db.read_runs(['abcd'], 'p2')[0]['status']['state'] == 'error'
+    db.del_run('abcdef01', 'p2')
+    with pytest.raises(RunDBError):
+        db.read_run('abcd', 'p2', display=False)
+
+
+def test_artifacts(db):
+    db.store_artifact('data', {'key': 'data', 'kind': '', 'tree': 't1'},
+                      't1', project='p1')
+    artifact = db.read_artifact('data', 'latest', 'p1')
+    assert artifact['key'] == 'data', 'bad artifact'
+    assert len(db.list_artifacts(project='p1')) == 1
+
+
+def test_lineage(db):
+    db.store_artifact(
+        'model', {'key': 'model', 'target_path': '/m',
+                  'sources': [{'key': 'data', 'path': '/d'}],
+                  'producer': {'uri': 'p1/h2'}}, 'h2', project='p1')
+    assert [n['node'] for n in db.get_downstream('/d', 'p1')] == ['/m']
+    up = db.get_upstream('/m', 'p1')
+    assert {n['node'] for n in up} == {'/d', 'run:h2'}
+
+
+def test_metrics(db):
+    for i in range(10):
+        db.store_metric('m1', 'p1', {'loss': i}, timestamp=100.0 + i)
+    metrics = db.read_metric('loss', 'm1', 'p1', start=102, end=104)
+    assert list(metrics['loss']['value']) == [2, 3, 4]
+
+    db.store_metric('m1', 'p1', {'val/loss': 1}, timestamp=99.0,
+                    labels={'stage': 'val'})
+    metrics = db.read_metric(['loss', 'val/loss'], 'm1', 'p1', end=101)
+    assert list(metrics['loss']['time']) == [100, 101]
+    assert list(metrics['val/loss']['value']) == [1]
+    assert db.read_metric_labels('m1', 'p1') == {'stage': 'val'}
@@ -0,0 +1 @@
++PNyA
\ No newline at end of file
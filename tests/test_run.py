@@ -12,7 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from io import BytesIO
+
+import pandas as pd
+
 from mlrun.run import get_or_create_ctx, run_start
+from mlrun.runtimes.generators import ListGenerator
 from mlrun.utils import run_keys, update_in
 from os import environ
 from conftest import rundb_path, out_path, tag_test, here
@@ -128,3 +133,11 @@ def test_local_no_context():
     spec = tag_test(basespec, 'test_local_no_context')
     result = run_start(spec, command= f'{here}/no_ctx.py', rundb=rundb_path)
     verify_state(result)
+
+
+def test_list_generator():
+    body = b'p1,p2\n1,a\n2,b\n'
+    for params in [body, body.decode(), pd.read_csv(BytesIO(body))]:
+        tasks = list(ListGenerator(params).generate({'spec': {}}))
+        assert [t['spec']['parameters'] for t in tasks] == [
+            {'p1': 1, 'p2': 'a'}, {'p1': 2, 'p2': 'b'}]
@@ -1,4 +1,13 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pytest
+
 import mlrun
+from mlrun.db import index, RunDBError
 from conftest import rundb_path, results
 
 
@@ -32,5 +41,222 @@ def test_list_artifacts():
         fp.write(html)
 
 
+def test_metrics():
+    db = get_db()
+    uid = 'metrics-test'
+    for i in range(100):
+        db.store_metric(uid, keyvals={'loss': 1.0 / (i + 1), 'acc': i},
+                        timestamp=1000.0 + i)
+
+    metrics = db.read_metric('*', uid)
+    assert sorted(metrics.keys()) == ['acc', 'loss'], 'missing metric keys'
+    assert len(metrics['acc']['value']) == 100, 'missing metric points'
+
+    metrics = db.read_metric('acc', uid, start=1010, end=1019)
+    assert list(metrics['acc']['value']) == list(range(10, 20)), 'bad range'
+
+    metrics = db.read_metric('acc', uid, interval=10)
+    acc = metrics['acc']
+    assert len(acc['time']) == 10, 'bad number of buckets'
+    assert acc['min'][0] == 0 and acc['max'][0] == 9 and acc['mean'][0] == 4.5
+
+
+def test_metric_keys_order_labels():
+    db = get_db()
+    uid = 'metrics-keys'
+    for ts in [1000.0, 1002.0, 1001.0, 999.0]:
+        db.store_metric(uid, keyvals={'train/loss': ts, '..': ts},
+                        timestamp=ts, labels={'epoch': int(ts)})
+    metrics = db.read_metric('*', uid)
+    assert sorted(metrics.keys()) == ['..', 'train/loss']
+    assert list(metrics['train/loss']['time']) == [999, 1000, 1001, 1002]
+    assert list(db.read_metric('..', uid, start=1001)['..']['value']) == \
+        [1001, 1002]
+    assert db.read_metric_labels(uid) == {'epoch': 999}
+
+
+def test_metrics_concurrent_writes():
+    db = get_db()
+    uid = 'metrics-threads'
+
+    def write(worker):
+        # interleaved out of order points rewrite the chunks
+        for i in range(50):
+            ts = 1000.0 + (i * 8 + worker) * (1 if i % 2 else -1)
+            db.store_metric(uid, keyvals={'loss': ts}, timestamp=ts,
+                            labels={f'w{worker}': i})
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(write, range(8)))
+    metrics = db.read_metric('loss', uid)['loss']
+    assert len(metrics['time']) == 400
+    assert (metrics['time'] == metrics['value']).all(), 'columns misaligned'
+    assert (np.diff(metrics['time']) >= 0).all()
+    assert not isinstance(metrics['time'], np.memmap)
+    assert sorted(db.read_metric_labels(uid)) == [f'w{w}' for w in range(8)]
+
+def test_remote_dirpath():
+    db = mlrun.get_run_db('v3io://webapi/users/admin/db')
+    with pytest.raises(RunDBError):
+        db.connect()
+    with pytest.raises(RunDBError):
+        db.store_metric('remote', keyvals={'loss': 1.0})
+    for call in [db.list_runs, db.get_run_stats,
+                 lambda: db.get_upstream('data')]:
+        with pytest.raises(RunDBError):
+            call()
+    assert not os.path.exists('v3io:')
+
+
+def new_run(uid, start_time, name='index-test', state='completed'):
+    return {'metadata': {'name': name, 'uid': uid}, 'spec': {},
+            'status': {'state': state, 'start_time': start_time}}
+
+
+def test_read_run_prefix():
+    db = get_db()
+    project = 'prefix-test'
+    db.store_run(new_run('aaa111', '2019-01-01 00:00:00'), 'aaa111', project)
+    db.store_run(new_run('aaa222', '2019-01-02 00:00:00'), 'aaa222', project)
+    db.store_run(new_run('aaa222', '2019-01-02 00:00:00'), 'aaa222-1', project)
+
+    run = db.read_run('aaa1', project, display=False)
+    assert run['metadata']['uid'] == 'aaa111', 'bad prefix lookup'
+    run = db.read_run('aaa2', project, display=False)
+    assert run['metadata']['uid'] == 'aaa222', 'parent run expected'
+    run = db.read_run('...a111', project, display=False)
+    assert run['metadata']['uid'] == 'aaa111', 'bad suffix lookup'
+
+
+
+def test_unindexed_runs():
+    db = get_db()
+    project = 'unindexed-test'
+    db.store_run(new_run('aaa', '2019-01-01 00:00:00'), 'aaa', project)
+    # run files written or deleted without the index (e.g. older clients)
+    dirpath = f'{rundb_path}/runs/{project}'
+    with open(f'{dirpath}/bbb.yaml', 'w') as fp:
+        fp.write(mlrun.utils.dict_to_yaml(
+            new_run('bbb', '2019-01-02 00:00:00')))
+    assert db.read_run('bbb', project, display=False)['metadata']['uid'] == \
+        'bbb'
+    assert db.read_run('bb', project, display=False)['metadata']['uid'] == \
+        'bbb'
+    os.remove(f'{dirpath}/aaa.yaml')
+    runs = db.list_runs(project=project)
+    assert [run['metadata']['uid'] for run in runs] == ['bbb']
+
+def test_list_runs_since():
+    db = get_db()
+    project = 'since-test'
+    for day in range(1, 8):
+        uid = f'day{day}'
+        db.store_run(new_run(uid, f'2019-01-0{day} 00:00:00'), uid, project)
+
+    runs = db.list_runs(project=project, since='2019-01-03', until='2019-01-05 23')
+    uids = [run['metadata']['uid'] for run in runs]
+    assert uids == ['day5', 'day4', 'day3'], 'bad time range ' + str(uids)
+
+    # iso bounds and start times with a T separator compare by time
+    db.store_run(new_run('iso', '2019-01-05T12:00:00'), 'iso', project)
+    runs = db.list_runs(project=project, since='2019-01-05T06:00:00',
+                        until=datetime(2019, 1, 6))
+    uids = [run['metadata']['uid'] for run in runs]
+    assert uids == ['day6', 'iso'], 'bad time range ' + str(uids)
+
+
+def test_run_stats():
+    db = get_db()
+    project = 'stats-test'
+    run = new_run('s1', '2019-01-01 10:00:00', 'train', 'running')
+    db.store_run(run, 's1', project)
+    stats = db.get_run_stats(project)
+    assert stats['state'] == {'running': 1}, 'bad state counts'
+
+    run['status']['state'] = 'completed'
+    run['status']['outputs'] = {'accuracy': 0.5}
+    db.store_run(run, 's1', project)
+    run = new_run('s2', '2019-01-02 10:00:00', 'train', 'completed')
+    run['status']['outputs'] = {'accuracy': 1.0}
+    db.store_run(run, 's2', project)
+
+    stats = db.get_run_stats(project)
+    assert stats['runs'] == 2 and stats['state'] == {'completed': 2}
+    assert stats['day'] == {'2019-01-01': 1, '2019-01-02': 1}
+    assert stats['outputs']['train']['accuracy']['mean'] == 0.75
+
+
+def test_runs_index_log(monkeypatch):
+    monkeypatch.setattr(index, 'COMPACT_MIN_RECORDS', 20)
+    db, other = get_db(), get_db()
+    project = 'log-test'
+    db.store_run(new_run('l0', '2019-01-01 00:00:00'), 'l0', project)
+    logpath = f'{rundb_path}/runs/{project}/{index.INDEX_FILE}'
+    size = os.path.getsize(logpath)
+
+    # a store appends a record, another client loads only the new records
+    db.store_run(new_run('l1', '2019-01-01 00:00:01'), 'l1', project)
+    with open(logpath, 'rb') as fp:
+        fp.seek(size)
+        assert json.loads(fp.read())['uid'] == 'l1'
+    assert len(other.list_runs(project=project)) == 2
+
+    # repeated updates of the same runs compact the log
+    for i in range(30):
+        run = new_run(f'l{i % 2}', '2019-01-01 00:00:00', state=f's{i}')
+        db.store_run(run, f'l{i % 2}', project)
+    db.del_run('l1', project)
+    with open(logpath) as fp:
+        assert len(fp.readlines()) < 20
+    assert [r['status']['state'] for r in other.list_runs(project=project)] \
+        == ['s28']
+    assert other.get_run_stats(project)['state'] == {'s28': 1}
+
+
+def lineage_artifact(key, sources, uid):
+    return {'key': key, 'target_path': f'/data/{key}',
+            'sources': [{'key': s, 'path': f'/data/{s}'} for s in sources],
+            'producer': {'kind': 'run', 'uri': f'lineage-test/{uid}'}}
+
+
+def test_lineage():
+    db = get_db()
+    project = 'lineage-test'
+    db.store_artifact('clean', lineage_artifact('clean', ['raw'], 'r1'),
+                      'r1', project=project)
+    db.store_artifact('features', lineage_artifact('features', ['clean'],
+                                                   'r2'), 'r2',
+                      project=project)
+    db.store_artifact('model', lineage_artifact('model', ['features'], 'r3'),
+                      'r3', project=project)
+
+    down = db.get_downstream('/data/raw', project, depth=0)
+    assert [(n['node'], n['depth']) for n in down] == [
+        ('/data/clean', 1), ('/data/features', 2), ('/data/model', 3)]
+    assert down[2]['kind'] == 'artifact' and down[2]['key'] == 'model'
+    assert len(db.get_downstream('/data/raw', project, depth=2)) == 2
+    assert [n['node'] for n in db.get_downstream('run:r2', project)] == [
+        '/data/features']
+
+    up = db.get_upstream('/data/model', project, depth=2)
+    assert {n['node'] for n in up} == {'/data/features', 'run:r3',
+                                       '/data/clean', 'run:r2'}
 
+    # storing the artifact again replaces its edges, other db instances
+    # read the new log records
+    db.store_artifact('model', lineage_artifact('model', ['raw'], 'r4'),
+                      'r4', project=project)
+    other = get_db()
+    assert {n['node'] for n in other.get_upstream('/data/model', project)} \
+        == {'/data/raw', 'run:r4'}
+    assert db.get_downstream('/data/features', project) == []
 
+    # deleted artifacts drop their edges, derived artifacts keep theirs
+    db.del_artifact('model', 'latest', project)
+    assert other.get_upstream('/data/model', project) == []
+    assert [n['node'] for n in db.get_downstream('/data/raw', project)] == [
+        '/data/clean']
+    db.del_artifacts('clean', project=project, tag='*')
+    assert db.get_downstream('run:r1', project) == []
+    assert [n['node'] for n in db.get_upstream('/data/features', project)] \
+        == ['/data/clean', 'run:r2']
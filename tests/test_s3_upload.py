@@ -0,0 +1,168 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import os
+
+import boto3
+import pytest
+
+from mlrun.datastore import StoreManager
+from conftest import results
+
+moto = pytest.importorskip('moto')
+mock_aws = getattr(moto, 'mock_aws', None) or getattr(moto, 'mock_s3')
+
+MB = 1024 * 1024
+src_path = f'{results}/s3/upload.bin'
+
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('MLRUN_UPLOAD_STATE_DIR', f'{results}/s3/state')
+    os.makedirs(os.path.dirname(src_path), exist_ok=True)
+    with open(src_path, 'wb') as fp:
+        fp.write(os.urandom(32 * MB))
+
+    with mock_aws():
+        boto3.client('s3').create_bucket(Bucket='bench')
+        store, _ = StoreManager().get_or_create_store('s3://bench/')
+        store.options.update({'part_size': 5 * MB, 'parallel': 4})
+        yield store
+
+
+def uploaded(store, key):
+    return store.get('/' + key)
+
+
+def test_multipart_resume(store):
+    client = store.s3.meta.client
+    upload_part = client.upload_part
+    store.options['retries'] = 0
+
+    def failing_part(**kwargs):
+        if kwargs['PartNumber'] == 3:
+            raise OSError('simulated part failure')
+        return upload_part(**kwargs)
+
+    client.upload_part = failing_part
+    with pytest.raises(OSError):
+        store.upload('/resumed.bin', src_path)
+
+    sent = []
+
+    def count_part(**kwargs):
+        sent.append(kwargs['PartNumber'])
+        return upload_part(**kwargs)
+
+    client.upload_part = count_part
+    store.upload('/resumed.bin', src_path)
+    assert 3 in sent and len(sent) < 7, 'upload was not resumed'
+    with open(src_path, 'rb') as fp:
+        assert uploaded(store, 'resumed.bin') == fp.read()
+
+
+def test_multipart_upload(store):
+    store.upload('/multi.bin', src_path)
+    with open(src_path, 'rb') as fp:
+        assert uploaded(store, 'multi.bin') == fp.read()
+
+
+def test_copy_to_s3(store):
+    src = f'{results}/s3/tree'
+    for name in ['a.bin', 'sub/b.bin']:
+        os.makedirs(os.path.dirname(f'{src}/{name}'), exist_ok=True)
+        with open(f'{src}/{name}', 'wb') as fp:
+            fp.write(os.urandom(1000))
+
+    stores = store._parent
+    stats = stores.copy(src, 's3://bench/tree', check='hash')
+    assert (stats.copied, stats.errors) == (2, [])
+    assert sorted(rel for rel, _ in store.listdir('/tree')) == \
+        ['a.bin', 'sub/b.bin']
+    stats = stores.copy(src, 's3://bench/tree', check='hash')
+    assert stats.skipped == 2
+
+    stats = stores.copy('s3://bench/tree', f'{results}/s3/tree_copy')
+    assert stats.copied == 2
+    with open(f'{src}/sub/b.bin', 'rb') as fp:
+        assert uploaded(store, 'tree/sub/b.bin') == fp.read()
+
+
+def test_multipart_hash(store):
+    hasher = hashlib.sha256()
+    store.upload('/hashed.bin', src_path, hasher=hasher)
+    with open(src_path, 'rb') as fp:
+        assert hasher.hexdigest() == hashlib.sha256(fp.read()).hexdigest()
+
+
+def test_content_type(store):
+    store.put('/fig.png', b'\x89PNG')
+    client = store.s3.meta.client
+    assert client.head_object(Bucket='bench', Key='fig.png')[
+        'ContentType'] == 'image/png'
+
+
+def test_parquet_table_to_s3(store):
+    pytest.importorskip('pyarrow')
+    import pandas as pd
+    from mlrun import get_or_create_ctx
+    from mlrun.artifacts import ArtifactManager, TableArtifact
+
+    df = pd.DataFrame({'a': range(100), 'b': ['x'] * 100})
+    manager = ArtifactManager(store._parent, out_path='s3://bench/tables')
+    table = TableArtifact('t.parquet', df=df)
+    manager.log_artifact(get_or_create_ctx('s3', with_env=False), table)
+    assert table.hash == hashlib.sha1(uploaded(store, 'tables/t.parquet')
+                                      ).hexdigest()
+    item = store._parent.object('t', 's3://bench/tables/t.parquet')
+    pd.testing.assert_frame_equal(item.as_df(), df)
+
+
+def test_dir_artifact_to_s3(store):
+    from mlrun import get_or_create_ctx
+    from mlrun.artifacts import ArtifactManager, download_dir
+
+    src = f'{results}/s3/model'
+    for name in ['a.bin', 'sub/b.bin']:
+        os.makedirs(os.path.dirname(f'{src}/{name}'), exist_ok=True)
+        with open(f'{src}/{name}', 'wb') as fp:
+            fp.write(os.urandom(1000))
+    manager = ArtifactManager(store._parent, out_path='s3://bench/models')
+    ctx = get_or_create_ctx('s3', with_env=False)
+    manager.log_artifact(ctx, 'model', src_path=src)
+    manager.log_artifact(ctx, 'model', src_path=src)
+    assert manager.output_artifacts['model'].uploaded_files == []
+    assert download_dir(store._parent, 's3://bench/models/model',
+                        f'{results}/s3/model_copy') == ['a.bin', 'sub/b.bin']
+
+
+def test_kms_encrypted_download(store):
+    client = store.s3.meta.client
+    client.put_object(Bucket='bench', Key='kms.bin', Body=b'secret',
+                      ServerSideEncryption='aws:kms', SSEKMSKeyId='key-id')
+    # the etag of SSE-KMS objects is not the md5 of the data
+    stats = store.stat('/kms.bin')
+    assert stats.encryption == 'aws:kms'
+    assert store._checksum(stats) is None
+    target = f'{results}/s3/kms.bin'
+    store.download('/kms.bin', target)
+    with open(target, 'rb') as fp:
+        assert fp.read() == b'secret'
+
+    store.put('/plain.bin', b'plain')
+    assert store._checksum(store.stat('/plain.bin'))[0] == 'md5'